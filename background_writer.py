@@ -0,0 +1,109 @@
+# background_writer.py
+import queue
+import threading
+import time
+from typing import Dict, List
+
+from utils import print_error, print_warning
+from telemetry import span
+from config import WRITER_QUEUE_SIZE, WRITER_FLUSH_ROWS, WRITER_FLUSH_INTERVAL
+
+_FLUSH = object()
+_STOP = object()
+
+class BackgroundWriter:
+    """
+    Persist saved devices on a background thread.
+    
+    Records are queued (bounded) and written in batches once WRITER_FLUSH_ROWS
+    records are waiting or WRITER_FLUSH_INTERVAL seconds have passed:
+    CSV and BC.xlsx first, then the scan history, then the seen-IMEI journal,
+    so an IMEI is never persisted as seen before its record is. If the
+    CSV write fails, the batch is reported and its IMEIs are unmarked; a
+    failed BC.xlsx append only warns, since the workbook can be rebuilt
+    from the history.
+    """
+    
+    def __init__(self, file_manager, data_manager):
+        self.file_manager = file_manager
+        self.data_manager = data_manager
+        self.queue = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+        self._thread = None
+    
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='background-writer', daemon=True)
+            self._thread.start()
+        return self
+    
+    def submit(self, device_info: Dict):
+        """Queue a device record for saving"""
+        if self.queue.full():
+            print_warning("Save queue is full, waiting for the writer...")
+        self.queue.put(device_info)
+    
+    def drain(self):
+        """Block until everything queued so far has been written"""
+        if self._thread is not None:
+            self.queue.put(_FLUSH)
+            self.queue.join()
+    
+    def close(self):
+        """Write remaining records and stop the writer thread"""
+        if self._thread is not None:
+            self.queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        self.file_manager.close()
+    
+    def _run(self):
+        batch = []
+        deadline = None
+        
+        while True:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None  # flush interval elapsed
+            
+            if item is not None and item is not _FLUSH and item is not _STOP:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + WRITER_FLUSH_INTERVAL
+                if len(batch) < WRITER_FLUSH_ROWS:
+                    continue
+            
+            if batch:
+                self._write(batch)
+                for _ in batch:
+                    self.queue.task_done()
+                batch = []
+                deadline = None
+            
+            if item is _FLUSH or item is _STOP:
+                self.queue.task_done()
+            if item is _STOP:
+                return
+    
+    def _write(self, batch: List[Dict]):
+        try:
+            saved = self.file_manager.save_device_infos(batch)
+            if not saved['csv']:
+                # Not in the CSV: keep them out of the history and the seen list
+                for device_info in batch:
+                    self.data_manager.seen_imei.unmark(device_info['imei1'])
+                print_error(f"{len(batch)} device(s) were NOT saved, reconnect them to scan again: "
+                            f"{', '.join(device_info['imei1'] for device_info in batch)}")
+                return
+            if not saved['xlsx']:
+                print_warning(f"{len(batch)} device(s) are missing from {self.file_manager.bc_file}; "
+                              f"rebuild it with: python main.py export --excel")
+            with span('save_db', rows=len(batch)):
+                for device_info in batch:
+                    self.data_manager.record_scan(device_info)
+                self.data_manager.inventory.flush()
+            with span('seen_persist', rows=len(batch)):
+                self.data_manager.seen_imei.persist([device_info['imei1'] for device_info in batch])
+        except Exception as e:
+            print_error(f"Background save error: {e}")
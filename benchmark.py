@@ -0,0 +1,330 @@
+# benchmark.py
+# Reproducible benchmarks for the extraction and save hot paths.
+#
+#   python benchmark.py                        # full run, 1k/10k/100k existing rows
+#   python benchmark.py --quick                # smaller sizes, fewer repeats
+#   python benchmark.py --output bench.json    # machine-readable results
+#   python benchmark.py --compare bench.json   # flag regressions against an earlier run
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import plistlib
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+RESULTS_VERSION = 1
+
+SAMPLE_DEVICE_INFO = {
+    'InternationalMobileEquipmentIdentity': '352888110000001',
+    'InternationalMobileEquipmentIdentity2': '352888110000019',
+    'SerialNumber': 'F2LXK0AAHG7F',
+    'ModelNumber': 'MLPF3',
+    'RegionInfo': 'LL/A',
+    'ProductType': 'iPhone14,5',
+    'ProductVersion': '17.1.2',
+    'DeviceName': 'Bench iPhone',
+    'WiFiAddress': 'a4:83:e7:00:00:01',
+    'BluetoothAddress': 'a4:83:e7:00:00:02',
+    'TotalDiskCapacity': 128000000000,
+}
+
+def sample_record(i: int) -> dict:
+    return {
+        'imei1': f'35288811{i:07d}',
+        'imei2': 'N/A',
+        'serial': f'F2LX{i:08d}',
+        'part': 'MLPF3LL/A',
+        'product_name': 'iPhone 13',
+        'product_type': 'iPhone14,5',
+        'storage': '128 GB',
+        'color': 'Midnight',
+        'model_id': 'A2482',
+        'upc': '000743012801',
+        'device_name': 'Bench iPhone',
+        'ios_version': '17.1.2',
+        'udid': f'00008110-{i:016X}',
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+def measure(fn, repeat: int) -> dict:
+    """Run fn repeat times and report per-call latency in microseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        'repeat': repeat,
+        'mean_us': round(statistics.mean(samples), 3),
+        'p50_us': round(samples[len(samples) // 2], 3),
+        'p95_us': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+    }
+
+@contextlib.contextmanager
+def quiet():
+    """Hide the scanner's status prints while timing"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+@contextlib.contextmanager
+def workdir():
+    """Temporary working directory with the mapping files copied in"""
+    previous = os.getcwd()
+    path = tempfile.mkdtemp(prefix='ipscan-bench-')
+    for name in ('model_mapping.json', 'upc_mapping.json'):
+        shutil.copy(os.path.join(REPO_DIR, name), path)
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        from telemetry import telemetry
+        telemetry.close()
+        os.chdir(previous)
+        shutil.rmtree(path, ignore_errors=True)
+
+def bench_parsing(repeat: int) -> list:
+    from device_scanner import DeviceScanner
+    
+    scanner = DeviceScanner(data_manager=None)
+    payload = plistlib.dumps(SAMPLE_DEVICE_INFO)
+    return [{'name': 'parse_device_info', 'params': {'format': 'xml-plist'},
+             **measure(lambda: scanner.parse_device_info(payload), repeat)}]
+
+def bench_storage(repeat: int) -> list:
+    from storage_extractor import extract_storage_capacity_real
+    
+    results = []
+    for label, info in [
+        ('root-domain', SAMPLE_DEVICE_INFO),
+        ('disk-usage-domain', {'com.apple.disk_usage': {'TotalDiskCapacity': 256000000000}}),
+        ('missing', {}),
+    ]:
+        results.append({'name': 'extract_storage_capacity_real', 'params': {'source': label},
+                         **measure(lambda info=info: extract_storage_capacity_real(info, 'bench'), repeat)})
+    return results
+
+def bench_lookups(repeat: int) -> list:
+    from data_manager import DataManager
+    
+    results = []
+    with workdir(), quiet():
+        data_manager = DataManager()
+        for product, storage, part in [
+            ('iPhone 13', '128 GB', 'MLPF3LL/A'),
+            ('iPhone 15 Pro', '1024 GB', 'MTQ63CH/A'),
+            ('iPhone XR', '64 GB', 'N/A'),
+        ]:
+            params = {'product': product, 'storage': storage, 'part': part}
+            results.append({'name': 'get_upc', 'params': params,
+                            **measure(lambda: data_manager.get_upc(product, storage, part), repeat)})
+            results.append({'name': 'get_model_ids', 'params': params,
+                            **measure(lambda: data_manager.get_model_ids(product, part), repeat)})
+        data_manager.close()
+    return results
+
+def persist_seen(seen, records: list):
+    """What the background writer does per batch: mark, then one journal append"""
+    for record in records:
+        seen.mark(record['imei1'])
+    seen.persist([record['imei1'] for record in records])
+
+def bench_saves(sizes: list, repeat: int) -> list:
+    """CSV, BC.xlsx and seen-IMEI writes timed separately, per row and per full writer batch"""
+    from config import WRITER_FLUSH_ROWS
+    from file_manager import FileManager, CSV_HEADERS
+    from seen_imei_store import SeenImeiStore
+    
+    results = []
+    for size in sizes:
+        with workdir(), quiet():
+            file_manager = FileManager()
+            with open(file_manager.csv_file, 'w', newline='', encoding='utf-8') as f:
+                f.write(','.join(CSV_HEADERS) + '\n')
+                for i in range(size):
+                    record = sample_record(i)
+                    f.write(','.join(file_manager._csv_row(record)) + '\n')
+            file_manager.bc_workbook.rebuild(file_manager._bc_row(sample_record(i)) for i in range(size))
+            seen = SeenImeiStore().load()
+            for i in range(size):
+                seen.mark(sample_record(i)['imei1'])
+            seen.compact()
+            seen.close()
+            
+            load_start = time.perf_counter()
+            seen = SeenImeiStore().load()
+            load_us = (time.perf_counter() - load_start) * 1e6
+            hit, miss = sample_record(size // 2)['imei1'], sample_record(size * 3)['imei1']
+            hit_stats = measure(lambda: hit in seen, repeat)
+            miss_stats = measure(lambda: miss in seen, repeat)
+            
+            # Records are built up front so only the writes are timed (no Parquet, no summary)
+            counter = itertools.count(size)
+            save_stats = {}
+            for batch in sorted({1, WRITER_FLUSH_ROWS}):
+                batches = iter([[sample_record(next(counter)) for _ in range(batch)] for _ in range(3 * repeat)])
+                save_stats[batch] = {
+                    'save_csv': measure(lambda: file_manager._save_to_csv(next(batches)), repeat),
+                    'save_bc_xlsx': measure(lambda: file_manager._save_to_bc_excel(next(batches)), repeat),
+                    'save_seen_imei': measure(lambda: persist_seen(seen, next(batches)), repeat),
+                }
+            seen.close()
+            file_manager.close()
+        
+        params = {'existing_rows': size}
+        for batch, stats in save_stats.items():
+            for name, stat in stats.items():
+                results.append({'name': name, 'params': {**params, 'batch': batch}, **stat})
+        results.append({'name': 'seen_imei_hit', 'params': params, **hit_stats})
+        results.append({'name': 'seen_imei_miss', 'params': params, **miss_stats})
+        results.append({'name': 'load_seen_imei', 'params': params, 'repeat': 1,
+                        'mean_us': round(load_us, 3), 'p50_us': round(load_us, 3), 'p95_us': round(load_us, 3)})
+    return results
+
+def bench_end_to_end(devices: int, latency: float, workers: int) -> list:
+    if platform.system() == 'Windows':
+        return []
+    
+    from background_writer import BackgroundWriter
+    from device_simulator import install
+    from extraction_pipeline import ExtractionPipeline
+    
+    with workdir() as path, quiet():
+        scenario_file = os.path.join(path, 'scenario.json')
+        info = {key: value for key, value in SAMPLE_DEVICE_INFO.items()
+                if key not in ('InternationalMobileEquipmentIdentity', 'SerialNumber')}
+        with open(scenario_file, 'w') as f:
+            json.dump({'defaults': {'latency': {'ideviceinfo': latency}, 'info': info},
+                       'generate': {'count': devices}}, f)
+        original_env = dict(os.environ)
+        os.environ.update(install(scenario_file, os.path.join(path, 'bin')))
+        try:
+            from data_manager import DataManager
+            from device_scanner import DeviceScanner
+            from file_manager import FileManager
+            
+            data_manager = DataManager()
+            file_manager = FileManager()
+            scanner = DeviceScanner(data_manager)
+            writer = BackgroundWriter(file_manager, data_manager).start()
+            pipeline = ExtractionPipeline(scanner, max_workers=workers)
+            
+            start = time.perf_counter()
+            for udid in scanner.get_connected_devices():
+                pipeline.submit(udid)
+            saved = 0
+            while saved < devices and (pipeline.pending_count() or not pipeline.results.empty()):
+                for udid, info in pipeline.wait_for_results(1.0):
+                    if info and data_manager.seen_imei.mark(info['imei1']):
+                        writer.submit(info)
+                        saved += 1
+            writer.drain()
+            elapsed = time.perf_counter() - start
+            
+            pipeline.shutdown()
+            writer.close()
+            data_manager.close()
+        finally:
+            os.environ.clear()
+            os.environ.update(original_env)
+    
+    return [{'name': 'end_to_end', 'params': {'devices': devices, 'tool_latency_s': latency, 'workers': workers},
+             'saved': saved, 'elapsed_s': round(elapsed, 3),
+             'devices_per_minute': round(saved / elapsed * 60, 1) if elapsed else 0.0}]
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=False).stdout.strip() or 'unknown'
+    except OSError:
+        return 'unknown'
+
+def result_key(result: dict) -> str:
+    return result['name'] + json.dumps(result['params'], sort_keys=True)
+
+def compare(current: list, baseline_path: str, threshold: float) -> list:
+    """Results that got slower than the baseline by more than threshold"""
+    with open(baseline_path, 'r') as f:
+        baseline = {result_key(r): r for r in json.load(f)['results']}
+    
+    regressions = []
+    for result in current:
+        previous = baseline.get(result_key(result))
+        if not previous:
+            continue
+        if 'devices_per_minute' in result:
+            old, new = previous['devices_per_minute'], result['devices_per_minute']
+            if old and new < old * (1 - threshold):
+                regressions.append((result_key(result), old, new))
+        elif previous.get('p50_us') and result['p50_us'] > previous['p50_us'] * (1 + threshold):
+            regressions.append((result_key(result), previous['p50_us'], result['p50_us']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark extraction and save hot paths')
+    parser.add_argument('--quick', action='store_true', help='smaller sizes and fewer repeats')
+    parser.add_argument('--sizes', default=None, help='existing row counts, e.g. 1000,10000,100000')
+    parser.add_argument('--devices', type=int, default=None, help='simulated devices for the end-to-end run')
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated idevice tool latency (s)')
+    parser.add_argument('--workers', type=int, default=None, help='extraction workers for the end-to-end run')
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--compare', help='earlier JSON results to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown before flagging (0.25 = 25%%)')
+    args = parser.parse_args()
+    
+    from config import MAX_EXTRACTION_WORKERS
+    
+    repeat = 200 if args.quick else 2000
+    save_repeat = 20 if args.quick else 100
+    sizes = [int(s) for s in args.sizes.split(',')] if args.sizes else ([1000, 10000] if args.quick else [1000, 10000, 100000])
+    devices = args.devices or (20 if args.quick else 100)
+    
+    results = []
+    results += bench_parsing(repeat)
+    results += bench_storage(repeat)
+    results += bench_lookups(repeat)
+    results += bench_saves(sizes, save_repeat)
+    results += bench_end_to_end(devices, args.latency, args.workers or MAX_EXTRACTION_WORKERS)
+    
+    for result in results:
+        params = ' '.join(f'{k}={v}' for k, v in result['params'].items())
+        if 'devices_per_minute' in result:
+            print(f"{result['name']:<32} {params:<60} {result['devices_per_minute']:>10.1f} devices/min")
+        else:
+            print(f"{result['name']:<32} {params:<60} p50 {result['p50_us']:>10.1f} us  p95 {result['p95_us']:>10.1f} us")
+    
+    report = {
+        'version': RESULTS_VERSION,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for key, old, new in regressions:
+            print(f"REGRESSION {key}: {old} -> {new}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
+
+if __name__ == '__main__':
+    main()
@@ -17,11 +17,103 @@ PRODUCT_MAPPING = {
     "iPhone15,5": "iPhone 15 Plus", "iPhone16,1": "iPhone 15 Pro",
     "iPhone16,2": "iPhone 15 Pro Max", "iPhone17,1": "iPhone 16",
     "iPhone17,2": "iPhone 16 Plus", "iPhone17,3": "iPhone 16 Pro",
-    "iPhone17,4": "iPhone 16 Pro Max",
+    "iPhone17,4": "iPhone 16 Pro Max", "iPhone17,5": "iPhone 16e",
+    "iPhone18,3": "iPhone 17", "iPhone18,1": "iPhone 17 Pro",
+    "iPhone18,2": "iPhone 17 Pro Max", "iPhone18,4": "iPhone Air",
 }
 
 MODEL_MAPPING_FILE = 'model_mapping.json'
 UPC_MAPPING_FILE = 'upc_mapping.json'
+PRODUCT_MAPPING_FILE = 'product_mapping.json'  # optional ProductType additions/overrides
 SEEN_IMEI_FILE = 'seen_imei.json'
 CSV_FILE = 'iphone_data.csv'
-BC_FILE = 'BC.xlsx'
\ No newline at end of file
+BC_FILE = 'BC.xlsx'
+
+MAX_EXTRACTION_WORKERS = 8
+MONITOR_POLL_INTERVAL = 2
+
+# Mapping files are re-read when they change; unmapped ProductTypes are counted
+MAPPING_WATCH_INTERVAL = 2.0
+UNKNOWN_PRODUCT_TYPES_FILE = 'unknown_product_types.json'
+MAPPING_CACHE_FILE = 'mappings.cache'  # compiled tables keyed by a hash of the sources; None = always JSON
+
+# usbmuxd attach/detach events (polling with idevice_id is the fallback)
+USE_USBMUX_EVENTS = True
+USBMUXD_SOCKET_PATH = '/var/run/usbmuxd'
+USBMUXD_TCP_ADDRESS = ('127.0.0.1', 27015)
+USBMUX_RECONNECT_DELAY = 5
+
+# Seen-IMEI index: sorted uint64 IMEIs + Bloom filter, memory-mapped (SEEN_IMEI_FILE is migrated once)
+SEEN_IMEI_INDEX_FILE = 'seen_imei.idx'
+# Seen-IMEI journal: appended per device, replayed at startup, compacted into SEEN_IMEI_INDEX_FILE
+SEEN_IMEI_JOURNAL_FILE = 'seen_imei.journal'
+SEEN_IMEI_FSYNC_BATCH = 16
+SEEN_IMEI_FSYNC_INTERVAL = 1.0
+SEEN_IMEI_COMPACT_THRESHOLD = 5000
+
+# Bulk import of old CSV/XLSX exports into the seen-IMEI store (`python main.py import`)
+IMPORT_CHUNK_ROWS = 10000
+IMPORT_COMPACT_EVERY = 250000
+IMPORT_PROGRESS_INTERVAL = 2.0
+
+# SQLite scan history (CSV/XLSX can be exported from it)
+INVENTORY_DB_FILE = 'inventory.db'
+INVENTORY_BATCH_SIZE = 20
+INVENTORY_FLUSH_INTERVAL = 2.0
+
+# Parquet copy of the scan history, partitioned by scan date (needs pyarrow)
+PARQUET_ENABLED = True
+PARQUET_DIR = 'parquet'
+PARQUET_FLUSH_ROWS = 500
+PARQUET_COMPACT_MIN_FILES = 4
+
+# Device counts by product/storage/color/region/day, kept next to the CSV (`python main.py report`)
+SUMMARY_FILE = 'inventory_summary.json'
+SUMMARY_SAVE_INTERVAL = 5.0
+
+# Background writer for CSV/Excel/database/seen-IMEI saves
+WRITER_QUEUE_SIZE = 1000
+WRITER_FLUSH_ROWS = 10
+WRITER_FLUSH_INTERVAL = 1.0
+
+# Per-stage timing spans (summarize with `python telemetry.py`)
+TELEMETRY_ENABLED = True
+TELEMETRY_FILE = 'telemetry.jsonl'
+TELEMETRY_MAX_BYTES = 5 * 1024 * 1024
+TELEMETRY_BACKUPS = 3
+TELEMETRY_FLUSH_INTERVAL = 1.0
+
+# asyncio scanner engine: concurrent tool processes and per-device time budget (seconds)
+ENGINE_MAX_CONCURRENCY = 16
+DEVICE_DEADLINE = 25
+DETECT_TIMEOUT = 5
+SHUTDOWN_TIMEOUT = 5
+
+# Retries for devices whose extraction failed (booting, locked, not trusted yet)
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 60.0
+RETRY_JITTER = 0.25
+
+# Shutdown queue (monitor + shutdown): a phone counts as off once it leaves the USB bus
+SHUTDOWN_MAX_ATTEMPTS = 3
+SHUTDOWN_RETRY_DELAY = 3.0
+SHUTDOWN_CONFIRM_TIMEOUT = 20.0
+SHUTDOWN_CONFIRM_POLL = 2.0
+SHUTDOWN_DRAIN_TIMEOUT = 30.0
+
+# Optional cross-station coordinator (`python coordinator.py`); None = this station only
+COORDINATOR_URL = None  # e.g. 'http://192.168.1.10:8765'
+COORDINATOR_HOST = '127.0.0.1'
+COORDINATOR_PORT = 8765
+COORDINATOR_TIMEOUT = 2.0
+COORDINATOR_POOL_SIZE = 4
+COORDINATOR_CACHE_SIZE = 100000
+COORDINATOR_RETRY_INTERVAL = 10
+COORDINATOR_MAX_BATCH = 1000
+COORDINATOR_QUEUE_FILE = 'coordinator_queue.txt'
+
+# Live dashboard for monitor mode (`python main.py monitor --dashboard`)
+DASHBOARD_ENABLED = False
+DASHBOARD_FPS = 4
+DASHBOARD_LOG_LINES = 6
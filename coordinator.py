@@ -0,0 +1,116 @@
+# coordinator.py
+# Shared seen-IMEI list for several scanning stations.
+#
+#   python coordinator.py                          # localhost:8765, files in the current directory
+#   python coordinator.py --host 0.0.0.0 --data-dir /srv/ipscan
+#
+# Stations point COORDINATOR_URL (config.py) or `python main.py --coordinator URL` at it.
+import argparse
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils import print_success, print_info, print_warning, ensure_full_imei
+from config import COORDINATOR_HOST, COORDINATOR_PORT, COORDINATOR_MAX_BATCH
+from seen_imei_store import SeenImeiStore
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    """
+    POST /check {"imeis": [...]}                  -> {"seen": [...]}
+    POST /claim {"imeis": [...], "station": name} -> {"claimed": [...], "taken": {imei: station}}
+    GET  /health                                  -> {"ok": true, "count": n}
+    
+    A claim is atomic per IMEI: of two stations claiming the same phone,
+    exactly one gets it back in "claimed".
+    """
+    
+    protocol_version = 'HTTP/1.1'  # keep-alive for the stations' pooled connections
+    
+    def do_GET(self):
+        if self.path != '/health':
+            return self.send_json(404, {'error': 'not found'})
+        self.send_json(200, {'ok': True, 'count': len(self.server.seen_imei)})
+    
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            imeis = [ensure_full_imei(str(imei)) for imei in request.get('imeis', [])]
+        except (ValueError, TypeError, AttributeError):
+            return self.send_json(400, {'error': 'expected {"imeis": [...]}'})
+        if len(imeis) > COORDINATOR_MAX_BATCH:
+            return self.send_json(413, {'error': f'at most {COORDINATOR_MAX_BATCH} IMEIs per request'})
+        imeis = [imei for imei in imeis if imei != 'N/A']
+        
+        if self.path == '/check':
+            seen = self.server.seen_imei
+            self.send_json(200, {'seen': [imei for imei in imeis if imei in seen]})
+        elif self.path == '/claim':
+            claimed, taken = self.server.claim(imeis, str(request.get('station') or self.client_address[0]))
+            self.send_json(200, {'claimed': claimed, 'taken': taken})
+        else:
+            self.send_json(404, {'error': 'not found'})
+    
+    def send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class CoordinatorServer(ThreadingHTTPServer):
+    """HTTP server around one SeenImeiStore; claims are journaled like local saves"""
+    
+    daemon_threads = True
+    
+    def __init__(self, address, seen_imei, verbose: bool = False):
+        super().__init__(address, CoordinatorHandler)
+        self.seen_imei = seen_imei
+        self.verbose = verbose
+        self.claims = {}  # imei -> station, for claims made since startup
+        self.lock = threading.Lock()
+    
+    def claim(self, imeis: list, station: str):
+        claimed, taken = [], {}
+        with self.lock:
+            for imei in imeis:
+                if self.seen_imei.mark(imei):
+                    claimed.append(imei)
+                    self.claims[imei] = station
+                else:
+                    taken[imei] = self.claims.get(imei, 'another station')
+        if claimed:
+            self.seen_imei.persist(claimed)
+            print_info(f"{station}: claimed {len(claimed)}, {len(taken)} already taken")
+        return claimed, taken
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Cross-station seen-IMEI coordinator")
+    parser.add_argument('--host', default=COORDINATOR_HOST, help="address to listen on (0.0.0.0 for the LAN)")
+    parser.add_argument('--port', type=int, default=COORDINATOR_PORT)
+    parser.add_argument('--data-dir', default='.', help="where seen_imei.idx / seen_imei.journal live")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args(argv)
+    
+    os.chdir(args.data_dir)
+    seen_imei = SeenImeiStore().load()
+    server = CoordinatorServer((args.host, args.port), seen_imei, args.verbose)
+    print_success(f"Coordinator listening on http://{args.host}:{server.server_port} ({len(seen_imei)} IMEIs)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print_warning("Coordinator stopped")
+    finally:
+        server.server_close()
+        seen_imei.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
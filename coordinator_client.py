@@ -0,0 +1,169 @@
+# coordinator_client.py
+import http.client
+import json
+import os
+import platform
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+from urllib.parse import urlsplit
+
+from utils import print_warning, print_info
+from config import (COORDINATOR_TIMEOUT, COORDINATOR_POOL_SIZE, COORDINATOR_CACHE_SIZE,
+                    COORDINATOR_RETRY_INTERVAL, COORDINATOR_QUEUE_FILE, COORDINATOR_MAX_BATCH)
+from telemetry import span
+
+class CoordinatorUnavailable(Exception):
+    pass
+
+class CoordinatorClient:
+    """
+    Station side of coordinator.py.
+    
+    Requests reuse keep-alive connections from a small pool and carry whole
+    batches of IMEIs, so a hub of devices costs one round trip. IMEIs known
+    to be taken are cached (an IMEI never becomes unseen). While the
+    coordinator is unreachable, claims are granted locally and queued in
+    COORDINATOR_QUEUE_FILE (one IMEI per line); the queue is sent first once
+    it answers again, and any IMEI another station saved meanwhile is reported.
+    """
+    
+    def __init__(self, url: str, station: Optional[str] = None, timeout: float = COORDINATOR_TIMEOUT,
+                 pool_size: int = COORDINATOR_POOL_SIZE, queue_file: str = COORDINATOR_QUEUE_FILE):
+        parts = urlsplit(url if '://' in url else f'http://{url}')
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.station = station or platform.node() or 'station'
+        self.timeout = timeout
+        self.queue_file = queue_file
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.offline_until = 0.0
+        self.queued = self._load_queue()
+    
+    def _connection(self) -> http.client.HTTPConnection:
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+    
+    def _release(self, connection: http.client.HTTPConnection):
+        try:
+            self.pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+    
+    def request(self, path: str, body: Dict) -> Dict:
+        """POST JSON; one retry on a fresh connection if a pooled one went stale"""
+        if time.monotonic() < self.offline_until:
+            raise CoordinatorUnavailable("offline")
+        
+        payload = json.dumps(body).encode('utf-8')
+        with span('coordinator', path=path, imeis=len(body.get('imeis', ()))) as timing:
+            for attempt in range(2):
+                connection = self._connection()
+                try:
+                    connection.request('POST', path, payload, {'Content-Type': 'application/json'})
+                    response = connection.getresponse()
+                    data = response.read()
+                    if response.status != 200:
+                        connection.close()
+                        raise CoordinatorUnavailable(f"HTTP {response.status}: {data[:200]!r}")
+                    self._release(connection)
+                    return json.loads(data)
+                except (OSError, http.client.HTTPException, ValueError) as e:
+                    connection.close()
+                    if attempt:
+                        timing['ok'] = False
+                        self.offline_until = time.monotonic() + COORDINATOR_RETRY_INTERVAL
+                        print_warning(f"Coordinator unreachable ({e}), working offline")
+                        raise CoordinatorUnavailable(str(e))
+    
+    def _remember(self, imeis: Iterable[str]):
+        with self.lock:
+            for imei in imeis:
+                self.cache[imei] = True
+                self.cache.move_to_end(imei)
+            while len(self.cache) > COORDINATOR_CACHE_SIZE:
+                self.cache.popitem(last=False)
+    
+    def cached(self, imei: str) -> bool:
+        """Known taken without asking (safe to call from the event loop)"""
+        with self.lock:
+            return imei in self.cache
+    
+    def check(self, imeis: List[str]) -> Set[str]:
+        """IMEIs already saved by any station (cache only while offline)"""
+        seen = {imei for imei in imeis if self.cached(imei)}
+        unknown = [imei for imei in dict.fromkeys(imeis) if imei not in seen]
+        try:
+            self.flush_queue()
+            for start in range(0, len(unknown), COORDINATOR_MAX_BATCH):
+                answer = self.request('/check', {'imeis': unknown[start:start + COORDINATOR_MAX_BATCH]})
+                self._remember(answer['seen'])
+                seen.update(answer['seen'])
+        except CoordinatorUnavailable:
+            pass
+        return seen
+    
+    def claim(self, imeis: List[str]) -> Set[str]:
+        """Reserve IMEIs for this station; returns the ones it may save"""
+        imeis = [imei for imei in dict.fromkeys(imeis) if not self.cached(imei)]
+        claimed = set()
+        try:
+            self.flush_queue()
+            for start in range(0, len(imeis), COORDINATOR_MAX_BATCH):
+                answer = self.request('/claim', {'imeis': imeis[start:start + COORDINATOR_MAX_BATCH],
+                                                 'station': self.station})
+                claimed.update(answer['claimed'])
+                self._remember(answer['claimed'])
+                self._remember(answer['taken'])
+        except CoordinatorUnavailable:
+            pending = [imei for imei in imeis if imei not in claimed]
+            self._enqueue(pending)
+            claimed.update(pending)
+        return claimed
+    
+    def _load_queue(self) -> List[str]:
+        if not os.path.exists(self.queue_file):
+            return []
+        with open(self.queue_file, 'r') as f:
+            return [line.strip() for line in f if line.strip()]
+    
+    def _enqueue(self, imeis: List[str]):
+        if not imeis:
+            return
+        with self.lock:
+            self.queued.extend(imeis)
+            with open(self.queue_file, 'a') as f:
+                f.write(''.join(f'{imei}\n' for imei in imeis))
+        print_info(f"{len(imeis)} claim(s) queued until the coordinator is back ({len(self.queued)} pending)")
+    
+    def flush_queue(self):
+        """Send claims made while offline; warn about IMEIs another station got first"""
+        with self.lock:
+            pending = list(self.queued)
+        if not pending:
+            return
+        
+        for start in range(0, len(pending), COORDINATOR_MAX_BATCH):
+            batch = pending[start:start + COORDINATOR_MAX_BATCH]
+            answer = self.request('/claim', {'imeis': batch, 'station': self.station})
+            self._remember(batch)
+            for imei, station in answer['taken'].items():
+                print_warning(f"IMEI {imei} was saved here while offline, but {station} already had it")
+            with self.lock:
+                self.queued = self.queued[len(batch):]
+                with open(self.queue_file, 'w') as f:
+                    f.write(''.join(f'{imei}\n' for imei in self.queued))
+        print_info(f"Sent {len(pending)} queued claim(s) to the coordinator")
+    
+    def close(self):
+        while True:
+            try:
+                self.pool.get_nowait().close()
+            except queue.Empty:
+                break
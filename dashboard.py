@@ -0,0 +1,217 @@
+# dashboard.py
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from colors import Colors
+from utils import format_imei
+from config import DASHBOARD_FPS, DASHBOARD_LOG_LINES
+from telemetry import telemetry
+
+STATE_COLORS = {
+    'detected': Colors.BRIGHT_WHITE,
+    'extracting': Colors.BRIGHT_CYAN,
+    'saved': Colors.BRIGHT_GREEN,
+    'duplicate': Colors.BRIGHT_YELLOW,
+    'failed': Colors.BRIGHT_RED,
+    'retrying': Colors.YELLOW,
+    'shutting down': Colors.BRIGHT_MAGENTA,
+    'shut down': Colors.MAGENTA,
+    'still on': Colors.BRIGHT_RED,
+    'unplugged': Colors.DIM,
+}
+ACTIVE_STATES = ('detected', 'extracting', 'retrying', 'shutting down')
+
+ANSI_CODES = re.compile(r'\033\[[0-9;?]*[A-Za-z]')
+
+# Per-device stages shown in the timings column (telemetry span name -> label)
+TIMING_STAGES = [('probe', 'probe'), ('info_fetch', 'fetch'), ('extract', 'total'), ('shutdown', 'off')]
+
+def fit(line: str, width: int) -> str:
+    """Cut a line to width visible characters, keeping its colour codes (a wrapped line breaks the redraw)"""
+    out, room, pos = [], width, 0
+    for match in ANSI_CODES.finditer(line):
+        text = line[pos:match.start()][:room]
+        out.append(text)
+        room -= len(text)
+        out.append(match.group())
+        pos = match.end()
+    out.append(line[pos:][:room])
+    return ''.join(out)
+
+class DeviceBoard:
+    """
+    Shared state for the dashboard: one row per UDID with its current state
+    and outcome (saved / duplicate / failed). Session counts are kept apart
+    from the rows, so a replugged phone starting over never takes back an
+    earlier outcome. Updates are a dict write under a lock, so extraction
+    threads never wait on the terminal.
+    """
+    
+    def __init__(self):
+        self.rows: Dict[str, Dict] = {}
+        self.counts = {'saved': 0, 'duplicate': 0, 'failed': 0}
+        self.started = time.monotonic()
+        self.version = 0
+        self.lock = threading.Lock()
+    
+    def update(self, udid: str, state: Optional[str] = None, **fields):
+        """Set a device's state and any of product / imei / result / message"""
+        with self.lock:
+            row = self.rows.setdefault(udid, {'udid': udid, 'state': 'detected', 'since': time.monotonic(),
+                                              'product': '', 'imei': '', 'result': None, 'message': '',
+                                              'timings': {}})
+            if state is not None and state != row['state']:
+                row['state'] = state
+                row['since'] = time.monotonic()
+            row.update(fields)
+            if fields.get('result') in self.counts:
+                self.counts[fields['result']] += 1
+            self.version += 1
+    
+    def state(self, udid: str) -> Optional[str]:
+        with self.lock:
+            row = self.rows.get(udid)
+            return row['state'] if row else None
+    
+    def on_span(self, stage: str, seconds: float, udid: Optional[str], fields: Dict):
+        """Telemetry listener: keep the latest per-device stage timings"""
+        if udid is None:
+            return
+        with self.lock:
+            row = self.rows.get(udid)
+            if row is not None:
+                row['timings'][stage] = seconds
+                self.version += 1
+    
+    def snapshot(self):
+        with self.lock:
+            rows = [dict(row, timings=dict(row['timings'])) for row in self.rows.values()]
+            return rows, dict(self.counts)
+
+class LogCapture:
+    """Stands in for sys.stdout while the dashboard is up: keeps the last lines for display"""
+    
+    def __init__(self, lines: int):
+        self.lines = deque(maxlen=lines)
+        self.partial = ''
+        self.lock = threading.Lock()
+    
+    def write(self, text: str) -> int:
+        with self.lock:
+            parts = (self.partial + text).split('\n')
+            self.partial = parts.pop()
+            self.lines.extend(part for part in parts if part.strip())
+        return len(text)
+    
+    def flush(self):
+        pass
+    
+    def isatty(self) -> bool:
+        return False
+    
+    def tail(self) -> List[str]:
+        with self.lock:
+            return list(self.lines)
+
+class Dashboard:
+    """
+    Redraws the DeviceBoard in place, at most DASHBOARD_FPS times a second
+    and only when something changed (or once a second for the clocks).
+    Status prints from the rest of the app are captured and the latest
+    few are shown under the table; the captured lines are printed on stop().
+    """
+    
+    def __init__(self, board: DeviceBoard, title: str = "DEVICE MONITORING", fps: float = DASHBOARD_FPS,
+                 log_lines: int = DASHBOARD_LOG_LINES):
+        self.board = board
+        self.title = title
+        self.interval = 1.0 / max(fps, 0.1)
+        self.log = LogCapture(max(log_lines, 1) * 50)
+        self.log_lines = log_lines
+        self.stdout = None
+        self.stop_event = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        self.stdout = sys.stdout
+        sys.stdout = self.log
+        telemetry.add_listener(self.board.on_span)
+        self.stdout.write('\033[?25l\033[2J')  # hide cursor, clear once
+        self._thread = threading.Thread(target=self._run, name='dashboard', daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        if self._thread is None:
+            return
+        self.stop_event.set()
+        self._thread.join()
+        self._thread = None
+        telemetry.remove_listener(self.board.on_span)
+        self.render()
+        sys.stdout = self.stdout
+        self.stdout.write('\033[?25h\n')
+        for line in self.log.tail():
+            print(line)
+    
+    def _run(self):
+        drawn_version, drawn_at = -1, 0.0
+        while not self.stop_event.wait(self.interval):
+            version = self.board.version
+            if version != drawn_version or time.monotonic() - drawn_at >= 1.0:
+                drawn_version, drawn_at = version, time.monotonic()
+                try:
+                    self.render()
+                except Exception:
+                    pass
+    
+    def render(self):
+        width, height = shutil.get_terminal_size((100, 30))
+        rows, counts = self.board.snapshot()
+        elapsed = time.monotonic() - self.board.started
+        rate = counts['saved'] / (elapsed / 60) if elapsed >= 1 else 0.0
+        active = sum(1 for row in rows if row['state'] in ACTIVE_STATES)
+        
+        lines = [
+            f"{Colors.BOLD}{Colors.BRIGHT_WHITE}{self.title}{Colors.RESET}  "
+            f"{Colors.DIM}{time.strftime('%H:%M:%S')}  up {int(elapsed // 60)}m{int(elapsed % 60):02d}s  Ctrl+C to stop{Colors.RESET}",
+            f"{Colors.BRIGHT_GREEN}saved {counts['saved']}{Colors.RESET}  "
+            f"{Colors.BRIGHT_YELLOW}duplicate {counts['duplicate']}{Colors.RESET}  "
+            f"{Colors.BRIGHT_RED}failed {counts['failed']}{Colors.RESET}  "
+            f"in progress {active}  {Colors.BRIGHT_CYAN}{rate:.1f} devices/min{Colors.RESET}",
+            f"{Colors.BRIGHT_CYAN}{'─' * min(width, 108)}{Colors.RESET}",
+            f"{Colors.BOLD}{'UDID':<15}{'STATE':<15}{'PRODUCT':<20}{'IMEI':<17}{'TIMINGS':<38}{'AGE':>5}{Colors.RESET}",
+        ]
+        
+        # Devices still in progress first, then the most recently finished
+        rows.sort(key=lambda row: (row['state'] not in ACTIVE_STATES, -row['since']))
+        room = max(1, height - len(lines) - self.log_lines - 3)
+        now = time.monotonic()
+        for row in rows[:room]:
+            timings = ' '.join(f"{label} {row['timings'][stage]:.1f}s" for stage, label in TIMING_STAGES
+                               if stage in row['timings'])
+            color = STATE_COLORS.get(row['state'], Colors.RESET)
+            # Hub devices often share the first UDID characters, so keep both ends
+            udid = row['udid'] if len(row['udid']) <= 13 else f"{row['udid'][:8]}…{row['udid'][-4:]}"
+            line = (f"{udid:<15}{color}{row['state']:<15}{Colors.RESET}"
+                    f"{row['product'][:19]:<20}{format_imei(row['imei']) if row['imei'] else '':<17}"
+                    f"{Colors.DIM}{timings:<38}{Colors.RESET}{int(now - row['since']):>4}s")
+            if row['message']:
+                line += f"  {Colors.DIM}{row['message']}{Colors.RESET}"
+            lines.append(line)
+        if len(rows) > room:
+            lines.append(f"{Colors.DIM}... {len(rows) - room} more{Colors.RESET}")
+        
+        lines.append(f"{Colors.BRIGHT_CYAN}{'─' * min(width, 108)}{Colors.RESET}")
+        lines.extend(f"{Colors.DIM}{ANSI_CODES.sub('', line)}{Colors.RESET}"
+                     for line in self.log.tail()[-self.log_lines:])
+        
+        # Home, overwrite each line, clear whatever is left below
+        frame = '\033[H' + ''.join(f"{fit(line, width - 1)}\033[K\n" for line in lines) + '\033[J'
+        self.stdout.write(frame)
+        self.stdout.flush()
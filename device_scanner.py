@@ -5,95 +5,207 @@ from typing import Dict, Optional, Set
 from datetime import datetime
 
 from utils import *
-from config import PRODUCT_MAPPING
+from config import DEVICE_DEADLINE
 from storage_extractor import extract_storage_capacity_real
 from color_detector import extract_device_color
+from retry_scheduler import RetryScheduler
+from telemetry import span
 
 class DeviceScanner:
-    def __init__(self, data_manager):
+    """
+    Blocking front end over ScannerEngine: each method runs the engine
+    coroutine on its event loop and waits. Async callers (ExtractionPipeline)
+    use extract_device_info() directly.
+    """
+    
+    def __init__(self, data_manager, engine=None):
         self.data_manager = data_manager
+        self._engine = engine
         self.connected_devices = set()
-        self.device_retry_count = {}
-        self.max_retries = 3
+        self.retries = RetryScheduler()
+        self.last_error: Dict[str, str] = {}
+    
+    @property
+    def engine(self):
+        """The shared ScannerEngine (asyncio is imported on first device call, not at startup)"""
+        if self._engine is None:
+            from scanner_engine import shared_engine
+            self._engine = shared_engine()
+        return self._engine
+    
+    def close(self):
+        """Stop the engine's event loop if it was ever started"""
+        if self._engine is not None:
+            self._engine.close()
+    
+    def _deadline(self, seconds: float):
+        from scanner_engine import Deadline
+        return Deadline(seconds)
+    
+    def get_connected_devices(self) -> Set[str]:
+        """Get list of connected UDIDs"""
+        try:
+            return self.engine.call(self.engine.list_devices())
+        except Exception as e:
+            print_error(f"Error getting UDIDs: {e}")
+        return set()
+    
+    def query_domain(self, udid: str, domain: Optional[str] = None, timeout: float = DEVICE_DEADLINE) -> Optional[Dict]:
+        """Run one ideviceinfo call and return the parsed plist"""
+        return self.engine.call(self.engine.query_domain(udid, self._deadline(timeout), domain))
     
-    def extract_device_info_real(self, udid: str) -> Optional[Dict]:
+    def fetch_device_info(self, udid: str) -> Optional[Dict]:
+        """Root lockdown domain plus disk usage when needed, within one device deadline"""
+        return self.engine.call(self.engine.fetch_device_info(udid, self._deadline(DEVICE_DEADLINE)))
+    
+    def extract_device_info_real(self, udid: str, full: bool = True) -> Optional[Dict]:
         """Extract REAL device information - NO DUMMY DATA"""
-        retry_count = self.device_retry_count.get(udid, 0)
-        
-        if retry_count >= self.max_retries:
-            return None
+        return self.engine.call(self.extract_device_info(udid, full))
+    
+    async def extract_device_info(self, udid: str, full: bool = False) -> Optional[Dict]:
+        """
+        Extraction coroutine: every tool call shares one DEVICE_DEADLINE budget.
+        Unless full is set, a known IMEI short-circuits to known_device_record().
+        On failure the reason is kept in last_error for schedule_retry().
+        """
+        deadline = self._deadline(DEVICE_DEADLINE)
+        if not full:
+            known = await self.probe_known_device(udid, deadline)
+            if known:
+                return known
         
         print_info(f"Extracting device {udid[:8]}...")
         start_time = time.time()
+        info, reason = None, None
+        
+        with span('extract', udid) as timing:
+            try:
+                # Get ALL device info in one acquisition step
+                device_info = await self.engine.fetch_device_info(udid, deadline)
+                if not device_info:
+                    reason = "lockdownd not answering (locked, untrusted or booting)"
+                else:
+                    info = self.build_device_record(udid, device_info, start_time)
+                    if info is None:
+                        reason = "IMEI not accessible"
+            except subprocess.TimeoutExpired:
+                print_error(f"Extraction timed out after {DEVICE_DEADLINE}s ({udid[:8]})")
+                reason = "timed out"
+            except Exception as e:
+                print_error(f"Extraction error: {e}")
+                reason = str(e)
+            timing['ok'] = info is not None
+        
+        if info is None:
+            self.last_error[udid] = reason
+        else:
+            self.last_error.pop(udid, None)
+        return info
+    
+    async def probe_known_device(self, udid: str, deadline) -> Optional[Dict]:
+        """
+        Ask only for the IMEI; if it was already processed (here or, per the
+        coordinator cache, at another station), fetch the serial
+        and return the known record so the full extraction can be skipped.
+        New devices pay for one extra call. Any probe problem just falls
+        through to the full extraction.
+        """
+        if self.data_manager is None:
+            return None
+        try:
+            imei = ensure_full_imei(await self.engine.probe_imei(udid, deadline) or 'N/A')
+        except (subprocess.TimeoutExpired, OSError):
+            return None
+        if imei == 'N/A' or not self.data_manager.is_seen(imei):
+            return None
         
         try:
-            # Get ALL device info
-            result = subprocess.run(
-                ['ideviceinfo', '-u', udid, '-x'],  # -x for XML/plist format
-                capture_output=True,
-                text=True,
-                check=False,
-                timeout=15
-            )
-            
-            if result.returncode != 0:
-                return None
-            
-            # Parse device info
-            device_info = self.parse_device_info(result.stdout)
-            
-            # Get critical information
-            imei1 = self.extract_imei_real(device_info, 'InternationalMobileEquipmentIdentity')
-            imei2 = self.extract_imei_real(device_info, 'InternationalMobileEquipmentIdentity2')
-            
-            # Skip if no IMEI (device not fully accessible)
-            if imei1 == 'N/A':
-                print_warning("Device IMEI not accessible")
-                return None
-            
-            serial = device_info.get('SerialNumber', 'N/A')
-            model_number = device_info.get('ModelNumber', '')
-            region_info = device_info.get('RegionInfo', '')
-            part = model_number + region_info if model_number or region_info else 'N/A'
-            product_type = device_info.get('ProductType', 'N/A')
-            product_name = PRODUCT_MAPPING.get(product_type, f'Unknown ({product_type})')
-            
-            # Get REAL storage (no estimation)
+            serial = await self.engine.query_key(udid, 'SerialNumber', deadline)
+        except (subprocess.TimeoutExpired, OSError):
+            serial = None
+        
+        # SQLite lookup on a worker thread, not on the engine loop
+        import asyncio
+        previous = await asyncio.get_running_loop().run_in_executor(None, self.data_manager.lookup, imei)
+        return self.known_device_record(udid, imei, serial, previous)
+    
+    def known_device_record(self, udid: str, imei: str, serial: Optional[str], previous: list) -> Dict:
+        """Record for an already-scanned device, filled in from its last saved scan (previous = lookup())"""
+        info = dict(previous[0]) if previous else {}
+        info.pop('id', None)
+        for key in ('imei2', 'part', 'product_name', 'product_type', 'storage', 'color',
+                    'model_id', 'upc', 'device_name', 'ios_version'):
+            info.setdefault(key, 'N/A')
+        info.update({
+            'imei1': imei,
+            'serial': serial or info.get('serial', 'N/A'),
+            'udid': udid,
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        return info
+    
+    def schedule_retry(self, udid: str):
+        """Queue another attempt for a failed device, with backoff"""
+        reason = self.last_error.pop(udid, None) or "extraction failed"
+        delay = self.retries.record_failure(udid, reason)
+        if delay is None:
+            print_error(f"Giving up on {udid[:8]}... after {self.retries.max_attempts} attempts ({reason}); replug to retry")
+        else:
+            print_warning(f"{udid[:8]}...: {reason}, retrying in {delay:.1f}s")
+    
+    def build_device_record(self, udid: str, device_info: Dict, start_time: float) -> Optional[Dict]:
+        """Turn parsed lockdown values into the record saved to CSV/Excel"""
+        # Get critical information
+        imei1 = self.extract_imei_real(device_info, 'InternationalMobileEquipmentIdentity')
+        imei2 = self.extract_imei_real(device_info, 'InternationalMobileEquipmentIdentity2')
+        
+        # Skip if no IMEI (device not fully accessible)
+        if imei1 == 'N/A':
+            print_warning("Device IMEI not accessible")
+            return None
+        
+        serial = device_info.get('SerialNumber', 'N/A')
+        model_number = device_info.get('ModelNumber', '')
+        region_info = device_info.get('RegionInfo', '')
+        part = model_number + region_info if model_number or region_info else 'N/A'
+        product_type = device_info.get('ProductType', 'N/A')
+        product_name = self.data_manager.product_name(product_type, udid)
+        
+        # Get REAL storage (no estimation)
+        with span('storage', udid):
             storage = extract_storage_capacity_real(device_info, udid)
-            
-            # Get color
+        
+        # Get color
+        with span('color', udid):
             color = extract_device_color(udid, device_info)
-            
-            # Get other info
+        
+        # Get other info
+        with span('lookup', udid):
             model_id = self.data_manager.get_model_ids(product_name, part)
             upc = self.data_manager.get_upc(product_name, storage, part)
-            
-            # Compile ALL real info
-            info = {
-                'imei1': imei1,
-                'imei2': imei2,
-                'serial': serial,
-                'part': part,
-                'product_name': product_name,
-                'product_type': product_type,
-                'storage': storage,
-                'color': color,  # Added color field
-                'model_id': model_id,
-                'upc': upc,
-                'device_name': device_info.get('DeviceName', 'N/A'),
-                'ios_version': device_info.get('ProductVersion', 'N/A'),
-                'wifi_address': device_info.get('WiFiAddress', 'N/A'),
-                'bluetooth_address': device_info.get('BluetoothAddress', 'N/A'),
-                'udid': udid,
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            
-            print_success(f"Real data extraction completed in {time.time() - start_time:.2f}s")
-            return info
-            
-        except Exception as e:
-            print_error(f"Extraction error: {e}")
-            return None
+        
+        # Compile ALL real info
+        info = {
+            'imei1': imei1,
+            'imei2': imei2,
+            'serial': serial,
+            'part': part,
+            'product_name': product_name,
+            'product_type': product_type,
+            'storage': storage,
+            'color': color,  # Added color field
+            'model_id': model_id,
+            'upc': upc,
+            'device_name': device_info.get('DeviceName', 'N/A'),
+            'ios_version': device_info.get('ProductVersion', 'N/A'),
+            'wifi_address': device_info.get('WiFiAddress', 'N/A'),
+            'bluetooth_address': device_info.get('BluetoothAddress', 'N/A'),
+            'udid': udid,
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        
+        print_success(f"Real data extraction completed in {time.time() - start_time:.2f}s")
+        return info
     
     def extract_imei_real(self, device_info: Dict, key: str) -> str:
         """Extract and validate IMEI - real data only"""
@@ -102,23 +214,23 @@ class DeviceScanner:
         if imei == 'N/A' or not imei:
             return 'N/A'
         
-        # Clean IMEI - remove spaces and non-digits
-        imei_clean = ''.join(filter(str.isdigit, str(imei)))
-        
-        # Check if it's a valid IMEI (14-16 digits)
-        if 14 <= len(imei_clean) <= 16:
-            # Standard IMEI is 15 digits, return first 15
-            return imei_clean[:15]
-        
-        return 'N/A'
+        # Same normalization as the seen-IMEI history
+        return ensure_full_imei(str(imei))
     
-    def parse_device_info(self, output: str) -> Dict:
-        """Parse device info from ideviceinfo output"""
-        device_info = {}
-        
-        for line in output.splitlines():
-            if ': ' in line:
-                key, value = line.split(': ', 1)
-                device_info[key.strip()] = value.strip()
-        
-        return device_info
\ No newline at end of file
+    def parse_device_info(self, output) -> Dict:
+        """Parse device info from ideviceinfo output (plist, or key: value text)"""
+        from scanner_engine import parse_device_info
+        return parse_device_info(output)
+    
+    def shutdown_device(self, udid: str) -> bool:
+        """Shutdown the device and wait for the command (monitor mode uses ShutdownQueue instead)"""
+        print_info(f"Shutting down device {udid[:8]}...")
+        try:
+            if self.engine.call(self.engine.shutdown_device(udid)):
+                return True
+            print_warning(f"Shutdown command failed for {udid[:8]}...")
+        except subprocess.TimeoutExpired:
+            print_warning(f"Shutdown timed out for {udid[:8]}...")
+        except OSError as e:
+            print_error(f"Shutdown error ({udid[:8]}): {e}")
+        return False
@@ -0,0 +1,416 @@
+# device_simulator.py
+# Stand-in libimobiledevice tools for load and latency testing.
+#
+#   python device_simulator.py example > scenario.json
+#   python device_simulator.py run scenario.json -- python main.py
+#   python device_simulator.py install scenario.json ./simbin   # then PATH=./simbin:$PATH
+import argparse
+import json
+import os
+import plistlib
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from usbmux_listener import encode_message, read_message
+
+TOOLS = ('idevice_id', 'ideviceinfo', 'idevicediagnostics')
+
+SCENARIO_ENV = 'IPSCAN_SIM_SCENARIO'
+STATE_ENV = 'IPSCAN_SIM_STATE'
+
+# Messages and exit codes as printed by libimobiledevice
+STATE_ERRORS = {
+    'untrusted': "ERROR: Could not connect to lockdownd: Pairing dialog response pending (-19)",
+    'locked': "ERROR: Could not connect to lockdownd: Password protected (-17)",
+    'invalid': "ERROR: Could not connect to lockdownd: Invalid HostID (-21)",
+}
+
+DEFAULT_INFO = {
+    'DeviceName': 'Simulated iPhone',
+    'ProductType': 'iPhone14,5',
+    'ProductVersion': '17.1.2',
+    'ModelNumber': 'MLPF3',
+    'RegionInfo': 'LL/A',
+    'DeviceColor': '1',
+    'DeviceEnclosureColor': '1',
+    'TotalDiskCapacity': 128000000000,
+    'WiFiAddress': 'a4:83:e7:00:00:01',
+    'BluetoothAddress': 'a4:83:e7:00:00:02',
+}
+
+EXAMPLE_SCENARIO = {
+    'defaults': {
+        'latency': {'idevice_id': 0.01, 'ideviceinfo': 0.25, 'idevicediagnostics': 0.1},
+        'info': DEFAULT_INFO,
+    },
+    'generate': {
+        'count': 100,
+        'attach_every': 0.2,
+        'variants': [
+            {'ProductType': 'iPhone14,5', 'ModelNumber': 'MLPF3', 'TotalDiskCapacity': 128000000000},
+            {'ProductType': 'iPhone15,2', 'ModelNumber': 'MQ0T3', 'TotalDiskCapacity': 256000000000},
+            {'ProductType': 'iPhone16,2', 'ModelNumber': 'MU683', 'RegionInfo': 'CH/A',
+             'TotalDiskCapacity': None},
+        ],
+        'disk_usage': {'TotalDiskCapacity': 512000000000},
+    },
+    'devices': [
+        {'udid': '00008110-SIMUNTRUSTED0001', 'state': 'untrusted', 'attach_at': 1.0},
+        {'udid': '00008110-SIMLOCKED00000001', 'state': 'locked', 'attach_at': 1.0, 'detach_at': 20.0},
+        {'udid': '00008110-SIMHANGS000000001', 'state': 'timeout', 'attach_at': 2.0},
+        {'udid': '00008110-SIMFLAKY000000001', 'fail_first': 2, 'attach_at': 2.0,
+         'info': {'InternationalMobileEquipmentIdentity': '356789120000007'}},
+    ],
+}
+
+def luhn_digit(digits: str) -> str:
+    """Check digit that makes digits + result a valid IMEI"""
+    total = 0
+    for i, ch in enumerate(reversed(digits)):
+        value = int(ch)
+        if i % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+def simulated_imei(index: int, prefix: str = '3599') -> str:
+    body = f'{prefix}{index:010d}'[-14:]
+    return body + luhn_digit(body)
+
+class DeviceSimulator:
+    """
+    Scenario-driven stand-in for idevice_id, ideviceinfo and idevicediagnostics.
+    
+    Attach/detach times are seconds since the scenario was started; the start
+    time, per-device call counts and shutdowns live in a small state directory
+    so that separate tool processes agree on what is connected.
+    """
+    
+    def __init__(self, scenario: Dict, state_dir: str):
+        self.scenario = scenario
+        self.state_dir = state_dir
+        self.defaults = scenario.get('defaults', {})
+        self.devices = self._build_devices()
+    
+    @classmethod
+    def from_env(cls):
+        with open(os.environ[SCENARIO_ENV], 'r') as f:
+            return cls(json.load(f), os.environ[STATE_ENV])
+    
+    def _build_devices(self) -> Dict[str, Dict]:
+        devices = {}
+        generate = self.scenario.get('generate') or {}
+        variants = generate.get('variants') or [{}]
+        for i in range(generate.get('count', 0)):
+            udid = f'00008110-{0x51A0000000000000 + i:016X}'
+            info = dict(generate.get('info', {}))
+            info.update(variants[i % len(variants)])
+            info.setdefault('InternationalMobileEquipmentIdentity', simulated_imei(i))
+            info.setdefault('SerialNumber', f'SIM{i:09d}')
+            attach_at = generate.get('attach_at', 0.0) + i * generate.get('attach_every', 0.0)
+            device = {key: value for key, value in generate.items()
+                      if key not in ('count', 'variants', 'info', 'attach_every', 'attach_at', 'dwell')}
+            device.update({'udid': udid, 'info': info, 'attach_at': attach_at})
+            if generate.get('dwell') is not None:
+                device['detach_at'] = attach_at + generate['dwell']
+            devices[udid] = device
+        
+        for i, device in enumerate(self.scenario.get('devices', [])):
+            device = dict(device)
+            device.setdefault('udid', f'00008110-{0x51B0000000000000 + i:016X}')
+            device['info'] = dict(device.get('info', {}))
+            device['info'].setdefault('InternationalMobileEquipmentIdentity', simulated_imei(i, '3598'))
+            device['info'].setdefault('SerialNumber', f'SIMD{i:08d}')
+            devices[device['udid']] = device
+        return devices
+    
+    def reset(self):
+        """Start the scenario clock and forget calls and shutdowns"""
+        if os.path.isdir(self.state_dir):
+            shutil.rmtree(self.state_dir)
+        os.makedirs(self.state_dir)
+        with open(os.path.join(self.state_dir, 'start'), 'w') as f:
+            f.write(repr(time.time()))
+    
+    def elapsed(self) -> float:
+        try:
+            with open(os.path.join(self.state_dir, 'start'), 'r') as f:
+                return time.time() - float(f.read())
+        except (OSError, ValueError):
+            return 0.0
+    
+    def _marker(self, udid: str, kind: str) -> str:
+        return os.path.join(self.state_dir, f'{udid}.{kind}')
+    
+    def _count_call(self, udid: str) -> int:
+        """Record one call and return how many came before it"""
+        fd = os.open(self._marker(udid, 'calls'), os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        try:
+            os.write(fd, b'.')
+            return os.fstat(fd).st_size - 1
+        finally:
+            os.close(fd)
+    
+    def attached(self, at: Optional[float] = None) -> Set[str]:
+        """UDIDs connected at scenario time at (default: now)"""
+        at = self.elapsed() if at is None else at
+        connected = set()
+        for udid, device in self.devices.items():
+            if at < device.get('attach_at', 0.0):
+                continue
+            if device.get('detach_at') is not None and at >= device['detach_at']:
+                continue
+            if os.path.exists(self._marker(udid, 'shutdown')) and device.get('detach_on_shutdown', True):
+                continue
+            connected.add(udid)
+        return connected
+    
+    def latency(self, udid: Optional[str], tool: str) -> float:
+        value = self.devices.get(udid, {}).get('latency', self.defaults.get('latency', 0.0))
+        if isinstance(value, dict):
+            return float(value.get(tool, 0.0))
+        return float(value)
+    
+    def run_tool(self, tool: str, args: List[str]) -> int:
+        udid = args[args.index('-u') + 1] if '-u' in args else None
+        time.sleep(self.latency(udid, tool))
+        
+        if tool == 'idevice_id':
+            return self._idevice_id(args)
+        
+        if udid is None:
+            attached = sorted(self.attached())
+            if not attached:
+                print("ERROR: No device found!", file=sys.stderr)
+                return 255
+            udid = attached[0]
+        if udid not in self.attached():
+            print(f"ERROR: Device {udid} not found!", file=sys.stderr)
+            return 255
+        
+        device = self.devices[udid]
+        state = device.get('state', 'ok')
+        if state == 'timeout':
+            time.sleep(device.get('hang', 3600))
+            return 255
+        if state in STATE_ERRORS:
+            print(STATE_ERRORS[state], file=sys.stderr)
+            return 255
+        if self._count_call(udid) < device.get('fail_first', 0):
+            print("ERROR: Could not connect to lockdownd: Muxer error (-8)", file=sys.stderr)
+            return 255
+        
+        if tool == 'ideviceinfo':
+            return self._ideviceinfo(device, args)
+        return self._idevicediagnostics(udid, args)
+    
+    def _idevice_id(self, args: List[str]) -> int:
+        if '-n' in args or '--network' in args:
+            return 0
+        for udid in sorted(self.attached()):
+            print(udid)
+        return 0
+    
+    def _ideviceinfo(self, device: Dict, args: List[str]) -> int:
+        domain = args[args.index('-q') + 1] if '-q' in args else None
+        if domain is None:
+            values = dict(self.defaults.get('info', DEFAULT_INFO))
+            values.update(device['info'])
+            values['UniqueDeviceID'] = device['udid']
+        elif domain == 'com.apple.disk_usage':
+            values = dict(device.get('disk_usage') or self.defaults.get('disk_usage') or {})
+        else:
+            values = dict(device.get('domains', {}).get(domain, {}))
+        values = {key: value for key, value in values.items() if value is not None}
+        
+        if '-k' in args:
+            key = args[args.index('-k') + 1]
+            if key not in values:
+                return 0
+            value = values[key]
+            if '-x' in args:
+                sys.stdout.buffer.write(plistlib.dumps(value))
+            else:
+                print(value)
+            return 0
+        
+        if '-x' in args:
+            sys.stdout.buffer.write(plistlib.dumps(values))
+        else:
+            for key, value in values.items():
+                print(f"{key}: {value}")
+        return 0
+    
+    def _idevicediagnostics(self, udid: str, args: List[str]) -> int:
+        command = next((arg for arg in args if arg in ('shutdown', 'restart', 'sleep')), None)
+        if command is None:
+            print("ERROR: Unsupported diagnostics command", file=sys.stderr)
+            return 255
+        if command in ('shutdown', 'restart'):
+            open(self._marker(udid, 'shutdown'), 'w').close()
+        print(f"SUCCESS: {'Shutting down' if command == 'shutdown' else 'Restarting'} device!")
+        return 0
+
+class FakeUsbmuxd:
+    """
+    Minimal usbmuxd socket that answers Listen and reports the scenario's
+    attach/detach events, so the event-driven monitor path can be exercised.
+    """
+    
+    def __init__(self, simulator: DeviceSimulator, path: str, poll_interval: float = 0.1):
+        self.simulator = simulator
+        self.path = path
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._server = None
+    
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen(8)
+        self._server.settimeout(0.5)
+        threading.Thread(target=self._accept, name='fake-usbmuxd', daemon=True).start()
+        return self
+    
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.close()
+    
+    def _accept(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+    
+    def _serve(self, conn: socket.socket):
+        try:
+            conn.settimeout(5)
+            request = read_message(conn)
+            tag = 1
+            if request.get('MessageType') != 'Listen':
+                conn.sendall(encode_message({'MessageType': 'Result', 'Number': 1}, tag))
+                return
+            conn.sendall(encode_message({'MessageType': 'Result', 'Number': 0}, tag))
+            
+            device_ids: Dict[str, int] = {}
+            next_id = 1
+            while not self._stop.is_set():
+                current = self.simulator.attached()
+                for udid in sorted(current - set(device_ids)):
+                    device_ids[udid] = next_id
+                    conn.sendall(encode_message({
+                        'MessageType': 'Attached',
+                        'DeviceID': next_id,
+                        'Properties': {'SerialNumber': udid, 'ConnectionType': 'USB', 'DeviceID': next_id},
+                    }, 0))
+                    next_id += 1
+                for udid in sorted(set(device_ids) - current):
+                    conn.sendall(encode_message({'MessageType': 'Detached', 'DeviceID': device_ids.pop(udid)}, 0))
+                self._stop.wait(self.poll_interval)
+        except (OSError, ValueError):
+            pass
+        finally:
+            conn.close()
+
+def install(scenario_file: str, bin_dir: str, state_dir: Optional[str] = None) -> Dict[str, str]:
+    """
+    Write shim executables into bin_dir and reset the scenario clock.
+    Returns the environment variables that route the scanner to them.
+    """
+    scenario_file = os.path.abspath(scenario_file)
+    bin_dir = os.path.abspath(bin_dir)
+    state_dir = os.path.abspath(state_dir or os.path.join(bin_dir, 'state'))
+    os.makedirs(bin_dir, exist_ok=True)
+    
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    for tool in TOOLS:
+        path = os.path.join(bin_dir, tool)
+        with open(path, 'w') as f:
+            f.write(f"#!{sys.executable}\n"
+                    f"import sys\n"
+                    f"sys.path.insert(0, {repo_dir!r})\n"
+                    f"from device_simulator import tool_main\n"
+                    f"sys.exit(tool_main({tool!r}, sys.argv[1:]))\n")
+        os.chmod(path, 0o755)
+    
+    with open(scenario_file, 'r') as f:
+        DeviceSimulator(json.load(f), state_dir).reset()
+    
+    return {
+        'PATH': bin_dir + os.pathsep + os.environ.get('PATH', ''),
+        SCENARIO_ENV: scenario_file,
+        STATE_ENV: state_dir,
+        # Keep the real usbmuxd out of it; `run` points this at FakeUsbmuxd
+        'USBMUXD_SOCKET_ADDRESS': 'UNIX:' + os.path.join(state_dir, 'usbmuxd'),
+    }
+
+def tool_main(tool: str, args: List[str]) -> int:
+    """Entry point used by the installed shims"""
+    try:
+        return DeviceSimulator.from_env().run_tool(tool, args)
+    except KeyError:
+        print(f"ERROR: {tool} simulator needs {SCENARIO_ENV} and {STATE_ENV}", file=sys.stderr)
+        return 1
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulated libimobiledevice tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    commands.add_parser('example', help='print an example scenario')
+    
+    install_parser = commands.add_parser('install', help='write tool shims into a directory')
+    install_parser.add_argument('scenario')
+    install_parser.add_argument('bin_dir')
+    
+    run_parser = commands.add_parser('run', help='run a command against the simulator')
+    run_parser.add_argument('scenario')
+    run_parser.add_argument('--no-usbmux', action='store_true', help='do not serve attach/detach events')
+    run_parser.add_argument('cmd', nargs=argparse.REMAINDER)
+    
+    args = parser.parse_args()
+    
+    if args.command == 'example':
+        print(json.dumps(EXAMPLE_SCENARIO, indent=2))
+        return 0
+    
+    if args.command == 'install':
+        env = install(args.scenario, args.bin_dir)
+        for key, value in env.items():
+            print(f"export {key}='{value}'")
+        return 0
+    
+    cmd = args.cmd[1:] if args.cmd[:1] == ['--'] else args.cmd
+    if not cmd:
+        parser.error('run needs a command, e.g. -- python main.py')
+    
+    work_dir = tempfile.mkdtemp(prefix='ipscan-sim-')
+    usbmuxd = None
+    try:
+        env = install(args.scenario, work_dir)
+        if not args.no_usbmux:
+            with open(env[SCENARIO_ENV], 'r') as f:
+                simulator = DeviceSimulator(json.load(f), env[STATE_ENV])
+            usbmuxd = FakeUsbmuxd(simulator, env['USBMUXD_SOCKET_ADDRESS'][5:]).start()
+        return subprocess.call(cmd, env={**os.environ, **env})
+    finally:
+        if usbmuxd is not None:
+            usbmuxd.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# extraction_pipeline.py
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from utils import print_error, print_warning
+from config import MAX_EXTRACTION_WORKERS
+
+class ExtractionPipeline:
+    """
+    Extract several devices at once on the scanner engine's event loop,
+    at most max_workers devices at a time (full=True skips the known-IMEI
+    probe and always extracts everything). Only one job per UDID is in
+    flight; cancel() drops it when the phone is unplugged. Finished results
+    are queued so a single caller thread can save them one by one.
+    """
+    
+    def __init__(self, device_scanner, max_workers: int = MAX_EXTRACTION_WORKERS, full: bool = False):
+        self.device_scanner = device_scanner
+        self.full = full
+        self.engine = device_scanner.engine
+        self.max_workers = max(1, max_workers)
+        self.slots = None  # created on the engine loop (3.8/3.9 bind it to the loop that creates it)
+        self.in_flight = {}
+        self.results = queue.Queue()
+        self.lock = threading.Lock()
+    
+    def submit(self, udid: str) -> bool:
+        """Queue a device for extraction, unless it is already in flight"""
+        with self.lock:
+            if udid in self.in_flight:
+                return False
+            future = self.engine.submit(udid, self._extract(udid))
+            self.in_flight[udid] = future
+        future.add_done_callback(lambda f, u=udid: self._on_done(u, f))
+        return True
+    
+    async def _extract(self, udid: str) -> Optional[Dict]:
+        if self.slots is None:
+            import asyncio  # deferred with the engine, keeps startup fast
+            self.slots = asyncio.Semaphore(self.max_workers)
+        async with self.slots:
+            return await self.device_scanner.extract_device_info(udid, full=self.full)
+    
+    def cancel(self, udid: str) -> bool:
+        """Stop extracting a device (e.g. it was unplugged mid-extraction)"""
+        with self.lock:
+            future = self.in_flight.get(udid)
+        if future is not None and future.cancel():
+            print_warning(f"Extraction cancelled: {udid[:8]}... disconnected")
+            return True
+        return False
+    
+    def _on_done(self, udid: str, future):
+        """Move a finished job onto the results queue"""
+        if not future.cancelled():
+            info = None
+            try:
+                info = future.result()
+            except Exception as e:
+                print_error(f"Extraction error ({udid[:8]}): {e}")
+            # queue first: a job always shows in pending_count() or in results,
+            # so a caller looping on either cannot stop between the two
+            self.results.put((udid, info))
+        with self.lock:
+            self.in_flight.pop(udid, None)
+    
+    def pending_count(self) -> int:
+        """Number of devices still being extracted"""
+        with self.lock:
+            return len(self.in_flight)
+    
+    def wait_for_results(self, timeout: float) -> List[Tuple[str, Optional[Dict]]]:
+        """Wait up to timeout for the first result, then collect all ready ones"""
+        finished = []
+        try:
+            finished.append(self.results.get(timeout=timeout))
+            while True:
+                finished.append(self.results.get_nowait())
+        except queue.Empty:
+            pass
+        return finished
+    
+    def shutdown(self):
+        """Cancel every extraction still running"""
+        with self.lock:
+            futures = list(self.in_flight.values())
+        for future in futures:
+            future.cancel()
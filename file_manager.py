@@ -1,78 +1,221 @@
 # file_manager.py
 import csv
-import pandas as pd
 import os
-from openpyxl import load_workbook
+from typing import Dict, Iterable, Iterator, List
+
+from utils import print_success, print_error, print_warning, print_info
+from config import CSV_FILE, BC_FILE, PARQUET_ENABLED
+from xlsx_appender import AppendableXlsx
+from parquet_sink import ParquetSink
+from inventory_summary import InventorySummary
+from telemetry import span
+
+CSV_HEADERS = [
+    'IMEI1', 'IMEI2', 'Serial', 'Part', 'Product',
+    'Storage', 'Color', 'ModelID', 'UPC',
+    'DeviceName', 'iOSVersion', 'Timestamp'
+]
+
+BC_SHEET = 'BC Data'
+BC_HEADERS = ['Product Name', 'Storage', 'Color', 'IMEI1', 'IMEI2']
 
 class FileManager:
     def __init__(self):
-        self.csv_file = 'iphone_data.csv'
-        self.bc_file = 'BC.xlsx'
+        self.csv_file = CSV_FILE
+        self.bc_file = BC_FILE
+        self.bc_workbook = AppendableXlsx(self.bc_file, BC_SHEET, BC_HEADERS)
+        self._csv_handle = None
+        self._csv_writer = None
+        self.parquet = ParquetSink() if PARQUET_ENABLED else None
+        self.summary = InventorySummary(csv_file=self.csv_file)
     
     def save_device_info(self, device_info: Dict) -> bool:
-        """Save device information with color"""
+        """Save one device (kept for callers outside the scanner; same path as save_device_infos)"""
+        return all(self.save_device_infos([device_info]).values())
+    
+    def save_device_infos(self, device_infos: List[Dict]) -> Dict[str, bool]:
+        """
+        Save a batch of devices: one CSV flush and one Excel append.
+        Returns {'csv': ok, 'xlsx': ok}; the summary and Parquet sink are
+        derived data, so their errors are reported but do not fail the batch.
+        """
+        saved = {'csv': False, 'xlsx': False}
         try:
-            self._save_to_csv(device_info)
-            self._save_to_bc_excel(device_info)
-            return True
+            self.summary.ensure_loaded()  # before the CSV append, or a rebuild would count the batch twice
         except Exception as e:
-            print_error(f"Save error: {e}")
-            return False
+            print_error(f"Error loading the inventory summary: {e}")
+        
+        try:
+            self._save_to_csv(device_infos)
+            saved['csv'] = True
+        except Exception as e:
+            print_error(f"Error saving to {self.csv_file}: {e}")
+            return saved
+        
+        try:
+            self.summary.add(device_infos)
+        except Exception as e:
+            print_error(f"Error updating the inventory summary: {e}")
+        
+        try:
+            self._prepare_bc_excel()
+            self._save_to_bc_excel(device_infos)
+            saved['xlsx'] = True
+        except Exception as e:
+            print_error(f"Error saving to {self.bc_file}: {e}")
+        
+        if self.parquet is not None:
+            try:
+                with span('save_parquet', rows=len(device_infos)):
+                    self.parquet.add(device_infos)
+            except Exception as e:
+                print_error(f"Error saving Parquet rows: {e}")
+        
+        if saved['xlsx']:
+            print_success(f"Saved {len(device_infos)} device(s) to {self.csv_file} and {self.bc_file}")
+        else:
+            print_warning(f"Saved {len(device_infos)} device(s) to {self.csv_file} only")
+        return saved
+    
+    def close(self):
+        """Close the CSV handle, write buffered Parquet rows and the summary (before files are deleted or moved)"""
+        if self.parquet is not None:
+            self.parquet.close()
+        self.summary.save()
+        if self._csv_handle is not None:
+            self._csv_handle.close()
+        self._csv_handle = None
+        self._csv_writer = None
+    
+    def _open_csv(self):
+        """Keep the CSV open for appending; header is written for a new file"""
+        if self._csv_handle is None:
+            new_file = not os.path.exists(self.csv_file) or os.path.getsize(self.csv_file) == 0
+            self._csv_handle = open(self.csv_file, 'a', newline='', encoding='utf-8')
+            self._csv_writer = csv.writer(self._csv_handle)
+            if new_file:
+                self._csv_writer.writerow(CSV_HEADERS)
+        return self._csv_writer
     
-    def _save_to_csv(self, device_info: Dict):
-        """Save complete info to CSV"""
-        data_row = [
+    def _csv_row(self, device_info: Dict) -> List:
+        return [
             device_info['imei1'],
             device_info['imei2'],
             device_info['serial'],
             device_info['part'],
             device_info['product_name'],
             device_info['storage'],
-            device_info['color'],  # Added color
+            device_info['color'],
             device_info['model_id'],
             device_info['upc'],
             device_info['device_name'],
             device_info['ios_version'],
             device_info['timestamp']
         ]
-        
-        file_exists = os.path.exists(self.csv_file)
-        
-        with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            
-            if not file_exists:
-                headers = [
-                    'IMEI1', 'IMEI2', 'Serial', 'Part', 'Product',
-                    'Storage', 'Color', 'ModelID', 'UPC',
-                    'DeviceName', 'iOSVersion', 'Timestamp'
-                ]
-                writer.writerow(headers)
-            
-            writer.writerow(data_row)
-        
-        print_success(f"Saved real data to {self.csv_file}")
     
-    def _save_to_bc_excel(self, device_info: Dict):
-        """Save BC data with color"""
-        df_new = pd.DataFrame([[
+    def _bc_row(self, device_info: Dict) -> List:
+        return [
             device_info['product_name'],
             device_info['storage'],
-            device_info['color'],  # Added color
+            device_info['color'],
             device_info['imei1'],
             device_info['imei2']
-        ]], columns=['Product Name', 'Storage', 'Color', 'IMEI1', 'IMEI2'])
-        
-        if os.path.exists(self.bc_file):
-            try:
-                df_existing = pd.read_excel(self.bc_file, engine='openpyxl')
-                df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-            except:
-                df_combined = df_new
-        else:
-            df_combined = df_new
+        ]
+    
+    def _save_to_csv(self, device_infos: List[Dict]):
+        """Append rows to the CSV with one flush"""
+        with span('save_csv', rows=len(device_infos)):
+            writer = self._open_csv()
+            for device_info in device_infos:
+                writer.writerow(self._csv_row(device_info))
+            self._csv_handle.flush()
+    
+    def _save_to_bc_excel(self, device_infos: List[Dict]):
+        """Append rows to the BC Excel file without rewriting it"""
+        with span('save_xlsx', rows=len(device_infos)):
+            self.bc_workbook.append_rows([self._bc_row(device_info) for device_info in device_infos])
+    
+    def _prepare_bc_excel(self):
+        """Convert an older (pandas-written) or damaged BC workbook once"""
+        if os.path.exists(self.bc_file) and not self.bc_workbook.is_appendable():
+            self.compact_bc_excel()
+            if not self.bc_workbook.is_appendable():
+                raise ValueError(f"Could not convert {self.bc_file}")
+    
+    def compact_bc_excel(self) -> bool:
+        """
+        Rewrite BC.xlsx in the appendable layout. Rows are read from the
+        existing workbook, or regenerated from the CSV if it cannot be read.
+        """
+        print_info(f"Rebuilding {self.bc_file}...")
+        try:
+            count = self.bc_workbook.rebuild(self._read_bc_rows())
+            print_success(f"Rebuilt {self.bc_file} ({count} rows)")
+            return True
+        except Exception as e:
+            print_warning(f"Could not read {self.bc_file} ({e}), regenerating from {self.csv_file}")
+        return self.regenerate_bc_excel()
+    
+    def regenerate_bc_excel(self) -> bool:
+        """Regenerate BC.xlsx from the CSV history"""
+        try:
+            count = self.bc_workbook.rebuild(self._bc_rows_from_csv())
+            print_success(f"Regenerated {self.bc_file} from {self.csv_file} ({count} rows)")
+            return True
+        except Exception as e:
+            print_error(f"Error regenerating {self.bc_file}: {e}")
+            return False
+    
+    def export_bc_excel(self, scans: Iterable[Dict]) -> bool:
+        """Regenerate BC.xlsx from scan records (e.g. DataManager.inventory.iter_scans())"""
+        try:
+            count = self.bc_workbook.rebuild(self._bc_row(scan) for scan in scans)
+            print_success(f"Exported {count} rows to {self.bc_file}")
+            return True
+        except Exception as e:
+            print_error(f"Error exporting {self.bc_file}: {e}")
+            return False
+    
+    def export_parquet(self, scans: Iterable[Dict]) -> int:
+        """Rebuild the Parquet dataset from scan records (e.g. DataManager.inventory.iter_scans())"""
+        sink = self.parquet or ParquetSink()
+        try:
+            count = sink.rebuild(scans)
+            if sink.enabled:
+                print_success(f"Exported {count} rows to {sink.root}/")
+            return count
+        except Exception as e:
+            print_error(f"Error exporting Parquet: {e}")
+            return 0
+    
+    def compact_parquet(self) -> int:
+        """Merge small per-session Parquet files (one file per scan date)"""
+        return (self.parquet or ParquetSink()).compact()
+    
+    def _read_bc_rows(self) -> Iterator[List]:
+        """Stream data rows from the current BC workbook"""
+        from openpyxl import load_workbook
         
-        with pd.ExcelWriter(self.bc_file, engine='openpyxl', mode='w') as writer:
-            df_combined.to_excel(writer, sheet_name='BC Data', index=False)
+        workbook = load_workbook(self.bc_file, read_only=True)
+        try:
+            sheet = workbook[BC_SHEET] if BC_SHEET in workbook.sheetnames else workbook.active
+            for row in sheet.iter_rows(min_row=2, values_only=True):
+                if any(value is not None for value in row):
+                    yield ['' if value is None else str(value) for value in row[:len(BC_HEADERS)]]
+        finally:
+            workbook.close()
+    
+    def _bc_rows_from_csv(self) -> Iterator[List]:
+        """Stream BC rows out of the CSV history"""
+        if not os.path.exists(self.csv_file):
+            return
         
-        print_success(f"Saved BC data to {self.bc_file}")
\ No newline at end of file
+        with open(self.csv_file, 'r', newline='', encoding='utf-8') as f:
+            for record in csv.DictReader(f):
+                yield [
+                    record.get('Product', ''),
+                    record.get('Storage', ''),
+                    record.get('Color', ''),
+                    record.get('IMEI1', ''),
+                    record.get('IMEI2', '')
+                ]
@@ -0,0 +1,157 @@
+# history_import.py
+import csv
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from utils import print_success, print_error, print_warning, print_info, ensure_full_imei
+from config import IMPORT_CHUNK_ROWS, IMPORT_COMPACT_EVERY, IMPORT_PROGRESS_INTERVAL
+
+def imei_columns(header: Iterable) -> List[int]:
+    """Indexes of IMEI columns ('IMEI1', 'IMEI 2', 'imei_1', ...) in a header row"""
+    columns = []
+    for index, name in enumerate(header):
+        key = str(name or '').upper().replace(' ', '').replace('_', '')
+        if key.startswith('IMEI'):
+            columns.append(index)
+    return columns
+
+def iter_csv_chunks(path: str, chunk_rows: int = IMPORT_CHUNK_ROWS) -> Iterator[Tuple[int, List[str]]]:
+    """Raw IMEI values from a CSV export, chunk_rows rows at a time"""
+    with open(path, 'r', newline='', encoding='utf-8-sig', errors='replace') as f:
+        reader = csv.reader(f)
+        columns = imei_columns(next(reader, []))
+        if not columns:
+            raise ValueError("no IMEI column in header")
+        
+        chunk, rows = [], 0
+        for row in reader:
+            chunk.extend(row[i] for i in columns if i < len(row))
+            rows += 1
+            if rows >= chunk_rows:
+                yield rows, chunk
+                chunk, rows = [], 0
+        if rows:
+            yield rows, chunk
+
+def iter_xlsx_chunks(path: str, chunk_rows: int = IMPORT_CHUNK_ROWS) -> Iterator[Tuple[int, List[str]]]:
+    """Raw IMEI values from every sheet of a workbook, read row by row in read-only mode"""
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        found = False
+        for sheet in workbook.worksheets:
+            rows_iter = sheet.iter_rows(values_only=True)
+            columns = imei_columns(next(rows_iter, ()) or ())
+            if not columns:
+                continue
+            found = True
+            
+            chunk, rows = [], 0
+            for row in rows_iter:
+                # Excel keeps long numbers as floats/ints; '%d' avoids 3.5e+14
+                chunk.extend('%d' % row[i] if isinstance(row[i], (int, float)) else str(row[i])
+                             for i in columns if i < len(row) and row[i] is not None)
+                rows += 1
+                if rows >= chunk_rows:
+                    yield rows, chunk
+                    chunk, rows = [], 0
+            if rows:
+                yield rows, chunk
+        if not found:
+            raise ValueError("no sheet with an IMEI column")
+    finally:
+        workbook.close()
+
+class HistoryImporter:
+    """
+    Merge IMEIs from old iphone_data.csv / BC.xlsx exports into the
+    seen-IMEI store.
+    
+    Files are streamed in chunks, so memory stays bounded by the chunk size
+    plus the store's delta, which is compacted into the index every
+    IMPORT_COMPACT_EVERY new IMEIs. Duplicates within and across files, and
+    IMEIs already in the store, are counted but not added twice.
+    """
+    
+    def __init__(self, seen_imei, chunk_rows: int = IMPORT_CHUNK_ROWS,
+                 compact_every: int = IMPORT_COMPACT_EVERY):
+        self.seen_imei = seen_imei
+        self.chunk_rows = chunk_rows
+        self.compact_every = compact_every
+        self.stats = {'files': 0, 'rows': 0, 'imeis': 0, 'new': 0, 'duplicates': 0, 'invalid': 0}
+        self.started = None
+        self.last_report = 0.0
+        self.uncompacted = 0
+    
+    def import_files(self, paths: Iterable[str]) -> Dict:
+        """Import every file; returns the totals"""
+        self.started = self.last_report = time.monotonic()
+        for path in paths:
+            self.import_file(path)
+        
+        if self.uncompacted:
+            self.seen_imei.compact()
+            self.uncompacted = 0
+        self.report(final=True)
+        return dict(self.stats)
+    
+    def import_file(self, path: str) -> bool:
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.csv':
+            chunks = iter_csv_chunks(path, self.chunk_rows)
+        elif extension in ('.xlsx', '.xlsm'):
+            chunks = iter_xlsx_chunks(path, self.chunk_rows)
+        else:
+            print_warning(f"Skipping {path}: not a .csv or .xlsx file")
+            return False
+        
+        if self.started is None:
+            self.started = self.last_report = time.monotonic()
+        print_info(f"Importing {path}...")
+        try:
+            for rows, values in chunks:
+                self.add_chunk(rows, values)
+        except Exception as e:
+            print_error(f"Error importing {path}: {e}")
+            return False
+        self.stats['files'] += 1
+        return True
+    
+    def add_chunk(self, rows: int, values: List[str]):
+        """Normalize and mark one chunk of raw IMEI values"""
+        stats = self.stats
+        stats['rows'] += rows
+        for value in values:
+            imei = ensure_full_imei(value)
+            if imei == 'N/A':
+                if value and value.strip() and value.strip() != 'N/A':
+                    stats['invalid'] += 1
+                continue
+            stats['imeis'] += 1
+            if self.seen_imei.mark(imei):
+                stats['new'] += 1
+                self.uncompacted += 1
+            else:
+                stats['duplicates'] += 1
+        
+        if self.uncompacted >= self.compact_every:
+            self.seen_imei.compact()
+            self.uncompacted = 0
+        
+        if time.monotonic() - self.last_report >= IMPORT_PROGRESS_INTERVAL:
+            self.report()
+    
+    def report(self, final: bool = False):
+        """Progress line: rows read, new IMEIs, throughput"""
+        self.last_report = time.monotonic()
+        elapsed = max(self.last_report - (self.started or self.last_report), 1e-9)
+        stats = self.stats
+        line = (f"{stats['rows']:,} rows, {stats['imeis']:,} IMEIs, {stats['new']:,} new, "
+                f"{stats['duplicates']:,} duplicates, {stats['invalid']:,} invalid "
+                f"({stats['rows'] / elapsed:,.0f} rows/s)")
+        if final:
+            print_success(f"Imported {stats['files']} file(s) in {elapsed:.1f}s: {line}")
+        else:
+            print_info(line)
@@ -0,0 +1,173 @@
+# inventory_store.py
+import csv
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from utils import print_success, print_error, print_info
+from config import INVENTORY_DB_FILE, INVENTORY_BATCH_SIZE, INVENTORY_FLUSH_INTERVAL, CSV_FILE
+
+# Record keys (as produced by DeviceScanner) in table column order
+SCAN_FIELDS = [
+    'imei1', 'imei2', 'serial', 'part', 'product_name', 'product_type',
+    'storage', 'color', 'model_id', 'upc', 'device_name', 'ios_version',
+    'udid', 'timestamp'
+]
+
+# CSV export columns, same layout as iphone_data.csv
+CSV_COLUMNS = [
+    ('IMEI1', 'imei1'), ('IMEI2', 'imei2'), ('Serial', 'serial'), ('Part', 'part'),
+    ('Product', 'product_name'), ('Storage', 'storage'), ('Color', 'color'),
+    ('ModelID', 'model_id'), ('UPC', 'upc'), ('DeviceName', 'device_name'),
+    ('iOSVersion', 'ios_version'), ('Timestamp', 'timestamp')
+]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    {', '.join(f'{field} TEXT' for field in SCAN_FIELDS)}
+);
+CREATE INDEX IF NOT EXISTS idx_scans_imei1 ON scans(imei1);
+CREATE INDEX IF NOT EXISTS idx_scans_imei2 ON scans(imei2);
+CREATE INDEX IF NOT EXISTS idx_scans_serial ON scans(serial);
+CREATE INDEX IF NOT EXISTS idx_scans_timestamp ON scans(timestamp);
+"""
+
+class InventoryStore:
+    """
+    Scan history in an embedded SQLite database with indexed IMEI1, IMEI2,
+    serial and timestamp lookups. New records are buffered and written in
+    one transaction per batch; reads flush the buffer first.
+    """
+    
+    def __init__(self, db_file: str = INVENTORY_DB_FILE):
+        self.db_file = db_file
+        self.pending: List[tuple] = []
+        self.last_flush = time.monotonic()
+        self.lock = threading.RLock()
+        
+        is_new = not os.path.exists(db_file)
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        
+        if is_new and os.path.exists(CSV_FILE):
+            self.import_csv(CSV_FILE)
+    
+    def add_scan(self, device_info: Dict):
+        """Buffer one scan; written once the batch is full or old enough"""
+        row = tuple(str(device_info.get(field, 'N/A')) for field in SCAN_FIELDS)
+        with self.lock:
+            self.pending.append(row)
+            if (len(self.pending) >= INVENTORY_BATCH_SIZE or
+                    time.monotonic() - self.last_flush >= INVENTORY_FLUSH_INTERVAL):
+                self.flush()
+    
+    def flush(self):
+        """Write buffered scans in a single transaction"""
+        with self.lock:
+            if self.pending:
+                try:
+                    with self.conn:
+                        self.conn.executemany(
+                            f"INSERT INTO scans ({', '.join(SCAN_FIELDS)}) "
+                            f"VALUES ({', '.join('?' for _ in SCAN_FIELDS)})",
+                            self.pending
+                        )
+                    self.pending = []
+                except sqlite3.Error as e:
+                    print_error(f"Error writing inventory: {e}")
+            self.last_flush = time.monotonic()
+    
+    def find(self, imei: Optional[str] = None, serial: Optional[str] = None) -> List[Dict]:
+        """Scans matching an IMEI (either slot) or a serial number, newest first"""
+        clauses, params = [], []
+        if imei:
+            clauses += ['imei1 = ?', 'imei2 = ?']
+            params += [imei, imei]
+        if serial:
+            clauses.append('serial = ?')
+            params.append(serial)
+        if not clauses:
+            return []
+        
+        with self.lock:
+            self.flush()
+            rows = self.conn.execute(
+                f"SELECT * FROM scans WHERE {' OR '.join(clauses)} ORDER BY timestamp DESC",
+                params
+            ).fetchall()
+        return [dict(row) for row in rows]
+    
+    def count(self, since: Optional[str] = None) -> int:
+        """Number of scans, optionally since a 'YYYY-MM-DD[ HH:MM:SS]' timestamp"""
+        with self.lock:
+            self.flush()
+            if since:
+                return self.conn.execute("SELECT COUNT(*) FROM scans WHERE timestamp >= ?", (since,)).fetchone()[0]
+            return self.conn.execute("SELECT COUNT(*) FROM scans").fetchone()[0]
+    
+    def iter_scans(self, since: Optional[str] = None, batch: int = 1000) -> Iterator[Dict]:
+        """Stream scans in timestamp order without loading them all"""
+        with self.lock:
+            self.flush()
+            cursor = self.conn.cursor()
+            if since:
+                cursor.execute("SELECT * FROM scans WHERE timestamp >= ? ORDER BY timestamp, id", (since,))
+            else:
+                cursor.execute("SELECT * FROM scans ORDER BY timestamp, id")
+            rows = cursor.fetchmany(batch)
+        while rows:
+            for row in rows:
+                yield dict(row)
+            with self.lock:
+                rows = cursor.fetchmany(batch)
+    
+    def export_csv(self, path: str) -> int:
+        """Write the history as an iphone_data.csv style file"""
+        count = 0
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([header for header, _ in CSV_COLUMNS])
+            for scan in self.iter_scans():
+                writer.writerow([scan[field] for _, field in CSV_COLUMNS])
+                count += 1
+        os.replace(tmp_path, path)
+        print_success(f"Exported {count} scans to {path}")
+        return count
+    
+    def import_csv(self, path: str) -> int:
+        """Backfill the store from an existing iphone_data.csv"""
+        print_info(f"Importing {path} into {self.db_file}...")
+        count = 0
+        try:
+            with open(path, 'r', newline='', encoding='utf-8') as f:
+                for record in csv.DictReader(f):
+                    scan = {field: record.get(header, 'N/A') for header, field in CSV_COLUMNS}
+                    with self.lock:
+                        self.pending.append(tuple(str(scan.get(field, 'N/A')) for field in SCAN_FIELDS))
+                        if len(self.pending) >= 1000:
+                            self.flush()
+                    count += 1
+            self.flush()
+            print_success(f"Imported {count} scans from {path}")
+        except Exception as e:
+            print_error(f"Error importing {path}: {e}")
+        return count
+    
+    def clear(self):
+        """Delete all scans"""
+        with self.lock:
+            self.pending = []
+            with self.conn:
+                self.conn.execute("DELETE FROM scans")
+    
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.conn.close()
@@ -0,0 +1,172 @@
+# inventory_summary.py
+import csv
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from colors import Colors
+from utils import print_success, print_error, print_warning, print_info
+from config import CSV_FILE, SUMMARY_FILE, SUMMARY_SAVE_INTERVAL, IMPORT_CHUNK_ROWS
+from mapping_store import detect_region
+
+SUMMARY_VERSION = 1
+KEY_FIELDS = ('product', 'storage', 'color', 'region', 'day')
+
+def summary_key(product: str, storage: str, color: str, part: str, timestamp: str) -> Tuple[str, ...]:
+    return (product or 'N/A', storage or 'N/A', color or 'N/A', detect_region(part), (timestamp or '')[:10])
+
+class InventorySummary:
+    """
+    Device counts by (product, storage, color, region, day), kept next to
+    the CSV export and updated as devices are saved.
+    
+    The file records the CSV size it matches; if the CSV changed without the
+    summary (older version, crash before the summary was written, edited by
+    hand) the summary is stale and is rebuilt by streaming the CSV once.
+    """
+    
+    def __init__(self, path: str = SUMMARY_FILE, csv_file: str = CSV_FILE):
+        self.path = path
+        self.csv_file = csv_file
+        self.counts: Optional[Counter] = None
+        self.csv_bytes = 0
+        self.dirty = False
+        self.last_save = 0.0
+        self.lock = threading.RLock()
+    
+    def _csv_size(self) -> int:
+        return os.path.getsize(self.csv_file) if os.path.exists(self.csv_file) else 0
+    
+    def load(self) -> bool:
+        """Read the summary file; False if it is missing, unreadable or stale"""
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != SUMMARY_VERSION:
+                return False
+            counts = Counter({tuple(row[:-1]): row[-1] for row in data['rows']})
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        self.counts, self.csv_bytes = counts, data.get('csv_bytes', -1)
+        return self.csv_bytes == self._csv_size()
+    
+    def ensure_loaded(self):
+        """Load the summary, rebuilding it from the CSV when missing or stale"""
+        if self.counts is not None and self.csv_bytes == self._csv_size():
+            return
+        with self.lock:
+            if not self.load():
+                self.rebuild()
+    
+    def add(self, device_infos: Iterable[Dict]):
+        """
+        Count saved devices. Call ensure_loaded() before appending them to the
+        CSV and add() after, so a rebuild never counts them twice.
+        """
+        with self.lock:
+            if self.counts is None:
+                return
+            for info in device_infos:
+                self.counts[summary_key(info.get('product_name'), info.get('storage'), info.get('color'),
+                                        info.get('part'), info.get('timestamp'))] += 1
+            self.csv_bytes = self._csv_size()
+            self.dirty = True
+        if time.monotonic() - self.last_save >= SUMMARY_SAVE_INTERVAL:
+            self.save()
+    
+    def rebuild(self, chunk_rows: int = IMPORT_CHUNK_ROWS):
+        """Recount from the CSV, chunk by chunk (memory is bounded by the number of distinct keys)"""
+        counts = Counter()
+        rows = 0
+        started = time.monotonic()
+        if os.path.exists(self.csv_file):
+            print_info(f"Rebuilding inventory summary from {self.csv_file}...")
+            try:
+                with open(self.csv_file, 'r', newline='', encoding='utf-8', errors='replace') as f:
+                    reader = csv.DictReader(f)
+                    chunk = []
+                    for record in reader:
+                        chunk.append(summary_key(record.get('Product'), record.get('Storage'), record.get('Color'),
+                                                 record.get('Part'), record.get('Timestamp')))
+                        if len(chunk) >= chunk_rows:
+                            counts.update(chunk)
+                            rows += len(chunk)
+                            chunk = []
+                    counts.update(chunk)
+                    rows += len(chunk)
+            except Exception as e:
+                print_error(f"Error reading {self.csv_file}: {e}")
+        self.counts = counts
+        self.csv_bytes = self._csv_size()
+        self.dirty = True
+        self.save()
+        if rows:
+            print_success(f"Summarized {rows} rows into {len(counts)} groups in {time.monotonic() - started:.1f}s")
+    
+    def save(self):
+        """Write the summary atomically"""
+        with self.lock:
+            if not self.dirty or self.counts is None:
+                return
+            data = {
+                'version': SUMMARY_VERSION,
+                'csv_bytes': self.csv_bytes,
+                'fields': list(KEY_FIELDS) + ['count'],
+                'rows': [list(key) + [count] for key, count in sorted(self.counts.items())],
+            }
+            try:
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+                self.dirty = False
+                self.last_save = time.monotonic()
+            except Exception as e:
+                print_error(f"Error saving {self.path}: {e}")
+    
+    def clear(self):
+        with self.lock:
+            self.counts = Counter()
+            self.csv_bytes = 0
+            self.dirty = False
+        if os.path.exists(self.path):
+            os.remove(self.path)
+    
+    def query(self, day: Optional[str] = None, **filters) -> List[Tuple[Tuple[str, ...], int]]:
+        """
+        Rows grouped by product/storage/color/region, summed over days.
+        day: 'YYYY-MM-DD', 'today' or None for all time; filters match key
+        fields case-insensitively by substring (e.g. product='13 pro').
+        """
+        self.ensure_loaded()
+        if day == 'today':
+            day = date.today().isoformat()
+        filters = {KEY_FIELDS.index(field): str(value).lower() for field, value in filters.items() if value}
+        
+        totals = Counter()
+        with self.lock:
+            for key, count in self.counts.items():
+                if day and key[4] != day:
+                    continue
+                if any(value not in key[index].lower() for index, value in filters.items()):
+                    continue
+                totals[key[:4]] += count
+        return sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+    
+    def print_report(self, day: Optional[str] = 'today', **filters):
+        rows = self.query(day, **filters)
+        label = 'all time' if not day else date.today().isoformat() if day == 'today' else day
+        if not rows:
+            print_warning(f"No devices for {label}")
+            return
+        
+        print(f"\n{Colors.BRIGHT_WHITE}Devices processed ({label}){Colors.RESET}\n")
+        print(f"{Colors.BRIGHT_CYAN}{'Product':<28}{'Storage':<10}{'Color':<22}{'Region':<8}{'Count':>7}{Colors.RESET}")
+        for (product, storage, color, region), count in rows:
+            print(f"{product:<28}{storage:<10}{color:<22}{region:<8}{count:>7}")
+        print(f"{Colors.BRIGHT_CYAN}{'─'*75}{Colors.RESET}")
+        print(f"{Colors.BRIGHT_WHITE}{'Total':<68}{sum(count for _, count in rows):>7}{Colors.RESET}")
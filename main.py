@@ -1,226 +1,52 @@
 # main.py
-import subprocess
-import pandas as pd
-import os
 import time
+_STARTED = time.perf_counter()
+
+import argparse
+import io
+import os
+import shutil
+import signal
 import sys
-import csv
+from contextlib import redirect_stdout
 from datetime import datetime
 
 # Import modules
 from colors import Colors, Icons
 from utils import *
-from config import PRODUCT_MAPPING, CSV_FILE, BC_FILE
+from config import (CSV_FILE, BC_FILE, MONITOR_POLL_INTERVAL, USE_USBMUX_EVENTS, MAX_EXTRACTION_WORKERS,
+                    IMPORT_CHUNK_ROWS, COORDINATOR_URL, PARQUET_DIR, DASHBOARD_ENABLED, MAPPING_CACHE_FILE)
 from data_manager import DataManager
-from storage_extractor import extract_storage_capacity_real
-from color_detector import extract_device_color
+from device_scanner import DeviceScanner
+from file_manager import FileManager
 from color_selector import display_color_selection
-
-class DeviceScanner:
-    def __init__(self, data_manager):
-        self.data_manager = data_manager
-        self.connected_devices = set()
-        self.device_retry_count = {}
-        self.max_retries = 3
-    
-    def get_connected_devices(self):
-        """Get list of connected UDIDs"""
-        try:
-            result = subprocess.run(
-                ['idevice_id', '-l'],
-                capture_output=True,
-                text=True,
-                check=False
-            )
-            
-            if result.returncode == 0 and result.stdout:
-                udids = set(result.stdout.strip().splitlines())
-                return udids
-        except Exception as e:
-            print_error(f"Error getting UDIDs: {e}")
-        return set()
-    
-    def extract_device_info_real(self, udid: str):
-        """Extract REAL device information"""
-        print_info(f"Extracting device {udid[:8]}...")
-        start_time = time.time()
-        
-        try:
-            # Get device info
-            result = subprocess.run(
-                ['ideviceinfo', '-u', udid],
-                capture_output=True,
-                text=True,
-                check=False,
-                timeout=10
-            )
-            
-            if result.returncode != 0:
-                return None
-            
-            # Parse device info
-            device_info = {}
-            for line in result.stdout.splitlines():
-                if ': ' in line:
-                    key, value = line.split(': ', 1)
-                    device_info[key.strip()] = value.strip()
-            
-            # Get IMEIs
-            imei1 = ensure_full_imei(device_info.get('InternationalMobileEquipmentIdentity', 'N/A'))
-            imei2 = ensure_full_imei(device_info.get('InternationalMobileEquipmentIdentity2', 'N/A'))
-            
-            if imei1 == 'N/A':
-                print_warning("IMEI not accessible")
-                return None
-            
-            # Get basic info
-            serial = device_info.get('SerialNumber', 'N/A')
-            model_number = device_info.get('ModelNumber', '')
-            region_info = device_info.get('RegionInfo', '')
-            part = model_number + region_info if model_number or region_info else 'N/A'
-            product_type = device_info.get('ProductType', 'N/A')
-            product_name = PRODUCT_MAPPING.get(product_type, f'Unknown ({product_type})')
-            
-            # Get storage (REAL only)
-            storage = extract_storage_capacity_real(device_info, udid)
-            
-            # Get color
-            color = extract_device_color(udid, device_info)
-            
-            # Get other info
-            model_id = self.data_manager.get_model_ids(product_name, part)
-            upc = self.data_manager.get_upc(product_name, storage, part)
-            
-            # Compile info
-            info = {
-                'imei1': imei1,
-                'imei2': imei2,
-                'serial': serial,
-                'part': part,
-                'product_name': product_name,
-                'product_type': product_type,
-                'storage': storage,
-                'color': color,
-                'model_id': model_id,
-                'upc': upc,
-                'device_name': device_info.get('DeviceName', 'N/A'),
-                'ios_version': device_info.get('ProductVersion', 'N/A'),
-                'wifi_address': device_info.get('WiFiAddress', 'N/A'),
-                'bluetooth_address': device_info.get('BluetoothAddress', 'N/A'),
-                'udid': udid,
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            
-            print_success(f"Extraction completed in {time.time() - start_time:.2f}s")
-            return info
-            
-        except Exception as e:
-            print_error(f"Extraction error: {e}")
-            return None
-    
-    def shutdown_device(self, udid: str):
-        """Shutdown the device"""
-        print_info(f"Shutting down device {udid[:8]}...")
-        try:
-            subprocess.run(
-                ['idevicediagnostics', '-u', udid, 'shutdown'],
-                capture_output=True,
-                text=True,
-                timeout=5,
-                check=False
-            )
-        except:
-            pass
-
-class FileManager:
-    def __init__(self):
-        self.csv_file = CSV_FILE
-        self.bc_file = BC_FILE
-    
-    def save_device_info(self, device_info: dict):
-        """Save device information"""
-        try:
-            self._save_to_csv(device_info)
-            self._save_to_bc_excel(device_info)
-            print_success("Saved to both files")
-            return True
-        except Exception as e:
-            print_error(f"Save error: {e}")
-            return False
-    
-    def _save_to_csv(self, device_info: dict):
-        """Save to CSV file"""
-        data_row = [
-            device_info['imei1'],
-            device_info['imei2'],
-            device_info['serial'],
-            device_info['part'],
-            device_info['product_name'],
-            device_info['storage'],
-            device_info['color'],
-            device_info['model_id'],
-            device_info['upc'],
-            device_info['device_name'],
-            device_info['ios_version'],
-            device_info['timestamp']
-        ]
-        
-        file_exists = os.path.exists(self.csv_file)
-        
-        with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            
-            if not file_exists:
-                headers = [
-                    'IMEI1', 'IMEI2', 'Serial', 'Part', 'Product',
-                    'Storage', 'Color', 'ModelID', 'UPC',
-                    'DeviceName', 'iOSVersion', 'Timestamp'
-                ]
-                writer.writerow(headers)
-            
-            writer.writerow(data_row)
-        
-        print_success(f"Saved to {self.csv_file}")
-    
-    def _save_to_bc_excel(self, device_info: dict):
-        """Save to BC Excel file"""
-        df_new = pd.DataFrame([[
-            device_info['product_name'],
-            device_info['storage'],
-            device_info['color'],
-            device_info['imei1'],
-            device_info['imei2']
-        ]], columns=['Product Name', 'Storage', 'Color', 'IMEI1', 'IMEI2'])
-        
-        if os.path.exists(self.bc_file):
-            try:
-                df_existing = pd.read_excel(self.bc_file, engine='openpyxl')
-                df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-            except:
-                df_combined = df_new
-        else:
-            df_combined = df_new
-        
-        with pd.ExcelWriter(self.bc_file, engine='openpyxl', mode='w') as writer:
-            df_combined.to_excel(writer, sheet_name='BC Data', index=False)
-        
-        print_success(f"Saved to {self.bc_file}")
+from extraction_pipeline import ExtractionPipeline
+from usbmux_listener import UsbmuxListener
+from background_writer import BackgroundWriter
+from telemetry import telemetry, span, print_summary
+from dashboard import DeviceBoard, Dashboard
+from shutdown_queue import ShutdownQueue
 
 class iPhoneScannerApp:
-    def __init__(self):
-        self.data_manager = DataManager()
+    def __init__(self, interactive: bool = True, coordinator_url: str = COORDINATOR_URL):
+        self.interactive = interactive
+        self.data_manager = DataManager(coordinator_url)
         self.device_scanner = DeviceScanner(self.data_manager)
         self.file_manager = FileManager()
+        self.writer = BackgroundWriter(self.file_manager, self.data_manager).start()
+        self.board = DeviceBoard()
+        self.shutdowns = None
         self.running = False
     
     def display_banner(self):
         """Display application banner"""
+        seen_count = len(self.data_manager.seen_imei)
         clear_screen()
         print_header("iPhone Device Scanner Pro v5.2.0", 80)
         print(f"\n{Colors.BRIGHT_CYAN}{Icons.DEVICE}  Version: 5.2.0 - Real Data Only")
         print(f"{Icons.COMPUTER}  System: {platform.system()} {platform.release()}")
         print(f"{Icons.CLOCK}  Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"{Icons.LIST}  Seen IMEIs: {len(self.data_manager.seen_imei)}")
+        print(f"{Icons.LIST}  Seen IMEIs: {seen_count}")
         print(f"{Icons.SAVE}  Output Files: {CSV_FILE} (CSV), {BC_FILE} (Excel)")
         print(f"{Colors.BRIGHT_CYAN}{'─'*80}{Colors.RESET}")
     
@@ -239,7 +65,9 @@ class iPhoneScannerApp:
             ("7", "📋 View Seen IMEIs", "Show all processed IMEIs"),
             ("8", "🗑️  Clear Seen IMEIs", "Reset seen IMEI list"),
             ("9", "🗑️  Reset All Data", "Delete all output files and IMEI list"),
-            ("10", "🚪 Exit", "Close application")
+            ("10", "⏱️  Stage Timings", "p50/p95/p99 per extraction/save stage"),
+            ("11", "📊 Inventory Summary", "Today's counts by product/storage/color"),
+            ("12", "🚪 Exit", "Close application")
         ]
         
         for num, title, desc in menu_options:
@@ -248,44 +76,116 @@ class iPhoneScannerApp:
         
         print(f"{Colors.BRIGHT_CYAN}{'─'*50}{Colors.RESET}")
     
-    def scan_current_devices(self):
-        """Scan all currently connected devices"""
+    def scan_current_devices(self, confirm: str = 'batch', rescan: bool = False) -> int:
+        """
+        Extract every connected device in parallel, then save the new ones.
+        confirm: 'batch' asks once for all, 'each' asks per device, 'yes' never asks.
+        rescan: full extraction even for devices whose IMEI is already known.
+        Returns the number of devices saved.
+        """
         print_header("SCAN CURRENT DEVICES")
+        self.data_manager.load_all()
         
-        devices = self.device_scanner.get_connected_devices()
+        devices = sorted(self.device_scanner.get_connected_devices())
         if not devices:
             print_warning("No devices connected")
-            time.sleep(2)
+            if self.interactive:
+                time.sleep(2)
             self.return_to_menu()
-            return
+            return 0
         
-        print_success(f"Found {len(devices)} device(s)")
+        print_success(f"Found {len(devices)} device(s), extracting in parallel...")
+        results = self.extract_all(devices, full=rescan)
         
+        # One duplicate check for the whole batch (a single coordinator round trip)
+        seen = self.data_manager.check_seen([info['imei1'] for info in results.values()
+                                             if info and info['imei1'] != 'N/A'])
+        
+        new_devices = []
         for i, udid in enumerate(devices, 1):
             print(f"\n{Colors.BRIGHT_WHITE}{Icons.DEVICE} [{i}/{len(devices)}] Device: {udid[:8]}...{Colors.RESET}")
-            info = self.device_scanner.extract_device_info_real(udid)
+            info = results.get(udid)
+            if not info or info['imei1'] == 'N/A':
+                print_warning("Extraction failed")
+                continue
             
-            if info:
+            if info['imei1'] in seen:
+                print_warning(f"Already scanned, skipping ({info['product_name']}, {format_imei(info['imei1'])})")
+            else:
                 print_device_info(info)
-                
-                if info['imei1'] != 'N/A' and info['imei1'] not in self.data_manager.seen_imei:
-                    if input(f"\n{Colors.BRIGHT_YELLOW}Save this device? (y/n): {Colors.RESET}").lower() == 'y':
-                        self.file_manager.save_device_info(info)
-                        self.data_manager.seen_imei.add(info['imei1'])
-                        self.data_manager.save_seen_imei()
-                        print_success(f"{Icons.TROPHY} DEVICE SAVED!")
+                new_devices.append(info)
+        
+        to_save = self.confirm_devices(new_devices, confirm)
+        claimed = self.data_manager.claim_imeis([info['imei1'] for info in to_save])
+        for info in [info for info in to_save if info['imei1'] not in claimed]:
+            print_warning(f"Saved by another station meanwhile, skipping ({format_imei(info['imei1'])})")
+        to_save = [info for info in to_save if info['imei1'] in claimed]
+        for info in to_save:
+            self.save_device(info)
+        if to_save:
+            print_success(f"{Icons.TROPHY} {len(to_save)} DEVICE(S) SAVED!")
         
+        self.writer.drain()
         self.return_to_menu()
+        return len(to_save)
+    
+    def extract_all(self, udids, workers: int = MAX_EXTRACTION_WORKERS, full: bool = False) -> dict:
+        """Extract several devices at once; returns {udid: info or None}"""
+        pipeline = ExtractionPipeline(self.device_scanner, workers, full=full)
+        results = {}
+        try:
+            for udid in udids:
+                pipeline.submit(udid)
+            while len(results) < len(udids) and (pipeline.pending_count() or not pipeline.results.empty()):
+                for udid, info in pipeline.wait_for_results(MONITOR_POLL_INTERVAL):
+                    results[udid] = info
+        finally:
+            pipeline.shutdown()
+        return results
     
-    def monitor_devices(self, auto_shutdown: bool = False, manual_color: bool = False):
-        """Monitor for device connections"""
+    def confirm_devices(self, devices: list, confirm: str) -> list:
+        """Ask which extracted devices to save (one prompt in batch mode)"""
+        if not devices:
+            print_info("No new devices to save")
+            return []
+        if confirm == 'yes':
+            return devices
+        
+        if confirm == 'batch':
+            answer = input(f"\n{Colors.BRIGHT_YELLOW}Save all {len(devices)} new device(s)? "
+                           f"(y = all / n = none / s = select each): {Colors.RESET}").strip().lower()
+            if answer == 'y':
+                return devices
+            if answer != 's':
+                print_warning("Nothing saved")
+                return []
+        
+        selected = []
+        for info in devices:
+            if input(f"{Colors.BRIGHT_YELLOW}Save {info['product_name']} "
+                     f"({format_imei(info['imei1'])})? (y/n): {Colors.RESET}").strip().lower() == 'y':
+                selected.append(info)
+        return selected
+    
+    def monitor_devices(self, auto_shutdown: bool = False, manual_color: bool = False,
+                        workers: int = MAX_EXTRACTION_WORKERS, duration: float = None, rescan: bool = False,
+                        dashboard: bool = DASHBOARD_ENABLED):
+        """
+        Monitor for device connections (until Ctrl+C, or for duration seconds).
+        Known IMEIs are recognised from a quick probe unless rescan is set.
+        dashboard: redraw a live table of devices instead of scrolling output
+        (not with manual color, which needs the prompt).
+        """
         self.running = True
+        stop_at = time.monotonic() + duration if duration else None
         
         mode_text = ""
         if manual_color:
             mode_text += " + MANUAL COLOR"
         if auto_shutdown:
             mode_text += " + SHUTDOWN"
+        if rescan:
+            mode_text += " + RESCAN"
         
         print_header(f"DEVICE MONITORING{mode_text}")
         print(f"\n{Colors.BRIGHT_WHITE}{Icons.INFO}  Instructions:{Colors.RESET}")
@@ -296,60 +196,191 @@ class iPhoneScannerApp:
         print(f"  • Press Ctrl+C to stop{Colors.RESET}")
         print(f"\n{Colors.BRIGHT_CYAN}{'─'*80}{Colors.RESET}")
         
+        self.data_manager.load_all()
         previous_devices = set()
+        pipeline = ExtractionPipeline(self.device_scanner, workers, full=rescan)
+        self.shutdowns = None
+        if auto_shutdown:
+            self.shutdowns = ShutdownQueue(self.device_scanner, on_outcome=self.on_shutdown_outcome)
+        retries = self.device_scanner.retries
+        retry_summary = ()
+        self.board = DeviceBoard()
+        view = None
+        if dashboard and manual_color:
+            print_warning("Dashboard is not available with manual color selection")
+        elif dashboard:
+            view = Dashboard(self.board, title=f"DEVICE MONITORING{mode_text}")
+        
+        def on_attach(udid):
+            if udid not in previous_devices:
+                previous_devices.add(udid)
+                print_success(f"New device detected: {udid[:8]}...")
+                self.board.update(udid, 'detected', result=None, message='')
+                pipeline.submit(udid)
+                self.board.update(udid, 'extracting')
         
+        def on_detach(udid):
+            previous_devices.discard(udid)
+            pipeline.cancel(udid)
+            retries.forget(udid)
+            if self.shutdowns:
+                self.shutdowns.detached(udid)
+            if self.board.state(udid) not in ('shutting down', 'shut down'):
+                self.board.update(udid, 'unplugged')
+        
+        listener = UsbmuxListener(on_attach, on_detach)
+        if USE_USBMUX_EVENTS and listener.start():
+            print_info("Listening for usbmuxd device events")
+        elif USE_USBMUX_EVENTS:
+            print_warning("usbmuxd events unavailable, polling with idevice_id")
+        
+        if view:
+            view.start()
         try:
             while self.running:
-                current_devices = self.device_scanner.get_connected_devices()
-                
-                new_devices = current_devices - previous_devices
-                for udid in new_devices:
-                    print_success(f"New device detected: {udid[:8]}...")
+                # Poll only while the usbmuxd listener is down
+                if not listener.is_listening():
+                    current_devices = self.device_scanner.get_connected_devices()
+                    
+                    new_devices = current_devices - previous_devices
+                    for udid in new_devices:
+                        on_attach(udid)
                     
-                    info = self.device_scanner.extract_device_info_real(udid)
-                    if info and info['imei1'] != 'N/A':
-                        # Check if IMEI already exists
-                        if info['imei1'] in self.data_manager.seen_imei:
-                            print_warning(f"⚠️  Device already scanned!")
-                            print(f"{Colors.BRIGHT_YELLOW}")
-                            print(f"{'─'*60}")
-                            print(f"📱 Product: {info['product_name']}")
-                            print(f"📊 Storage: {info['storage']}")
-                            print(f"📋 IMEI 1: {info['imei1'][:8]}...{info['imei1'][-4:]}")
-                            print(f"{'─'*60}")
-                            print(f"{Colors.RESET}")
-                            print(f"{Colors.BRIGHT_CYAN}💡 This device has already been processed and saved.{Colors.RESET}")
-                            print(f"{Colors.BRIGHT_GREEN}✅ Please connect a DIFFERENT device to continue.{Colors.RESET}")
-                            print()
-                        else:
-                            # New device - process it
-                            print_device_info(info)
-                            
-                            # Manual color selection if enabled
-                            if manual_color:
-                                selected_color = display_color_selection(info['product_name'])
-                                info['color'] = selected_color
-                            
-                            self.file_manager.save_device_info(info)
-                            self.data_manager.seen_imei.add(info['imei1'])
-                            self.data_manager.save_seen_imei()
-                            print_success(f"{Icons.TROPHY} DEVICE SAVED!")
-                            
-                            if auto_shutdown:
-                                self.device_scanner.shutdown_device(udid)
+                    for udid in previous_devices - current_devices:
+                        on_detach(udid)
                 
-                previous_devices = current_devices
-                time.sleep(2)
+                # Failed devices come back once their backoff has passed
+                for udid in retries.due():
+                    if udid in previous_devices:
+                        pipeline.submit(udid)
+                        self.board.update(udid, 'extracting', message='retry')
+                
+                # Single commit stage: saves and seen-IMEI updates happen here only
+                next_retry = retries.next_due_in()
+                wait = MONITOR_POLL_INTERVAL if next_retry is None else min(MONITOR_POLL_INTERVAL, next_retry)
+                results = pipeline.wait_for_results(wait)
+                claimed = self.data_manager.claim_imeis([info['imei1'] for _, info in results
+                                                         if info and info['imei1'] != 'N/A'])
+                for udid, info in results:
+                    self.commit_device(udid, info, auto_shutdown, manual_color, claimed)
+                
+                state = retries.state()
+                if tuple((row['udid'], row['status'], row['attempts']) for row in state) != retry_summary:
+                    retry_summary = tuple((row['udid'], row['status'], row['attempts']) for row in state)
+                    self.print_retry_state(state)
+                
+                if stop_at and time.monotonic() >= stop_at:
+                    self.running = False
                 
         except KeyboardInterrupt:
             print(f"\n\n{Colors.BRIGHT_YELLOW}{Icons.STOP} Monitoring stopped{Colors.RESET}")
             self.running = False
+        finally:
+            pipeline.shutdown()
+            if self.shutdowns:
+                self.shutdowns.drain()
+            if view:
+                view.stop()
+            if self.shutdowns:
+                self.shutdowns.print_report()
+            listener.stop()
+            self.writer.drain()
         
         # Return to menu
         self.return_to_menu()
     
+    def print_retry_state(self, state: list):
+        """One line per device waiting for (or out of) retries"""
+        if not state:
+            return
+        print_info(f"Devices pending retry: {len(state)}")
+        for row in state:
+            wait = f"in {row['retry_in']:.0f}s" if row['status'] == 'waiting' else row['status']
+            print(f"{Colors.DIM}  {row['udid'][:8]}...  attempt {row['attempts']}/{row['max_attempts']}  "
+                  f"{wait:<10} {row['reason']}{Colors.RESET}")
+    
+    def commit_device(self, udid: str, info, auto_shutdown: bool = False, manual_color: bool = False,
+                      claimed: set = None):
+        """
+        Save an extracted device unless its IMEI was already processed.
+        claimed: IMEIs this station reserved (see DataManager.claim_imeis); None = no check.
+        """
+        if not info or info['imei1'] == 'N/A':
+            reason = self.device_scanner.last_error.get(udid) or "extraction failed"
+            self.device_scanner.schedule_retry(udid)
+            if self.device_scanner.retries.gave_up(udid):
+                self.board.update(udid, 'failed', result='failed', message=reason)
+            else:
+                self.board.update(udid, 'retrying', message=reason)
+            return
+        self.device_scanner.retries.record_success(udid)
+        self.board.update(udid, product=info['product_name'], imei=info['imei1'])
+        
+        if (claimed is not None and info['imei1'] not in claimed
+                and info['imei1'] not in self.data_manager.seen_imei):
+            print_warning(f"Already saved by another station, skipping ({info['product_name']}, "
+                          f"{format_imei(info['imei1'])})")
+            self.board.update(udid, 'duplicate', result='duplicate', message='saved by another station')
+            return
+        
+        # Check if IMEI already exists
+        if info['imei1'] in self.data_manager.seen_imei:
+            self.board.update(udid, 'duplicate', result='duplicate', message='')
+            print_warning(f"⚠️  Device already scanned!")
+            print(f"{Colors.BRIGHT_YELLOW}")
+            print(f"{'─'*60}")
+            print(f"📱 Product: {info['product_name']}")
+            print(f"📊 Storage: {info['storage']}")
+            print(f"📋 IMEI 1: {info['imei1'][:8]}...{info['imei1'][-4:]}")
+            print(f"{'─'*60}")
+            print(f"{Colors.RESET}")
+            print(f"{Colors.BRIGHT_CYAN}💡 This device has already been processed and saved.{Colors.RESET}")
+            print(f"{Colors.BRIGHT_GREEN}✅ Please connect a DIFFERENT device to continue.{Colors.RESET}")
+            print()
+            return
+        
+        # New device - process it
+        print_device_info(info)
+        
+        # Manual color selection if enabled
+        if manual_color:
+            with span('color_manual', udid):
+                selected_color = display_color_selection(info['product_name'])
+            info['color'] = selected_color
+        
+        self.save_device(info)
+        print_success(f"{Icons.TROPHY} DEVICE SAVED!")
+        self.board.update(udid, 'saved', result='saved', message='')
+        
+        if auto_shutdown and self.shutdowns:
+            self.board.update(udid, 'shutting down')
+            self.shutdowns.submit(udid, f"{info['product_name']} {format_imei(info['imei1'])}")
+    
+    def on_shutdown_outcome(self, udid: str, outcome: dict):
+        """ShutdownQueue callback (engine thread): show the result on the dashboard"""
+        if outcome['status'] == 'off':
+            self.board.update(udid, 'shut down', message='')
+        elif outcome['status'] == 'unplugged':
+            self.board.update(udid, 'unplugged', message='pulled before power-off')
+        else:
+            self.board.update(udid, 'still on', message=outcome['reason'])
+    
+    def save_device(self, info: dict):
+        """Mark the IMEI as seen now and hand the record to the background writer"""
+        self.data_manager.seen_imei.mark(info['imei1'])
+        self.writer.submit(info)
+    
+    def shutdown(self):
+        """Write everything still queued and close open files"""
+        self.writer.close()
+        self.data_manager.close()
+        self.device_scanner.close()
+        telemetry.close()
+    
     def return_to_menu(self):
         """Prompt user to return to menu"""
+        if not self.interactive:
+            return
         print(f"\n{Colors.BRIGHT_CYAN}{'─'*80}{Colors.RESET}")
         input(f"{Colors.BRIGHT_GREEN}Press ENTER to return to menu...{Colors.RESET}")
         print(f"{Colors.BRIGHT_CYAN}{'─'*80}{Colors.RESET}\n")
@@ -359,8 +390,8 @@ class iPhoneScannerApp:
         print_header("SCAN WITH RESET")
         
         if input(f"{Colors.BRIGHT_YELLOW}This will reset the seen IMEI list. Continue? (y/n): {Colors.RESET}").lower() == 'y':
+            self.writer.drain()
             self.data_manager.seen_imei.clear()
-            self.data_manager.save_seen_imei()
             print_success("Seen IMEI list cleared")
             time.sleep(1)
             self.scan_current_devices()
@@ -382,13 +413,55 @@ class iPhoneScannerApp:
         
         self.return_to_menu()
     
+    def export_data(self, csv_path: str, excel: bool = False, parquet: bool = False) -> int:
+        """Write the scan history to a CSV (and optionally regenerate BC.xlsx / the Parquet dataset)"""
+        self.writer.drain()
+        count = self.data_manager.export_csv(csv_path)
+        if excel:
+            self.file_manager.export_bc_excel(self.data_manager.inventory.iter_scans())
+        if parquet:
+            self.file_manager.export_parquet(self.data_manager.inventory.iter_scans())
+        return count
+    
+    def show_summary(self, day: str = 'today', **filters):
+        """Device counts by product/storage/color/region from the maintained summary"""
+        print_header("INVENTORY SUMMARY")
+        
+        self.writer.drain()
+        self.file_manager.summary.print_report(day, **filters)
+        
+        self.return_to_menu()
+    
+    def compact_outputs(self):
+        """Merge small Parquet files and fold the seen-IMEI journal into its index"""
+        self.writer.drain()
+        self.file_manager.compact_parquet()
+        self.data_manager.save_seen_imei()
+    
+    def import_history(self, paths: list, chunk_rows: int = IMPORT_CHUNK_ROWS) -> dict:
+        """Merge IMEIs from old CSV/XLSX exports into the seen IMEI store"""
+        from history_import import HistoryImporter
+        
+        self.writer.drain()
+        return HistoryImporter(self.data_manager.seen_imei, chunk_rows=chunk_rows).import_files(paths)
+    
+    def view_stage_timings(self):
+        """Show per-stage timing percentiles from the telemetry file"""
+        print_header("STAGE TIMINGS")
+        
+        self.writer.drain()
+        print()
+        print_summary()
+        
+        self.return_to_menu()
+    
     def clear_seen_imeis(self):
         """Clear the seen IMEIs list"""
         print_header("CLEAR SEEN IMEIs")
         
         if input(f"{Colors.BRIGHT_YELLOW}Delete all {len(self.data_manager.seen_imei)} seen IMEIs? (y/n): {Colors.RESET}").lower() == 'y':
+            self.writer.drain()
             self.data_manager.seen_imei.clear()
-            self.data_manager.save_seen_imei()
             print_success("Seen IMEI list cleared")
         else:
             print_warning("Clear cancelled")
@@ -402,10 +475,16 @@ class iPhoneScannerApp:
         print(f"\n{Colors.BRIGHT_RED}⚠️  This will delete:{Colors.RESET}")
         print(f"  • CSV file: {CSV_FILE}")
         print(f"  • Excel file: {BC_FILE}")
+        print(f"  • Parquet dataset: {PARQUET_DIR}/")
         print(f"  • Seen IMEI list ({len(self.data_manager.seen_imei)} entries)")
+        print(f"  • Scan history database ({self.data_manager.inventory.count()} scans)")
         
         if input(f"\n{Colors.BRIGHT_YELLOW}Are you sure? (y/n): {Colors.RESET}").lower() == 'y':
             try:
+                # Finish pending saves and release the CSV handle
+                self.writer.drain()
+                self.file_manager.close()
+                
                 # Delete CSV file
                 if os.path.exists(CSV_FILE):
                     os.remove(CSV_FILE)
@@ -416,11 +495,22 @@ class iPhoneScannerApp:
                     os.remove(BC_FILE)
                     print_success(f"Deleted {BC_FILE}")
                 
+                # Delete device counts
+                self.file_manager.summary.clear()
+                
+                # Delete Parquet dataset
+                if os.path.isdir(PARQUET_DIR):
+                    shutil.rmtree(PARQUET_DIR)
+                    print_success(f"Deleted {PARQUET_DIR}/")
+                
                 # Clear seen IMEIs
                 self.data_manager.seen_imei.clear()
-                self.data_manager.save_seen_imei()
                 print_success("Cleared seen IMEI list")
                 
+                # Clear scan history
+                self.data_manager.inventory.clear()
+                print_success("Cleared scan history")
+                
                 print_success("All data has been reset")
             except Exception as e:
                 print_error(f"Error during reset: {e}")
@@ -436,7 +526,7 @@ class iPhoneScannerApp:
                 self.display_banner()
                 self.display_menu()
                 
-                choice = input(f"\n{Colors.BRIGHT_GREEN}{Icons.SEARCH} Select option (1-10): {Colors.RESET}").strip()
+                choice = input(f"\n{Colors.BRIGHT_GREEN}{Icons.SEARCH} Select option (1-12): {Colors.RESET}").strip()
                 
                 if choice == '1':
                     self.monitor_devices(auto_shutdown=False, manual_color=False)
@@ -457,25 +547,152 @@ class iPhoneScannerApp:
                 elif choice == '9':
                     self.reset_all_data()
                 elif choice == '10':
+                    self.view_stage_timings()
+                elif choice == '11':
+                    self.show_summary()
+                elif choice == '12':
                     print(f"\n{Colors.BRIGHT_GREEN}{Icons.HEART} Thank you!{Colors.RESET}")
+                    self.shutdown()
                     break
                 else:
                     print_error("Invalid option")
                     time.sleep(1)
-                    
+            
             except KeyboardInterrupt:
                 continue
             except Exception as e:
                 print_error(f"Error: {e}")
                 time.sleep(2)
 
+def measure_startup():
+    """Print where startup time goes (python main.py --startup-time)"""
+    imported = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        app = iPhoneScannerApp()
+        constructed = time.perf_counter()
+        app.display_banner()
+        app.display_menu()
+        menu_shown = time.perf_counter()
+        app.data_manager.load_all()
+        loaded = time.perf_counter()
+    
+    print_header("STARTUP TIME")
+    stages = [
+        ("Module imports", imported - _STARTED),
+        ("App construction", constructed - imported),
+        ("Menu displayed", menu_shown - constructed),
+        ("Time to menu", menu_shown - _STARTED),
+        ("Data load (first scan)", loaded - menu_shown),
+    ]
+    for label, seconds in stages:
+        print(f"{Colors.BRIGHT_WHITE}{label:<24}{Colors.RESET}: {Colors.BRIGHT_GREEN}{seconds * 1000:8.1f} ms{Colors.RESET}")
+    heavy = [name for name in ('pandas', 'openpyxl', 'numpy', 'pyarrow') if name in sys.modules]
+    print(f"{Colors.BRIGHT_WHITE}{'Heavy imports':<24}{Colors.RESET}: {', '.join(heavy) if heavy else 'none'}")
+    app.shutdown()
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="iPhone Device Scanner (no command: interactive menu)")
+    parser.add_argument('--startup-time', action='store_true', help="measure startup time and exit")
+    parser.add_argument('--coordinator', default=COORDINATOR_URL, metavar='URL',
+                        help="shared duplicate check across stations (see coordinator.py)")
+    commands = parser.add_subparsers(dest='command')
+    
+    monitor = commands.add_parser('monitor', help="extract and save devices as they are plugged in")
+    monitor.add_argument('--shutdown', action='store_true', help="shut each device down after saving")
+    monitor.add_argument('--workers', type=int, default=MAX_EXTRACTION_WORKERS, help="devices extracted at once")
+    monitor.add_argument('--duration', type=float, help="stop after this many seconds")
+    monitor.add_argument('--rescan', action='store_true', help="full extraction even for already-scanned devices")
+    monitor.add_argument('--dashboard', action='store_true', default=DASHBOARD_ENABLED,
+                         help="live table of devices instead of scrolling output")
+    
+    scan = commands.add_parser('scan', help="extract all connected devices once")
+    scan.add_argument('--yes', action='store_true', help="save every new device without asking")
+    scan.add_argument('--each', action='store_true', help="confirm each device separately")
+    scan.add_argument('--rescan', action='store_true', help="full extraction even for already-scanned devices")
+    
+    export = commands.add_parser('export', help="export the scan history")
+    export.add_argument('--csv', default='iphone_data_export.csv', help="CSV file to write")
+    export.add_argument('--excel', action='store_true', help=f"also regenerate {BC_FILE} from the history")
+    export.add_argument('--parquet', action='store_true', help=f"also rebuild {PARQUET_DIR}/ from the history")
+    
+    report = commands.add_parser('report', help="device counts by product/storage/color/region")
+    report.add_argument('--day', default='today', help="YYYY-MM-DD, 'today' (default) or 'all'")
+    report.add_argument('--product', help="filter, e.g. '13 Pro'")
+    report.add_argument('--storage', help="filter, e.g. '256'")
+    report.add_argument('--color', help="filter, e.g. 'graphite'")
+    report.add_argument('--rebuild', action='store_true', help=f"recount from {CSV_FILE} first")
+    
+    commands.add_parser('compact', help="merge small Parquet files and compact the seen IMEI journal")
+    mappings = commands.add_parser('mappings', help="validate the mapping files and list unmapped ProductTypes")
+    mappings.add_argument('--build', action='store_true', help=f"recompile {MAPPING_CACHE_FILE} first")
+    
+    history = commands.add_parser('import', help="add IMEIs from old CSV/XLSX exports to the seen IMEI list")
+    history.add_argument('files', nargs='+', help=f"{CSV_FILE} / {BC_FILE} files from any station")
+    history.add_argument('--chunk-rows', type=int, default=IMPORT_CHUNK_ROWS, help="rows read per chunk")
+    
+    timings = commands.add_parser('timings', help="per-stage timing summary")
+    timings.add_argument('--hours', type=float, help="only the last N hours")
+    return parser
+
+def _terminate(signum, frame):
+    """SIGTERM stops a headless run the same way Ctrl+C does"""
+    raise KeyboardInterrupt
+
+def run_command(args) -> int:
+    """Headless mode: run one command without the menu"""
+    if args.command == 'timings':
+        print_summary(time.time() - args.hours * 3600 if args.hours else None)
+        return 0
+    
+    signal.signal(signal.SIGTERM, _terminate)
+    app = iPhoneScannerApp(interactive=False, coordinator_url=args.coordinator)
+    try:
+        if args.command == 'monitor':
+            app.monitor_devices(auto_shutdown=args.shutdown, workers=args.workers,
+                                duration=args.duration, rescan=args.rescan, dashboard=args.dashboard)
+        elif args.command == 'scan':
+            app.scan_current_devices(confirm='yes' if args.yes else 'each' if args.each else 'batch',
+                                     rescan=args.rescan)
+        elif args.command == 'export':
+            app.export_data(args.csv, excel=args.excel, parquet=args.parquet)
+        elif args.command == 'report':
+            if args.rebuild:
+                app.file_manager.summary.rebuild()
+            app.show_summary(None if args.day == 'all' else args.day,
+                             product=args.product, storage=args.storage, color=args.color)
+        elif args.command == 'compact':
+            app.compact_outputs()
+        elif args.command == 'mappings':
+            if args.build:
+                app.data_manager.mappings.build_cache()
+            app.data_manager.mappings.print_report()
+        elif args.command == 'import':
+            app.import_history(args.files, chunk_rows=args.chunk_rows)
+    finally:
+        app.shutdown()
+    return 0
+
 if __name__ == "__main__":
+    args = build_parser().parse_args()
+    if args.startup_time:
+        measure_startup()
+        sys.exit(0)
+    if args.command:
+        try:
+            sys.exit(run_command(args))
+        except KeyboardInterrupt:
+            sys.exit(130)
+    
+    app = None
     try:
-        app = iPhoneScannerApp()
+        app = iPhoneScannerApp(coordinator_url=args.coordinator)
         app.run()
     except KeyboardInterrupt:
         print(f"\n\n{Colors.BRIGHT_RED}{Icons.STOP} Application terminated{Colors.RESET}")
         sys.exit(0)
     except Exception as e:
         print_error(f"Application error: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+    finally:
+        if app:
+            app.shutdown()
\ No newline at end of file
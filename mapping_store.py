@@ -0,0 +1,534 @@
+# mapping_store.py
+import hashlib
+import json
+import marshal
+import os
+import sys
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from colors import Colors
+from utils import print_success, print_error, print_warning, print_info, format_upc_for_output
+from config import (PRODUCT_MAPPING, PRODUCT_MAPPING_FILE, MODEL_MAPPING_FILE, UPC_MAPPING_FILE,
+                    MAPPING_WATCH_INTERVAL, UNKNOWN_PRODUCT_TYPES_FILE, MAPPING_CACHE_FILE)
+from storage_extractor import COMMON_CAPACITIES_GB
+
+REGIONS = ("US", "China", "Japan", "Global")
+
+# Compiled-mapping cache: magic, then the SHA-256 source key, then the marshalled tables.
+# The key covers the format version, the Python version (marshal's format is
+# not stable across releases), PRODUCT_MAPPING and the bytes of every mapping file.
+CACHE_MAGIC = b'IPMAPC\0\0'
+CACHE_FORMAT = 1
+
+@lru_cache(maxsize=1024)
+def detect_region(part: str) -> str:
+    """Region from a part number (e.g. MLPF3LL/A -> US)"""
+    if not part or part == "N/A":
+        return "Global"
+    
+    part_upper = part.upper()
+    if "LL/A" in part_upper or "US/" in part_upper:
+        return "US"
+    elif "CH/A" in part_upper or "CN/A" in part_upper:
+        return "China"
+    elif "J/A" in part_upper or "JP/A" in part_upper:
+        return "Japan"
+    return "Global"
+
+@lru_cache(maxsize=256)
+def parse_capacity_gb(storage: str):
+    """'128 GB' -> 128, '1 TB' -> 1024; None if not a capacity"""
+    if not storage or storage == "N/A":
+        return None
+    
+    parts = storage.split()
+    try:
+        value = float(parts[0])
+    except (ValueError, IndexError):
+        return None
+    
+    unit = parts[1].upper() if len(parts) > 1 else "GB"
+    if unit == "TB":
+        value *= 1024
+    elif unit != "GB":
+        return None
+    return int(value)
+
+def closest_capacity(capacity: int, available: list) -> int:
+    """Closest available capacity (first one wins on ties)"""
+    return min(available, key=lambda x: abs(x - capacity))
+
+class MappingError(Exception):
+    """A mapping file that cannot be used at all (unreadable, not a JSON object)"""
+
+def validate_products(data: dict, problems: List[str]) -> Dict[str, str]:
+    """ProductType -> product name; entries that are not two non-empty strings are dropped"""
+    clean = {}
+    for product_type, name in data.items():
+        if isinstance(name, str) and name.strip() and product_type.strip():
+            clean[product_type.strip()] = name.strip()
+        else:
+            problems.append(f"product mapping: {product_type!r} -> {name!r} is not a product name")
+    return clean
+
+def validate_models(data: dict, problems: List[str]) -> Dict[str, List[str]]:
+    """Product name -> list of model IDs"""
+    clean = {}
+    for product, models in data.items():
+        if isinstance(models, str):
+            models = [models]
+        if not isinstance(models, list) or not all(isinstance(model, str) and model for model in models):
+            problems.append(f"{MODEL_MAPPING_FILE}: {product!r} should be a list of model IDs")
+            continue
+        clean[product] = models
+    return clean
+
+def validate_upcs(data: dict, problems: List[str]) -> Dict[str, Dict[str, Dict[str, str]]]:
+    """Product name -> storage ('128 GB') -> region -> UPC"""
+    clean = {}
+    for product, storages in data.items():
+        if not isinstance(storages, dict):
+            problems.append(f"{UPC_MAPPING_FILE}: {product!r} should map storage sizes to regions")
+            continue
+        kept = {}
+        for storage, regions in storages.items():
+            if parse_capacity_gb(storage) is None:
+                problems.append(f"{UPC_MAPPING_FILE}: {product} / {storage!r} is not a storage size")
+                continue
+            if not isinstance(regions, dict):
+                problems.append(f"{UPC_MAPPING_FILE}: {product} / {storage} should map regions to UPCs")
+                continue
+            codes = {}
+            for region, upc in regions.items():
+                if region not in REGIONS:
+                    problems.append(f"{UPC_MAPPING_FILE}: {product} / {storage}: unknown region {region!r}")
+                elif not str(upc).strip().isdigit():
+                    problems.append(f"{UPC_MAPPING_FILE}: {product} / {storage} / {region}: {upc!r} is not a UPC")
+                else:
+                    codes[region] = str(upc).strip()
+            if codes:
+                kept[storage] = codes
+        if kept:
+            clean[product] = kept
+    return clean
+
+class MappingTables:
+    """
+    One validated, compiled version of the mappings. It is never changed
+    after construction, so lookups read it without a lock and a reload
+    replaces the whole object.
+    
+    Lookups are dict hits: upc_index[(product, capacity_gb, region)] and
+    model_index[(product, region)], with the region/closest-capacity
+    fallbacks already applied.
+    """
+    
+    def __init__(self, products: Dict[str, str], models: Dict[str, List[str]], upcs: Dict[str, Dict],
+                 sources: Optional[Dict] = None, version: int = 1, problems: Optional[List[str]] = None,
+                 compiled: Optional[Dict] = None):
+        self.products = products
+        self.models = models
+        self.upcs = upcs
+        self.sources = sources or {}
+        self.version = version
+        self.problems = problems or []
+        self.loaded_at = time.time()
+        self.cached = compiled is not None
+        if compiled is None:
+            self.compile()
+        else:
+            self.model_index = compiled['model_index']
+            self.upc_index = compiled['upc_index']
+            self.upc_capacities = compiled['upc_capacities']
+    
+    def to_cache(self) -> Dict:
+        """Everything needed to rebuild these tables without compiling (marshal-safe types only)"""
+        return {'products': self.products, 'models': self.models, 'upcs': self.upcs, 'problems': self.problems,
+                'model_index': self.model_index, 'upc_index': self.upc_index,
+                'upc_capacities': self.upc_capacities}
+    
+    @classmethod
+    def from_cache(cls, data: Dict, sources: Dict, version: int) -> 'MappingTables':
+        return cls(data['products'], data['models'], data['upcs'], sources, version, data['problems'],
+                   compiled=data)
+    
+    def compile(self):
+        self.model_index = {}
+        for product_name, models in self.models.items():
+            for region in REGIONS:
+                self.model_index[(product_name, region)] = self._determine_specific_model(models, region)
+        
+        self.upc_index = {}
+        self.upc_capacities = {}
+        for product_name, storages in self.upcs.items():
+            by_capacity = {}
+            for key, region_dict in storages.items():
+                capacity = parse_capacity_gb(key)
+                if capacity is not None and capacity not in by_capacity:
+                    by_capacity[capacity] = region_dict
+            if not by_capacity:
+                continue
+            self.upc_capacities[product_name] = list(by_capacity)
+            
+            # Exact capacities plus the ones storage detection can report
+            for capacity in set(by_capacity) | set(COMMON_CAPACITIES_GB):
+                region_dict = by_capacity.get(capacity)
+                if region_dict is None:
+                    region_dict = by_capacity[closest_capacity(capacity, self.upc_capacities[product_name])]
+                for region in REGIONS:
+                    self.upc_index[(product_name, capacity, region)] = self._pick_upc(region_dict, region)
+    
+    def _pick_upc(self, region_dict: dict, region: str) -> str:
+        """Region, then Global, then first available region"""
+        upc_value = region_dict.get(region) or region_dict.get("Global")
+        if not upc_value and region_dict:
+            upc_value = list(region_dict.values())[0]
+        return format_upc_for_output(upc_value) if upc_value else "N/A"
+    
+    def _determine_specific_model(self, model_list: list, region: str) -> str:
+        """Determine the specific model ID for a region"""
+        if len(model_list) <= 1:
+            return ", ".join(model_list) if model_list else "N/A"
+        
+        # Model IDs by region suffix: US ends in 4, China in 8, Japan in 6
+        suffix = {"US": "4", "China": "8", "Japan": "6"}.get(region)
+        if suffix:
+            for model in model_list:
+                if model.endswith(suffix):
+                    return model
+        
+        return model_list[0]
+    
+    def model_id(self, product_name: str, part: str) -> str:
+        return self.model_index.get((product_name, detect_region(part)), "N/A")
+    
+    def upc(self, product_name: str, capacity: int, part: str) -> str:
+        region = detect_region(part)
+        upc = self.upc_index.get((product_name, capacity, region))
+        if upc is None and product_name in self.upc_capacities:
+            # Capacity outside the precompiled set: pick the closest one
+            nearest = closest_capacity(capacity, self.upc_capacities[product_name])
+            upc = self.upc_index.get((product_name, nearest, region))
+        return upc or "N/A"
+    
+    def gaps(self) -> List[str]:
+        """Products known to one table but missing from another"""
+        mapped = set(self.products.values())
+        gaps = [f"{product}: in {MODEL_MAPPING_FILE} but no ProductType maps to it"
+                for product in self.models if product not in mapped]
+        gaps += [f"{product}: no model IDs in {MODEL_MAPPING_FILE}"
+                 for product in sorted(mapped) if product not in self.models]
+        gaps += [f"{product}: no UPCs in {UPC_MAPPING_FILE}"
+                 for product in sorted(mapped) if product not in self.upcs]
+        return gaps
+
+class MappingStore:
+    """
+    The current MappingTables, rebuilt when a mapping file changes.
+    
+    A watcher thread compares file mtimes every MAPPING_WATCH_INTERVAL
+    seconds; a changed set of files is read, validated and compiled on that
+    thread, then swapped in with a single assignment while extraction keeps
+    using the previous version. A file that does not parse keeps the
+    previous version and is reported once per change. Bad entries are
+    dropped and reported. ProductTypes missing from PRODUCT_MAPPING /
+    PRODUCT_MAPPING_FILE are counted in UNKNOWN_PRODUCT_TYPES_FILE: a new
+    type is written at once, later sightings only in memory until the
+    watcher's next pass or stop().
+    
+    Compiled tables are kept in MAPPING_CACHE_FILE, keyed by a hash of the
+    sources: while the key matches, loading is one read and unmarshal with
+    no JSON parsing or compiling. Any change to the sources makes the cache
+    stale, so the JSON is read again and the cache is rewritten.
+    """
+    
+    def __init__(self, product_file: str = PRODUCT_MAPPING_FILE, model_file: str = MODEL_MAPPING_FILE,
+                 upc_file: str = UPC_MAPPING_FILE, watch_interval: float = MAPPING_WATCH_INTERVAL,
+                 unknown_file: str = UNKNOWN_PRODUCT_TYPES_FILE, cache_file: Optional[str] = MAPPING_CACHE_FILE):
+        self.product_file = product_file
+        self.model_file = model_file
+        self.upc_file = upc_file
+        self.watch_interval = watch_interval
+        self.unknown_file = unknown_file
+        self.cache_file = cache_file
+        self.tables: Optional[MappingTables] = None
+        self.attempted = None  # file stats of the last build attempt, good or bad
+        self.unknown = None
+        self.unknown_dirty = False
+        self.lock = threading.Lock()
+        self.unknown_lock = threading.Lock()  # never held while compiling
+        self.stop_event = threading.Event()
+        self._thread = None
+    
+    @property
+    def paths(self) -> Tuple[str, str, str]:
+        return (self.product_file, self.model_file, self.upc_file)
+    
+    def current(self) -> MappingTables:
+        """The live tables (loaded on first use)"""
+        tables = self.tables
+        if tables is None:
+            tables = self.load()
+        return tables
+    
+    def load(self) -> MappingTables:
+        """First build; a broken file counts as empty rather than stopping the app"""
+        with self.lock:
+            if self.tables is None:
+                self.tables = self.build(strict=False)
+                print_success(f"Loaded mappings{' (cached)' if self.tables.cached else ''}: {len(self.tables.products)} product types, "
+                              f"{len(self.tables.models)} models, {len(self.tables.upcs)} UPC products")
+                for problem in self.tables.problems:
+                    print_warning(problem)
+        return self.tables
+    
+    def _stat(self) -> Dict[str, Optional[Tuple[int, int]]]:
+        stats = {}
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                stats[path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                stats[path] = None
+        return stats
+    
+    def _read_sources(self) -> Dict[str, Optional[bytes]]:
+        sources = {}
+        for path in self.paths:
+            try:
+                with open(path, 'rb') as f:
+                    sources[path] = f.read()
+            except FileNotFoundError:
+                sources[path] = None
+            except OSError as e:
+                raise MappingError(f"{path}: {e}")
+        return sources
+    
+    def source_key(self, sources: Dict[str, Optional[bytes]]) -> bytes:
+        """SHA-256 over everything the compiled tables depend on"""
+        digest = hashlib.sha256(f'{CACHE_FORMAT}:{sys.version_info[0]}.{sys.version_info[1]}:'.encode())
+        digest.update(repr(sorted(PRODUCT_MAPPING.items())).encode('utf-8'))
+        digest.update(repr((REGIONS, sorted(COMMON_CAPACITIES_GB))).encode('utf-8'))
+        for path in self.paths:
+            content = sources[path]
+            digest.update(f'\0{os.path.basename(path)}:{-1 if content is None else len(content)}\0'.encode())
+            digest.update(content or b'')
+        return digest.digest()
+    
+    def _parse(self, path: str, content: Optional[bytes], strict: bool) -> dict:
+        if content is None:
+            return {}
+        try:
+            data = json.loads(content.decode('utf-8'))
+            if not isinstance(data, dict):
+                raise ValueError("top level is not a JSON object")
+            return data
+        except ValueError as e:
+            if strict:
+                raise MappingError(f"{path}: {e}")
+            print_error(f"Error loading {path}: {e}")
+            return {}
+    
+    def build(self, strict: bool = True, use_cache: bool = True) -> MappingTables:
+        """
+        Tables for the files as they are now: from the cache when its key
+        matches, else read, validated and compiled from JSON (and cached).
+        Raises MappingError if strict and a file is unusable.
+        """
+        stats = self._stat()
+        self.attempted = stats
+        version = self.tables.version + 1 if self.tables is not None else 1
+        try:
+            sources = self._read_sources()
+        except MappingError as e:
+            if strict:
+                raise
+            print_error(f"Error loading mappings: {e}")
+            sources = {path: None for path in self.paths}
+        key = self.source_key(sources)
+        if use_cache:
+            tables = self._load_cache(key, stats, version)
+            if tables is not None:
+                return tables
+        
+        problems = []
+        products = dict(PRODUCT_MAPPING)
+        products.update(validate_products(self._parse(self.product_file, sources[self.product_file], strict),
+                                          problems))
+        models = validate_models(self._parse(self.model_file, sources[self.model_file], strict), problems)
+        upcs = validate_upcs(self._parse(self.upc_file, sources[self.upc_file], strict), problems)
+        tables = MappingTables(products, models, upcs, stats, version, problems)
+        self._save_cache(key, tables)
+        return tables
+    
+    def _load_cache(self, key: bytes, stats: Dict, version: int) -> Optional[MappingTables]:
+        """Cached tables if the cache matches key; None when missing, stale or unreadable"""
+        if not self.cache_file:
+            return None
+        try:
+            with open(self.cache_file, 'rb') as f:
+                if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC or f.read(len(key)) != key:
+                    return None
+                return MappingTables.from_cache(marshal.loads(f.read()), stats, version)
+        except (OSError, ValueError, EOFError, TypeError, KeyError):
+            return None
+    
+    def _save_cache(self, key: bytes, tables: MappingTables):
+        if not self.cache_file:
+            return
+        try:
+            tmp_path = self.cache_file + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(CACHE_MAGIC + key + marshal.dumps(tables.to_cache()))
+            os.replace(tmp_path, self.cache_file)
+        except (OSError, ValueError) as e:
+            print_warning(f"Could not write {self.cache_file}: {e}")
+    
+    def build_cache(self) -> MappingTables:
+        """Recompile from JSON, rewrite the cache and compare both load paths"""
+        with self.lock:
+            started = time.perf_counter()
+            tables = self.build(strict=False, use_cache=False)
+            json_ms = (time.perf_counter() - started) * 1000
+            self.tables = tables
+        
+        started = time.perf_counter()
+        cached = self._load_cache(self.source_key(self._read_sources()), tables.sources, tables.version)
+        cache_ms = (time.perf_counter() - started) * 1000
+        if cached is None:
+            print_error(f"{self.cache_file} was not written")
+            return tables
+        print_success(f"Wrote {self.cache_file} ({os.path.getsize(self.cache_file) // 1024} KB, "
+                      f"{len(tables.upc_index)} UPC keys, {len(tables.model_index)} model keys)")
+        print_info(f"Load from JSON: {json_ms:.1f} ms, from cache: {cache_ms:.1f} ms")
+        return tables
+    
+    def reload_if_changed(self) -> bool:
+        """Swap in a new version if any file changed since the last attempt"""
+        if self.tables is None or self._stat() == self.attempted:
+            return False
+        with self.lock:
+            try:
+                tables = self.build(strict=True)
+            except MappingError as e:
+                print_error(f"Mapping reload skipped, keeping version {self.tables.version}: {e}")
+                return False
+            previous, self.tables = self.tables, tables
+        
+        print_success(f"Mappings reloaded (version {tables.version}): {len(tables.products)} product types, "
+                      f"{len(tables.models)} models, {len(tables.upcs)} UPC products")
+        for problem in tables.problems:
+            print_warning(problem)
+        added = sorted(set(tables.products) - set(previous.products))
+        if added:
+            print_info(f"New product types: {', '.join(added)}")
+        return True
+    
+    def start(self):
+        """Watch the files on a background thread"""
+        if self._thread is None and self.watch_interval > 0:
+            self.stop_event.clear()
+            self._thread = threading.Thread(target=self._watch, name='mapping-watcher', daemon=True)
+            self._thread.start()
+        return self
+    
+    def stop(self):
+        if self._thread is not None:
+            self.stop_event.set()
+            self._thread.join()
+            self._thread = None
+        self.flush_unknown()
+    
+    def _watch(self):
+        while not self.stop_event.wait(self.watch_interval):
+            try:
+                self.reload_if_changed()
+                self.flush_unknown()
+            except Exception as e:
+                print_error(f"Mapping watcher error: {e}")
+    
+    def product_name(self, product_type: str, udid: Optional[str] = None) -> str:
+        """Product name for a ProductType; unknown ones are recorded"""
+        name = self.current().products.get(product_type)
+        if name is None:
+            self.report_unknown(product_type, udid)
+            return f'Unknown ({product_type})'
+        return name
+    
+    def _load_unknown(self) -> Dict[str, Dict]:
+        if self.unknown is None:
+            try:
+                with open(self.unknown_file, 'r') as f:
+                    self.unknown = json.load(f)
+            except (OSError, ValueError):
+                self.unknown = {}
+        return self.unknown
+    
+    def report_unknown(self, product_type: str, udid: Optional[str] = None):
+        """Count a ProductType seen on a device but missing from the mapping"""
+        if not product_type or product_type == 'N/A':
+            return
+        now = time.strftime("%Y-%m-%d %H:%M:%S")
+        with self.unknown_lock:
+            unknown = self._load_unknown()
+            first = product_type not in unknown
+            if first:
+                unknown[product_type] = {'count': 0, 'first_seen': now}
+                print_warning(f"Unknown ProductType {product_type}: add it to {self.product_file} "
+                              f"(picked up without a restart)")
+            entry = unknown[product_type]
+            entry['count'] += 1
+            entry['last_seen'] = now
+            if udid:
+                entry['last_udid'] = udid
+            self.unknown_dirty = True
+            if first:
+                self._save_unknown()
+    
+    def flush_unknown(self):
+        """Write counts gathered since the last save (watcher pass and stop())"""
+        with self.unknown_lock:
+            if self.unknown_dirty:
+                self._save_unknown()
+    
+    def _save_unknown(self):
+        """Caller holds unknown_lock"""
+        try:
+            tmp_path = self.unknown_file + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.unknown, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.unknown_file)
+            self.unknown_dirty = False
+        except OSError as e:
+            print_error(f"Error saving {self.unknown_file}: {e}")
+    
+    def unknown_types(self) -> Dict[str, Dict]:
+        """Recorded ProductTypes that the current mapping still does not know"""
+        products = self.current().products
+        with self.unknown_lock:
+            return {product_type: dict(entry) for product_type, entry in self._load_unknown().items()
+                    if product_type not in products}
+    
+    def print_report(self):
+        """Validation problems, gaps between the tables and unknown ProductTypes"""
+        tables = self.current()
+        print(f"\n{Colors.BRIGHT_WHITE}Mappings (version {tables.version}){Colors.RESET}")
+        print(f"  {len(tables.products)} product types, {len(tables.models)} models, "
+              f"{len(tables.upcs)} UPC products")
+        
+        for title, lines in (("Invalid entries (skipped)", tables.problems), ("Gaps", tables.gaps())):
+            if lines:
+                print(f"\n{Colors.BRIGHT_YELLOW}{title}:{Colors.RESET}")
+                for line in lines:
+                    print(f"  {line}")
+        
+        unknown = self.unknown_types()
+        if not unknown:
+            print_success("No unknown ProductTypes seen")
+            return
+        print(f"\n{Colors.BRIGHT_RED}ProductTypes seen on devices but not mapped:{Colors.RESET}")
+        for product_type, entry in sorted(unknown.items(), key=lambda item: -item[1]['count']):
+            print(f"  {product_type:<14} {entry['count']:>5} device(s)  last {entry.get('last_seen', '')}")
@@ -0,0 +1,230 @@
+# parquet_sink.py
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from utils import print_success, print_error, print_warning, print_info
+from config import PARQUET_DIR, PARQUET_FLUSH_ROWS, PARQUET_COMPACT_MIN_FILES
+from mapping_store import detect_region
+
+# Partition directories are PARQUET_DIR/scan_date=YYYY-MM-DD (Hive style, so
+# pyarrow.dataset / pandas / DuckDB pick the date up as a column)
+PARTITION_KEY = 'scan_date'
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def parquet_schema():
+    import pyarrow as pa
+    
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('imei1', pa.int64()),
+        ('imei2', pa.int64()),
+        ('serial', pa.string()),
+        ('part', pa.string()),
+        ('product', category),
+        ('product_type', category),
+        ('storage', category),
+        ('color', category),
+        ('region', category),
+        ('model_id', pa.string()),
+        ('upc', pa.string()),
+        ('device_name', pa.string()),
+        ('ios_version', pa.string()),
+        ('udid', pa.string()),
+        ('scanned_at', pa.timestamp('ms')),
+    ])
+
+def _imei(value) -> Optional[int]:
+    value = str(value or '')
+    return int(value) if len(value) == 15 and value.isdigit() else None
+
+def _text(value) -> Optional[str]:
+    return None if value in (None, '', 'N/A') else str(value)
+
+def _timestamp(value) -> datetime:
+    try:
+        return datetime.strptime(str(value), TIMESTAMP_FORMAT)
+    except ValueError:
+        return datetime.now().replace(microsecond=0)
+
+class ParquetSink:
+    """
+    Columnar copy of the scan history: Parquet files partitioned by scan
+    date, with integer IMEIs, dictionary-encoded product/storage/color/region
+    and real timestamps.
+    
+    Saved devices are buffered and written as a new file every
+    PARQUET_FLUSH_ROWS rows and on close(), so each session adds a few small
+    files per day; compact() merges them into one file per partition.
+    pyarrow is optional: without it the sink stays off.
+    """
+    
+    def __init__(self, root: str = PARQUET_DIR):
+        self.root = root
+        self._enabled = None
+        self.session = time.strftime('%Y%m%d-%H%M%S') + '-' + uuid.uuid4().hex[:6]
+        self.sequence = 0
+        self.pending: List[Dict] = []
+    
+    @property
+    def enabled(self) -> bool:
+        """pyarrow is imported on the first save, not at startup"""
+        if self._enabled is None:
+            self._enabled = pyarrow_available()
+            if not self._enabled:
+                print_info("pyarrow not installed, Parquet copy of the scan history is off")
+        return self._enabled
+    
+    def add(self, device_infos: Iterable[Dict]):
+        """Buffer saved devices; writes once PARQUET_FLUSH_ROWS are waiting"""
+        if not self.enabled:
+            return
+        self.pending.extend(device_infos)
+        if len(self.pending) >= PARQUET_FLUSH_ROWS:
+            self.flush()
+    
+    def flush(self):
+        if not self.pending or not self.enabled:
+            return
+        rows, self.pending = self.pending, []
+        try:
+            self.write(rows)
+        except Exception as e:
+            print_error(f"Parquet save error: {e}")
+    
+    def close(self):
+        self.flush()
+    
+    def write(self, device_infos: Iterable[Dict], prefix: Optional[str] = None) -> int:
+        """Write records as one new file per scan date; returns the row count"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        by_date: Dict[str, List[Dict]] = {}
+        for info in device_infos:
+            scanned_at = _timestamp(info.get('timestamp'))
+            by_date.setdefault(scanned_at.strftime('%Y-%m-%d'), []).append(self._row(info, scanned_at))
+        
+        schema = parquet_schema()
+        count = 0
+        for scan_date, rows in by_date.items():
+            directory = os.path.join(self.root, f'{PARTITION_KEY}={scan_date}')
+            os.makedirs(directory, exist_ok=True)
+            self.sequence += 1
+            name = f'{prefix or "part-" + self.session}-{self.sequence:05d}.parquet'
+            table = pa.Table.from_pylist(rows, schema=schema)
+            tmp_path = os.path.join(directory, name + '.tmp')
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, os.path.join(directory, name))
+            count += len(rows)
+        return count
+    
+    def _row(self, info: Dict, scanned_at: datetime) -> Dict:
+        part = info.get('part', 'N/A')
+        return {
+            'imei1': _imei(info.get('imei1')),
+            'imei2': _imei(info.get('imei2')),
+            'serial': _text(info.get('serial')),
+            'part': _text(part),
+            'product': _text(info.get('product_name')),
+            'product_type': _text(info.get('product_type')),
+            'storage': _text(info.get('storage')),
+            'color': _text(info.get('color')),
+            'region': detect_region(part),
+            'model_id': _text(info.get('model_id')),
+            'upc': _text(info.get('upc')),
+            'device_name': _text(info.get('device_name')),
+            'ios_version': _text(info.get('ios_version')),
+            'udid': _text(info.get('udid')),
+            'scanned_at': scanned_at,
+        }
+    
+    def partitions(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(os.path.join(self.root, name) for name in os.listdir(self.root)
+                      if name.startswith(PARTITION_KEY + '='))
+    
+    def compact(self, min_files: int = PARQUET_COMPACT_MIN_FILES) -> int:
+        """
+        Merge each partition's files into one, sorted by scan time. The merged
+        file lists its sources in its metadata; if a crash leaves any of them
+        behind, they are deleted on the next run instead of being merged twice.
+        Returns the number of partitions rewritten.
+        """
+        if not self.enabled:
+            print_warning("pyarrow is not installed, nothing to compact")
+            return 0
+        self.flush()
+        
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        rewritten = 0
+        for directory in self.partitions():
+            files = sorted(name for name in os.listdir(directory) if name.endswith('.parquet'))
+            files = self._drop_merged_sources(directory, files)
+            if len(files) < min_files:
+                continue
+            
+            try:
+                table = pa.concat_tables([pq.read_table(os.path.join(directory, name), schema=parquet_schema())
+                                          for name in files])
+                table = table.sort_by('scanned_at').replace_schema_metadata(
+                    {'compacted_from': '\n'.join(files)})
+                name = f'compacted-{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:6]}.parquet'
+                tmp_path = os.path.join(directory, name + '.tmp')
+                pq.write_table(table, tmp_path)
+                os.replace(tmp_path, os.path.join(directory, name))
+                for source in files:
+                    os.remove(os.path.join(directory, source))
+            except Exception as e:
+                print_error(f"Error compacting {directory}: {e}")
+                continue
+            rewritten += 1
+            print_info(f"{os.path.basename(directory)}: {len(files)} files -> 1 ({table.num_rows} rows)")
+        
+        print_success(f"Compacted {rewritten} partition(s) in {self.root}")
+        return rewritten
+    
+    def _drop_merged_sources(self, directory: str, files: List[str]) -> List[str]:
+        import pyarrow.parquet as pq
+        
+        remaining = set(files)
+        for name in files:
+            if not name.startswith('compacted-') or name not in remaining:
+                continue
+            metadata = pq.read_schema(os.path.join(directory, name)).metadata or {}
+            for source in metadata.get(b'compacted_from', b'').decode('utf-8').split('\n'):
+                if source in remaining and source != name:
+                    os.remove(os.path.join(directory, source))
+                    remaining.discard(source)
+        return sorted(remaining)
+    
+    def rebuild(self, scans: Iterable[Dict], batch: int = 50000) -> int:
+        """Rewrite the whole dataset from scan records (e.g. InventoryStore.iter_scans())"""
+        if not self.enabled:
+            print_warning("pyarrow is not installed, Parquet export skipped")
+            return 0
+        if os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+        count, chunk = 0, []
+        for scan in scans:
+            chunk.append(scan)
+            if len(chunk) >= batch:
+                count += self.write(chunk, prefix='history')
+                chunk = []
+        if chunk:
+            count += self.write(chunk, prefix='history')
+        self.compact(min_files=2)
+        return count
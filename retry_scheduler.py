@@ -0,0 +1,97 @@
+# retry_scheduler.py
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_JITTER
+
+class RetryScheduler:
+    """
+    Per-UDID retry bookkeeping with exponential backoff and jitter.
+    
+    A failed extraction schedules the next attempt base * 2^(n-1) seconds
+    later (capped, +/- jitter); after max_attempts the device is given up
+    on until it is unplugged. Nothing here blocks: the monitor loop asks
+    for due() devices and submits them next to the healthy ones.
+    """
+    
+    def __init__(self, max_attempts: int = RETRY_MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY, jitter: float = RETRY_JITTER):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.entries: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+    
+    def backoff(self, attempts: int) -> float:
+        """Delay before the next attempt after attempts failures"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+    
+    def record_failure(self, udid: str, reason: str) -> Optional[float]:
+        """Schedule a retry; returns the delay, or None once the device is given up on"""
+        with self.lock:
+            entry = self.entries.setdefault(udid, {'attempts': 0})
+            entry['attempts'] += 1
+            entry['reason'] = reason
+            if entry['attempts'] >= self.max_attempts:
+                entry['next_attempt'] = None
+                return None
+            delay = self.backoff(entry['attempts'])
+            entry['next_attempt'] = time.monotonic() + delay
+            return delay
+    
+    def record_success(self, udid: str):
+        with self.lock:
+            self.entries.pop(udid, None)
+    
+    def forget(self, udid: str):
+        """Device unplugged: the next plug-in starts with a clean slate"""
+        with self.lock:
+            self.entries.pop(udid, None)
+    
+    def due(self) -> List[str]:
+        """UDIDs whose retry time has come (each is returned once per scheduled attempt)"""
+        now = time.monotonic()
+        ready = []
+        with self.lock:
+            for udid, entry in self.entries.items():
+                if entry.get('next_attempt') is not None and entry['next_attempt'] <= now:
+                    entry['next_attempt'] = None
+                    ready.append(udid)
+        return ready
+    
+    def next_due_in(self) -> Optional[float]:
+        """Seconds until the earliest scheduled retry (None if nothing is scheduled)"""
+        with self.lock:
+            times = [entry['next_attempt'] for entry in self.entries.values() if entry.get('next_attempt') is not None]
+        return max(0.0, min(times) - time.monotonic()) if times else None
+    
+    def gave_up(self, udid: str) -> bool:
+        with self.lock:
+            entry = self.entries.get(udid)
+            return bool(entry) and entry['attempts'] >= self.max_attempts
+    
+    def state(self) -> List[Dict]:
+        """Pending and given-up devices, for display"""
+        now = time.monotonic()
+        rows = []
+        with self.lock:
+            for udid, entry in self.entries.items():
+                if entry['attempts'] >= self.max_attempts:
+                    status, wait = 'gave up', None
+                elif entry.get('next_attempt') is None:
+                    status, wait = 'retrying', 0.0
+                else:
+                    status, wait = 'waiting', max(0.0, entry['next_attempt'] - now)
+                rows.append({
+                    'udid': udid,
+                    'status': status,
+                    'attempts': entry['attempts'],
+                    'max_attempts': self.max_attempts,
+                    'retry_in': wait,
+                    'reason': entry.get('reason', ''),
+                })
+        return sorted(rows, key=lambda row: row['udid'])
@@ -0,0 +1,230 @@
+# scanner_engine.py
+import asyncio
+import plistlib
+import subprocess
+import threading
+import time
+from concurrent.futures import Future
+from typing import Coroutine, Dict, List, Optional, Set, Tuple
+
+from utils import print_error, print_warning
+from config import ENGINE_MAX_CONCURRENCY, DETECT_TIMEOUT, SHUTDOWN_TIMEOUT
+from storage_extractor import find_storage_bytes, DISK_USAGE_DOMAIN
+from telemetry import span
+
+class Deadline:
+    """One time budget shared by every call made for a device"""
+    
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+    
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+    
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+    
+    def extend(self, seconds: float):
+        self.expires += seconds
+
+def parse_device_info(output) -> Dict:
+    """Parse device info from ideviceinfo output (plist, or key: value text)"""
+    if isinstance(output, str):
+        output = output.encode('utf-8')
+    
+    if output.lstrip().startswith(b'<?xml') or output.startswith(b'bplist'):
+        try:
+            parsed = plistlib.loads(output)
+            return parsed if isinstance(parsed, dict) else {}
+        except Exception as e:
+            print_error(f"Invalid plist from ideviceinfo: {e}")
+            return {}
+    
+    device_info = {}
+    
+    for line in output.decode('utf-8', errors='replace').splitlines():
+        if ': ' in line:
+            key, value = line.split(': ', 1)
+            device_info[key.strip()] = value.strip()
+    
+    return device_info
+
+class ScannerEngine:
+    """
+    libimobiledevice calls as asyncio subprocesses on one background event loop.
+    
+    At most ENGINE_MAX_CONCURRENCY tool processes run at once. Each device
+    extraction gets a single Deadline that all of its calls draw from, and
+    can be cancelled by UDID (e.g. when the phone is unplugged), which kills
+    whatever tool process it is waiting on.
+    """
+    
+    def __init__(self, max_concurrency: int = ENGINE_MAX_CONCURRENCY):
+        self.max_concurrency = max(1, max_concurrency)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.tasks: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+        self._semaphore = None
+        self._thread = None
+    
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None:
+                ready = threading.Event()
+                self._thread = threading.Thread(target=self._run_loop, args=(ready,),
+                                                name='scanner-engine', daemon=True)
+                self._thread.start()
+                ready.wait()
+            return self.loop
+    
+    def _run_loop(self, ready: threading.Event):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        ready.set()
+        self.loop.run_forever()
+    
+    def call(self, coro: Coroutine, timeout: Optional[float] = None):
+        """Run a coroutine on the engine loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()).result(timeout)
+    
+    def submit(self, udid: str, coro: Coroutine) -> Future:
+        """Start per-device work; cancel(udid) stops it"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        with self.lock:
+            self.tasks[udid] = future
+        future.add_done_callback(lambda f, u=udid: self._forget(u, f))
+        return future
+    
+    def spawn(self, coro: Coroutine) -> Future:
+        """Start work that cancel(udid) leaves alone (e.g. a queued shutdown)"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+    
+    def _forget(self, udid: str, future: Future):
+        with self.lock:
+            if self.tasks.get(udid) is future:
+                del self.tasks[udid]
+    
+    def cancel(self, udid: str) -> bool:
+        """Cancel the running work for a device, killing its tool process"""
+        with self.lock:
+            future = self.tasks.get(udid)
+        return future.cancel() if future is not None else False
+    
+    def in_flight(self) -> Set[str]:
+        with self.lock:
+            return set(self.tasks)
+    
+    def close(self):
+        """Cancel all device work and stop the event loop"""
+        with self.lock:
+            futures = list(self.tasks.values())
+            loop, thread = self.loop, self._thread
+            self.loop, self._thread = None, None
+        for future in futures:
+            future.cancel()
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=2)
+    
+    async def run_tool(self, command: List[str], deadline: Deadline) -> Tuple[int, bytes, bytes]:
+        """
+        Run one tool within the deadline. Raises subprocess.TimeoutExpired
+        when the budget runs out; the process is killed on timeout or cancel.
+        Time spent queued behind the concurrency cap is not charged to the device.
+        """
+        queued = time.monotonic()
+        async with self._semaphore:
+            deadline.extend(time.monotonic() - queued)
+            if deadline.expired():
+                raise subprocess.TimeoutExpired(command, deadline.seconds)
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), deadline.remaining())
+            except asyncio.TimeoutError:
+                raise subprocess.TimeoutExpired(command, deadline.seconds)
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+            return process.returncode, stdout, stderr
+    
+    async def list_devices(self) -> Set[str]:
+        """UDIDs reported by `idevice_id -l`"""
+        with span('detect') as timing:
+            returncode, stdout, _ = await self.run_tool(['idevice_id', '-l'], Deadline(DETECT_TIMEOUT))
+            timing['ok'] = returncode == 0
+        if returncode == 0 and stdout:
+            return set(stdout.decode('utf-8', errors='replace').strip().splitlines())
+        return set()
+    
+    async def query_domain(self, udid: str, deadline: Deadline, domain: Optional[str] = None) -> Optional[Dict]:
+        """One ideviceinfo call, parsed"""
+        command = ['ideviceinfo', '-u', udid, '-x']  # -x for XML/plist format
+        if domain:
+            command += ['-q', domain]
+        
+        returncode, stdout, _ = await self.run_tool(command, deadline)
+        if returncode != 0 or not stdout.strip():
+            return None
+        
+        return parse_device_info(stdout)
+    
+    async def query_key(self, udid: str, key: str, deadline: Deadline) -> Optional[str]:
+        """Single lockdown value via `ideviceinfo -k` (plain text output)"""
+        returncode, stdout, _ = await self.run_tool(['ideviceinfo', '-u', udid, '-k', key], deadline)
+        value = stdout.decode('utf-8', errors='replace').strip()
+        return value if returncode == 0 and value else None
+    
+    async def probe_imei(self, udid: str, deadline: Deadline) -> Optional[str]:
+        """IMEI only (one ideviceinfo call): enough to recognise a known device"""
+        with span('probe', udid) as timing:
+            imei = await self.query_key(udid, 'InternationalMobileEquipmentIdentity', deadline)
+            timing['ok'] = imei is not None
+        return imei
+    
+    async def fetch_device_info(self, udid: str, deadline: Deadline) -> Optional[Dict]:
+        """
+        Fetch the root lockdown domain, plus com.apple.disk_usage only when
+        the root domain carries no capacity. At most two ideviceinfo calls.
+        """
+        with span('info_fetch', udid) as timing:
+            device_info = await self.query_domain(udid, deadline)
+            timing['calls'] = 1
+            if not device_info:
+                timing['ok'] = False
+                return None
+            
+            if find_storage_bytes(device_info) is None:
+                timing['calls'] = 2
+                try:
+                    disk_usage = await self.query_domain(udid, deadline, DISK_USAGE_DOMAIN)
+                    if disk_usage:
+                        device_info[DISK_USAGE_DOMAIN] = disk_usage
+                except subprocess.TimeoutExpired:
+                    print_warning("Disk usage query timed out")
+        
+        return device_info
+    
+    async def shutdown_device(self, udid: str) -> bool:
+        with span('shutdown', udid) as timing:
+            returncode, _, _ = await self.run_tool(['idevicediagnostics', '-u', udid, 'shutdown'],
+                                                   Deadline(SHUTDOWN_TIMEOUT))
+            timing['ok'] = returncode == 0
+        return returncode == 0
+
+_shared_engine = None
+_shared_lock = threading.Lock()
+
+def shared_engine() -> ScannerEngine:
+    """The process-wide engine (one event loop for every scanner)"""
+    global _shared_engine
+    with _shared_lock:
+        if _shared_engine is None:
+            _shared_engine = ScannerEngine()
+        return _shared_engine
@@ -0,0 +1,392 @@
+# seen_imei_store.py
+import array
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Iterable, Iterator, Union
+
+from utils import print_success, print_error, print_warning, print_info
+from config import (SEEN_IMEI_FILE, SEEN_IMEI_INDEX_FILE, SEEN_IMEI_JOURNAL_FILE, SEEN_IMEI_FSYNC_BATCH,
+                    SEEN_IMEI_FSYNC_INTERVAL, SEEN_IMEI_COMPACT_THRESHOLD)
+
+# seen_imei.idx: header, sorted little-endian uint64 IMEIs, Bloom filter bits,
+# then any non-numeric legacy entries as newline-separated UTF-8
+INDEX_MAGIC = b'IPSIMEI\x00'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('<8sIIQQQQQ')  # magic, version, hashes, generation, count, bloom_bytes, extras_bytes, reserved
+
+# Two probes from one 64-bit hash keep the check cheap in Python; bits are a
+# power of two >= 12 per IMEI (~2% false positives, each costing one bisect)
+BLOOM_HASHES = 2
+BLOOM_BITS_PER_IMEI = 12
+BLOOM_MIN_BITS = 1 << 20
+
+_MASK64 = (1 << 64) - 1
+
+def imei_key(imei: str) -> Union[int, str]:
+    """15-digit IMEIs as integers; anything else stays a string"""
+    if len(imei) == 15 and imei.isdigit():
+        return int(imei)
+    return imei
+
+def bloom_hash(key: int) -> int:
+    """64-bit mix of the key; its low and high halves are the two probe positions"""
+    h = (key * 0x9E3779B97F4A7C15) & _MASK64
+    return h ^ (h >> 32)
+
+def bloom_add(bloom: bytearray, mask: int, keys: Iterable[int]):
+    for key in keys:
+        h = bloom_hash(key)
+        low, high = h & mask, (h >> 32) & mask
+        bloom[low >> 3] |= 1 << (low & 7)
+        bloom[high >> 3] |= 1 << (high & 7)
+
+class SeenImeiStore:
+    """
+    Set of processed IMEIs: a memory-mapped sorted uint64 index plus an
+    append-only journal.
+    
+    Lookups check the in-memory delta (IMEIs added since the last compaction),
+    then a Bloom filter, then binary-search the mapped array, so startup
+    needs no parsing and the base costs ~8 bytes per IMEI in the page cache.
+    Each new IMEI is one journal line, fsynced in batches. Compaction merges
+    the delta into a new index file atomically and starts a new journal
+    generation, so a journal left over from before a crash is never replayed
+    over a newer index. A legacy seen_imei.json is migrated on first load.
+    """
+    
+    def __init__(self, index_file: str = SEEN_IMEI_INDEX_FILE, journal_file: str = SEEN_IMEI_JOURNAL_FILE,
+                 legacy_file: str = SEEN_IMEI_FILE):
+        self.index_file = index_file
+        self.journal_file = journal_file
+        self.legacy_file = legacy_file
+        self.delta = set()
+        self.generation = 0
+        self.journal_records = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.lock = threading.RLock()
+        self._journal = None
+        self._close_base()
+    
+    def __contains__(self, imei) -> bool:
+        key = imei_key(str(imei))
+        with self.lock:
+            return key in self.delta or self._in_base(key)
+    
+    def __len__(self) -> int:
+        return self.count + len(self.extras) + len(self.delta)
+    
+    def __iter__(self) -> Iterator[str]:
+        with self.lock:
+            base = [str(key).zfill(15) for key in self.keys] if self.keys is not None else []
+            extras = list(self.extras)
+            delta = [str(key).zfill(15) if isinstance(key, int) else key for key in self.delta]
+        return iter(base + extras + delta)
+    
+    def _in_base(self, key) -> bool:
+        if not isinstance(key, int):
+            return key in self.extras
+        if not self.count:
+            return False
+        h, mask, bloom = bloom_hash(key), self.bloom_mask, self.bloom
+        low, high = h & mask, (h >> 32) & mask
+        if not (bloom[low >> 3] >> (low & 7)) & (bloom[high >> 3] >> (high & 7)) & 1:
+            return False
+        i = bisect.bisect_left(self.keys, key)
+        return i < self.count and self.keys[i] == key
+    
+    def load(self):
+        """Map the index (migrating seen_imei.json if needed) and replay the journal"""
+        self.delta = set()
+        self.generation = 0
+        migrate = False
+        
+        if os.path.exists(self.index_file):
+            try:
+                self._open_base()
+            except Exception as e:
+                print_error(f"Error loading seen IMEI index: {e}")
+        elif os.path.exists(self.legacy_file):
+            migrate = self._load_legacy()
+        
+        replayed = self._replay_journal()
+        print_success(f"Loaded {len(self)} seen IMEIs ({replayed} from journal)")
+        
+        if migrate:
+            print_info(f"Converting {self.legacy_file} to {self.index_file}...")
+            self.compact()
+        else:
+            self._open_journal()
+            if self.journal_records >= SEEN_IMEI_COMPACT_THRESHOLD:
+                self.compact()
+        return self
+    
+    def _load_legacy(self) -> bool:
+        """Read seen_imei.json (plain list, or versioned dict) into the delta"""
+        try:
+            with open(self.legacy_file, 'r') as f:
+                loaded = json.load(f)
+            if isinstance(loaded, dict):
+                self.generation = loaded.get('generation', 0)
+                loaded = loaded.get('imeis', [])
+            self.delta = {imei_key(str(imei)) for imei in loaded}
+            return True
+        except Exception as e:
+            print_error(f"Error loading seen IMEIs: {e}")
+            return False
+    
+    def _open_base(self):
+        with open(self.index_file, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, hashes, generation, count, bloom_bytes, extras_bytes, _ = \
+                INDEX_HEADER.unpack_from(mapped, 0)
+            keys_end = INDEX_HEADER.size + 8 * count
+            if (magic != INDEX_MAGIC or version != INDEX_VERSION or hashes != BLOOM_HASHES or
+                    len(mapped) != keys_end + bloom_bytes + extras_bytes or
+                    bloom_bytes == 0 or bloom_bytes & (bloom_bytes - 1)):
+                raise ValueError(f"{self.index_file} is not a valid IMEI index")
+            
+            view = memoryview(mapped)
+            keys = view[INDEX_HEADER.size:keys_end]
+            if sys.byteorder != 'little':
+                keys = array.array('Q', keys)
+                keys.byteswap()
+            else:
+                keys = keys.cast('Q')
+            extras = bytes(view[keys_end + bloom_bytes:]).decode('utf-8')
+        except Exception:
+            mapped.close()
+            raise
+        
+        self._mapped, self._view = mapped, view
+        self.keys = keys
+        self.bloom = view[keys_end:keys_end + bloom_bytes]
+        self.bloom_mask = bloom_bytes * 8 - 1
+        self.count = count
+        self.extras = set(extras.split('\n')) if extras else set()
+        self.generation = generation
+    
+    def _close_base(self):
+        """Drop the mapping (buffers must be released before the mmap closes)"""
+        for name in ('keys', 'bloom', '_view'):
+            buffer = getattr(self, name, None)
+            if isinstance(buffer, memoryview):
+                buffer.release()
+        mapped = getattr(self, '_mapped', None)
+        if mapped is not None:
+            mapped.close()
+        self._mapped, self._view = None, None
+        self.keys, self.bloom, self.bloom_mask = None, b'', -1
+        self.count = 0
+        self.extras = set()
+    
+    def _replay_journal(self) -> int:
+        self.journal_records = 0
+        if not os.path.exists(self.journal_file):
+            return 0
+        
+        replayed = 0
+        try:
+            with open(self.journal_file, 'r') as f:
+                header = self._parse_line(f.readline())
+                if not header or header.get('generation') != self.generation:
+                    # Journal predates the current index
+                    return 0
+                
+                for line in f:
+                    record = self._parse_line(line)
+                    if record is None:
+                        # Torn write at the end of the journal
+                        break
+                    imei = record.get('imei')
+                    if imei:
+                        self.journal_records += 1
+                        key = imei_key(imei)
+                        if key not in self.delta and not self._in_base(key):
+                            self.delta.add(key)
+                            replayed += 1
+        except Exception as e:
+            print_warning(f"Error replaying seen IMEI journal: {e}")
+        return replayed
+    
+    def _parse_line(self, line: str):
+        if not line.endswith('\n'):
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        return record if isinstance(record, dict) else None
+    
+    def _open_journal(self):
+        """Open the journal for appending, starting it if it is missing or stale"""
+        if os.path.exists(self.journal_file) and self._journal_header_ok():
+            self._truncate_torn_tail()
+            self._journal = open(self.journal_file, 'a', encoding='utf-8')
+        else:
+            self._start_journal()
+    
+    def _journal_header_ok(self) -> bool:
+        try:
+            with open(self.journal_file, 'r') as f:
+                header = self._parse_line(f.readline())
+            return bool(header) and header.get('generation') == self.generation
+        except OSError:
+            return False
+    
+    def _truncate_torn_tail(self):
+        """Drop a partial last line so new records start on a clean line"""
+        with open(self.journal_file, 'rb+') as f:
+            data_end = f.seek(0, os.SEEK_END)
+            if data_end == 0:
+                return
+            f.seek(max(0, data_end - 4096))
+            tail = f.read()
+            if tail.endswith(b'\n'):
+                return
+            cut = tail.rfind(b'\n')
+            f.truncate(data_end - len(tail) + cut + 1 if cut >= 0 else 0)
+    
+    def _start_journal(self):
+        if self._journal:
+            self._journal.close()
+        self._journal = open(self.journal_file, 'w', encoding='utf-8')
+        self._journal.write(json.dumps({'generation': self.generation}) + '\n')
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self.journal_records = 0
+        self.unsynced = 0
+    
+    def add(self, imei: str):
+        """Record a newly seen IMEI (one journal line, fsynced in batches)"""
+        if self.mark(imei):
+            self.persist([imei])
+    
+    def mark(self, imei: str) -> bool:
+        """Add to the in-memory delta only; returns False if already seen"""
+        key = imei_key(str(imei))
+        with self.lock:
+            if key in self.delta or self._in_base(key):
+                return False
+            self.delta.add(key)
+            return True
+    
+    def unmark(self, imei: str):
+        """Undo a mark() that was never persisted (its record failed to save)"""
+        with self.lock:
+            self.delta.discard(imei_key(str(imei)))
+    
+    def persist(self, imeis: Iterable[str]):
+        """Append marked IMEIs to the journal"""
+        with self.lock:
+            try:
+                if self._journal is None:
+                    self._open_journal()
+                for imei in imeis:
+                    self._journal.write(json.dumps({'imei': imei}) + '\n')
+                    self.journal_records += 1
+                    self.unsynced += 1
+                self._journal.flush()
+                if (self.unsynced >= SEEN_IMEI_FSYNC_BATCH or
+                        time.monotonic() - self.last_sync >= SEEN_IMEI_FSYNC_INTERVAL):
+                    self._sync()
+            except Exception as e:
+                print_error(f"Error saving seen IMEI: {e}")
+        
+        if self.journal_records >= SEEN_IMEI_COMPACT_THRESHOLD:
+            self.compact()
+    
+    def update(self, imeis: Iterable[str]):
+        for imei in imeis:
+            self.add(imei)
+    
+    def clear(self):
+        """Forget all IMEIs (compacts to an empty index)"""
+        with self.lock:
+            self.delta.clear()
+            self._close_base()
+        self.compact()
+    
+    def sync(self):
+        """Force buffered journal records to disk"""
+        with self.lock:
+            self._sync()
+    
+    def _sync(self):
+        if self._journal and self.unsynced:
+            os.fsync(self._journal.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+    
+    def compact(self):
+        """Merge the delta into a new index file and start a fresh journal"""
+        with self.lock:
+            try:
+                tmp_file = self.index_file + '.tmp'
+                self._write_index(tmp_file, self.generation + 1)
+                self._close_base()
+                os.replace(tmp_file, self.index_file)
+                self._open_base()
+                self.delta = set()
+                self._start_journal()
+            except Exception as e:
+                print_error(f"Error saving seen IMEIs: {e}")
+                if self._mapped is None and os.path.exists(self.index_file):
+                    try:
+                        self._open_base()
+                    except Exception as e:
+                        print_error(f"Error loading seen IMEI index: {e}")
+    
+    def _write_index(self, path: str, generation: int):
+        """
+        Stream base + delta into a new index. Base runs between insertion
+        points are copied as raw bytes; the Bloom filter is extended in place
+        and only rebuilt when the index outgrows its capacity.
+        """
+        new_keys = sorted(key for key in self.delta if isinstance(key, int))
+        extras = sorted(self.extras | {key for key in self.delta if not isinstance(key, int)})
+        count = self.count + len(new_keys)
+        
+        bloom_bits = self.bloom_mask + 1
+        if bloom_bits and count * BLOOM_BITS_PER_IMEI <= bloom_bits:
+            bloom = bytearray(self.bloom)
+        else:
+            bloom_bits = BLOOM_MIN_BITS
+            while bloom_bits < 2 * count * BLOOM_BITS_PER_IMEI:
+                bloom_bits *= 2
+            bloom = bytearray(bloom_bits // 8)
+            if self.count:
+                bloom_add(bloom, bloom_bits - 1, self.keys)
+        bloom_add(bloom, bloom_bits - 1, new_keys)
+        
+        extras_bytes = '\n'.join(extras).encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, BLOOM_HASHES, generation,
+                                      count, len(bloom), len(extras_bytes), 0))
+            raw = self._view[INDEX_HEADER.size:INDEX_HEADER.size + 8 * self.count] if self.count else b''
+            start = 0
+            for key in new_keys:
+                position = bisect.bisect_left(self.keys, key, start) if self.count else 0
+                f.write(raw[8 * start:8 * position])
+                f.write(struct.pack('<Q', key))
+                start = position
+            f.write(raw[8 * start:])
+            f.write(bloom)
+            f.write(extras_bytes)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def close(self):
+        with self.lock:
+            if self._journal:
+                self._sync()
+                self._journal.close()
+                self._journal = None
+            self._close_base()
@@ -0,0 +1,186 @@
+# shutdown_queue.py
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from colors import Colors
+from utils import print_info, print_error, print_warning
+from config import (SHUTDOWN_MAX_ATTEMPTS, SHUTDOWN_RETRY_DELAY, SHUTDOWN_CONFIRM_TIMEOUT,
+                    SHUTDOWN_CONFIRM_POLL, SHUTDOWN_DRAIN_TIMEOUT)
+from telemetry import span
+
+class ShutdownQueue:
+    """
+    Power devices off on the scanner engine's event loop, so the monitor
+    loop goes straight back to extracting.
+    
+    A shutdown only counts once the phone has left the USB bus: detached()
+    (called from the monitor's detach handler) confirms it, and `idevice_id -l`
+    is polled as a fallback. A failed command or a phone still connected
+    after SHUTDOWN_CONFIRM_TIMEOUT is retried up to SHUTDOWN_MAX_ATTEMPTS.
+    Each device ends as 'off', 'failed' or 'unplugged' (pulled before the
+    command went through); the outcome is kept in outcomes, passed to
+    on_outcome and recorded as a 'power_off' telemetry span.
+    """
+    
+    def __init__(self, device_scanner, on_outcome: Optional[Callable[[str, Dict], None]] = None,
+                 max_attempts: int = SHUTDOWN_MAX_ATTEMPTS, retry_delay: float = SHUTDOWN_RETRY_DELAY,
+                 confirm_timeout: float = SHUTDOWN_CONFIRM_TIMEOUT, poll_interval: float = SHUTDOWN_CONFIRM_POLL):
+        import asyncio  # deferred with the engine, keeps startup fast
+        
+        self.asyncio = asyncio
+        self.engine = device_scanner.engine
+        self.on_outcome = on_outcome
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self.confirm_timeout = confirm_timeout
+        self.poll_interval = poll_interval
+        self.pending = {}
+        self.events = {}
+        self.unplugged = set()
+        self.labels: Dict[str, str] = {}
+        self.outcomes: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+    
+    def submit(self, udid: str, label: str = '') -> bool:
+        """Queue a shutdown, unless one is already running for this device"""
+        with self.lock:
+            if udid in self.pending:
+                return False
+            self.unplugged.discard(udid)
+            self.outcomes.pop(udid, None)
+            self.labels[udid] = label or f"{udid[:8]}..."
+            future = self.engine.spawn(self._shutdown(udid, self.labels[udid]))
+            self.pending[udid] = future
+        future.add_done_callback(lambda f, u=udid: self._on_done(u, f))
+        return True
+    
+    def detached(self, udid: str):
+        """The device left the USB bus (safe to call from any thread)"""
+        with self.lock:
+            if udid not in self.pending:
+                return
+            self.unplugged.add(udid)
+            event = self.events.get(udid)
+        loop = self.engine.loop
+        if event is not None and loop is not None:
+            loop.call_soon_threadsafe(event.set)
+    
+    async def _shutdown(self, udid: str, label: str) -> Dict:
+        event = self.asyncio.Event()
+        with self.lock:
+            self.events[udid] = event
+            if udid in self.unplugged:
+                event.set()
+        
+        started = time.monotonic()
+        status, reason = 'failed', ''
+        with span('power_off', udid) as timing:
+            for attempt in range(1, self.max_attempts + 1):
+                if event.is_set():
+                    status = 'unplugged'
+                    break
+                try:
+                    sent = await self.engine.shutdown_device(udid)
+                    reason = '' if sent else "shutdown command failed"
+                except subprocess.TimeoutExpired:
+                    sent, reason = False, "shutdown command timed out"
+                except OSError as e:
+                    sent, reason = False, str(e)
+                
+                if sent and await self._confirm(udid, event):
+                    status, reason = 'off', ''
+                    break
+                if sent:
+                    reason = f"still connected {self.confirm_timeout:.0f}s after shutdown"
+                if attempt < self.max_attempts:
+                    await self.asyncio.sleep(self.retry_delay)
+            timing['ok'] = status == 'off'
+            timing['status'] = status
+            timing['attempts'] = attempt
+        
+        return {'udid': udid, 'label': label, 'status': status, 'attempts': attempt,
+                'reason': reason, 'seconds': round(time.monotonic() - started, 1)}
+    
+    async def _confirm(self, udid: str, event) -> bool:
+        """Wait for the device to disappear; a detach event, or a poll of idevice_id"""
+        deadline = time.monotonic() + self.confirm_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await self.asyncio.wait_for(event.wait(), min(self.poll_interval, remaining))
+                return True
+            except self.asyncio.TimeoutError:
+                pass
+            try:
+                if udid not in await self.engine.list_devices():
+                    return True
+            except subprocess.TimeoutExpired:
+                pass
+    
+    def _on_done(self, udid: str, future):
+        if future.cancelled():
+            outcome = {'udid': udid, 'label': self.labels.get(udid, udid[:8]), 'status': 'unconfirmed',
+                       'attempts': 0, 'reason': "monitoring stopped first", 'seconds': 0.0}
+        else:
+            try:
+                outcome = future.result()
+            except Exception as e:
+                outcome = {'udid': udid, 'label': self.labels.get(udid, udid[:8]), 'status': 'failed',
+                           'attempts': 0, 'reason': str(e), 'seconds': 0.0}
+        with self.lock:
+            self.events.pop(udid, None)
+            self.unplugged.discard(udid)
+            self.outcomes[udid] = outcome
+        
+        if outcome['status'] == 'off':
+            print_info(f"{outcome['label']} powered off ({outcome['seconds']:.0f}s)")
+        elif outcome['status'] == 'unplugged':
+            print_warning(f"{outcome['label']} was unplugged before it powered off")
+        else:
+            print_error(f"{outcome['label']} did not power off: {outcome['reason']}")
+        if self.on_outcome is not None:
+            try:
+                self.on_outcome(udid, outcome)
+            except Exception:
+                pass
+        with self.lock:
+            self.pending.pop(udid, None)
+            self.idle.notify_all()
+    
+    def pending_count(self) -> int:
+        with self.lock:
+            return len(self.pending)
+    
+    def drain(self, timeout: float = SHUTDOWN_DRAIN_TIMEOUT):
+        """Wait for running shutdowns; whatever is left after timeout is cancelled"""
+        with self.lock:
+            if not self.pending:
+                return
+            print_info(f"Waiting for {len(self.pending)} device(s) to power off...")
+            self.idle.wait_for(lambda: not self.pending, timeout)
+            left = list(self.pending.values())
+        for future in left:
+            future.cancel()
+        with self.lock:
+            self.idle.wait_for(lambda: not self.pending, 2)
+    
+    def failures(self) -> List[Dict]:
+        with self.lock:
+            return [outcome for outcome in self.outcomes.values() if outcome['status'] in ('failed', 'unconfirmed')]
+    
+    def print_report(self):
+        """Totals, and one line per phone that may still be on"""
+        with self.lock:
+            outcomes = list(self.outcomes.values())
+        if not outcomes:
+            return
+        off = sum(1 for outcome in outcomes if outcome['status'] == 'off')
+        print_info(f"Shutdowns: {off}/{len(outcomes)} powered off")
+        for outcome in self.failures():
+            print(f"{Colors.BRIGHT_RED}  {outcome['udid'][:8]}...  {outcome['label']:<36} "
+                  f"{outcome['status']:<12} {outcome['reason']}{Colors.RESET}")
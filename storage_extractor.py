@@ -1,79 +1,49 @@
 # storage_extractor.py
-import subprocess
-import re
+from typing import Optional
 
-def extract_storage_capacity_real(device_info: dict, udid: str) -> str:
+DISK_USAGE_DOMAIN = 'com.apple.disk_usage'
+
+STORAGE_KEYS = [
+    'TotalDataCapacity',
+    'TotalDiskCapacity',
+    'DeviceCapacity',
+    'NANDVolumeUsage',
+    'DiskUsage'
+]
+
+# Common iPhone storage capacities
+COMMON_CAPACITIES_GB = [16, 32, 64, 128, 256, 512, 1024]
+
+def find_storage_bytes(device_info: dict) -> Optional[int]:
+    """Return the first usable capacity (bytes) from the root or disk usage domain"""
+    sources = [device_info, device_info.get(DISK_USAGE_DOMAIN) or {}]
+    
+    for source in sources:
+        for key in STORAGE_KEYS:
+            value = source.get(key)
+            if isinstance(value, str) and value.isdigit():
+                value = int(value)
+            if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+                return value
+    
+    return None
+
+def extract_storage_capacity_real(device_info: dict, udid: str = None) -> str:
     """
-    Extract REAL storage capacity using multiple methods
+    Extract REAL storage capacity from already fetched device info
+    (root domain plus com.apple.disk_usage, see DeviceScanner.fetch_device_info)
     Returns storage in GB or 'N/A' if cannot determine
     """
     
-    storage_bytes = None
-    
-    # Method 1: Try from device info keys directly
-    storage_keys = [
-        'TotalDataCapacity',
-        'TotalDiskCapacity',
-        'DeviceCapacity',
-        'NANDVolumeUsage',
-        'DiskUsage'
-    ]
-    
-    for key in storage_keys:
-        if key in device_info and device_info[key]:
-            value = device_info[key]
-            if value and value != '0' and value.isdigit():
-                storage_bytes = value
-                break
-    
-    # Method 2: Try using system profiler query (com.apple.disk_usage.factory)
-    if not storage_bytes or storage_bytes == '0':
-        try:
-            result = subprocess.run(
-                ['ideviceinfo', '-u', udid, '-q', 'com.apple.disk_usage.factory'],
-                capture_output=True,
-                text=True,
-                check=False,
-                timeout=10
-            )
-            if result.returncode == 0:
-                for line in result.stdout.splitlines():
-                    if ': ' in line:
-                        key, value = line.split(': ', 1)
-                        if 'TotalDiskCapacity' in key or 'TotalDataCapacity' in key:
-                            if value.isdigit() and value != '0':
-                                storage_bytes = value
-                                break
-        except:
-            pass
-    
-    # Method 3: Try alternative query for TotalDiskCapacity key
-    if not storage_bytes or storage_bytes == '0':
-        try:
-            result = subprocess.run(
-                ['ideviceinfo', '-u', udid, '-k', 'TotalDiskCapacity'],
-                capture_output=True,
-                text=True,
-                check=False,
-                timeout=10
-            )
-            if result.returncode == 0 and result.stdout.strip():
-                value = result.stdout.strip()
-                if value.isdigit() and value != '0':
-                    storage_bytes = value
-        except:
-            pass
+    storage_bytes = find_storage_bytes(device_info)
     
     # Convert bytes to GB
-    if storage_bytes and storage_bytes.isdigit():
+    if storage_bytes:
         try:
-            storage_gb = int(storage_bytes) / (1024 ** 3)
-            
-            # Common iPhone storage capacities
-            common_capacities = [16, 32, 64, 128, 256, 512, 1024]
+            storage_gb = storage_bytes / (1024 ** 3)
             
             # Find closest capacity with better tolerance
-            closest_capacity = min(common_capacities, key=lambda x: abs(x - storage_gb))
+            closest_capacity = min(COMMON_CAPACITIES_GB, key=lambda x: abs(x - storage_gb))
             
             # Calculate tolerance as percentage of the closest capacity
             # Use 20% tolerance for better matching
@@ -0,0 +1,193 @@
+# telemetry.py
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from utils import print_warning
+from config import (TELEMETRY_ENABLED, TELEMETRY_FILE, TELEMETRY_MAX_BYTES,
+                    TELEMETRY_BACKUPS, TELEMETRY_FLUSH_INTERVAL)
+
+# Stages in pipeline order (summaries list these first)
+STAGES = [
+    'detect', 'probe', 'extract', 'info_fetch', 'storage', 'lookup', 'color', 'color_manual',
+    'save_csv', 'save_xlsx', 'save_parquet', 'save_db', 'seen_persist', 'coordinator', 'shutdown',
+    'power_off'
+]
+
+class Telemetry:
+    """
+    Named timing spans written as JSON lines to a size-capped, rotating file
+    (telemetry.jsonl, telemetry.jsonl.1, ...). Writes are buffered and
+    flushed every TELEMETRY_FLUSH_INTERVAL seconds.
+    """
+    
+    def __init__(self, path: str = TELEMETRY_FILE, max_bytes: int = TELEMETRY_MAX_BYTES,
+                 backups: int = TELEMETRY_BACKUPS, enabled: bool = TELEMETRY_ENABLED):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self._handle = None
+        self._size = 0
+        self.listeners = []
+    
+    def add_listener(self, callback):
+        """callback(stage, seconds, udid, fields) for every finished span (e.g. the live dashboard)"""
+        self.listeners.append(callback)
+    
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+    
+    @contextmanager
+    def span(self, stage: str, udid: Optional[str] = None, **fields):
+        """
+        Time the enclosed block. The yielded dict is written with the span,
+        so callers can add fields or set 'ok' to False for a failed stage.
+        """
+        fields.setdefault('ok', True)
+        start = time.perf_counter()
+        try:
+            yield fields
+        except BaseException:
+            fields['ok'] = False
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start, udid, **fields)
+    
+    def record(self, stage: str, seconds: float, udid: Optional[str] = None, **fields):
+        """Write one finished span"""
+        for callback in list(self.listeners):
+            try:
+                callback(stage, seconds, udid, fields)
+            except Exception:
+                pass
+        if not self.enabled:
+            return
+        
+        entry = {'ts': round(time.time(), 3), 'stage': stage, 'ms': round(seconds * 1000, 3)}
+        if udid:
+            entry['udid'] = udid
+        entry.update(fields)
+        line = json.dumps(entry) + '\n'
+        
+        with self.lock:
+            try:
+                if self._handle is None:
+                    self._open()
+                if self._size + len(line) > self.max_bytes and self._size > 0:
+                    self._rotate()
+                self._handle.write(line)
+                self._size += len(line)
+                if time.monotonic() - self.last_flush >= TELEMETRY_FLUSH_INTERVAL:
+                    self._handle.flush()
+                    self.last_flush = time.monotonic()
+            except OSError:
+                # Telemetry must never break a scan
+                pass
+    
+    def flush(self):
+        with self.lock:
+            if self._handle is not None:
+                self._handle.flush()
+            self.last_flush = time.monotonic()
+    
+    def close(self):
+        with self.lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+    
+    def _open(self):
+        self._handle = open(self.path, 'a', encoding='utf-8')
+        self._size = self._handle.tell()
+    
+    def _rotate(self):
+        """telemetry.jsonl -> .1 -> .2 ..., dropping the oldest"""
+        self._handle.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{i}'):
+                os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        if self.backups > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self._open()
+    
+    def files(self) -> List[str]:
+        """Telemetry files, oldest first"""
+        paths = [f'{self.path}.{i}' for i in range(self.backups, 0, -1)] + [self.path]
+        return [path for path in paths if os.path.exists(path)]
+
+telemetry = Telemetry()
+span = telemetry.span
+record = telemetry.record
+
+def iter_spans(files: List[str], since: Optional[float] = None) -> Iterator[Dict]:
+    for path in files:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if since is None or entry.get('ts', 0) >= since:
+                    yield entry
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(since: Optional[float] = None, recorder: Telemetry = telemetry) -> Dict[str, Dict]:
+    """count, failures and p50/p95/p99/max milliseconds per stage"""
+    recorder.flush()
+    durations: Dict[str, List[float]] = {}
+    failures: Dict[str, int] = {}
+    for entry in iter_spans(recorder.files(), since):
+        stage = entry.get('stage')
+        durations.setdefault(stage, []).append(entry.get('ms', 0.0))
+        if not entry.get('ok', True):
+            failures[stage] = failures.get(stage, 0) + 1
+    
+    order = STAGES + sorted(stage for stage in durations if stage not in STAGES)
+    summary = {}
+    for stage in order:
+        values = sorted(durations.get(stage, []))
+        if values:
+            summary[stage] = {
+                'count': len(values),
+                'failed': failures.get(stage, 0),
+                'p50_ms': percentile(values, 0.50),
+                'p95_ms': percentile(values, 0.95),
+                'p99_ms': percentile(values, 0.99),
+                'max_ms': values[-1],
+            }
+    return summary
+
+def print_summary(since: Optional[float] = None, recorder: Telemetry = telemetry):
+    """Print the per-stage table"""
+    summary = summarize(since, recorder)
+    if not summary:
+        print_warning(f"No timing data in {recorder.path}")
+        return
+    
+    print(f"{'Stage':<14} {'Count':>7} {'Failed':>7} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    print('─' * 74)
+    for stage, stats in summary.items():
+        print(f"{stage:<14} {stats['count']:>7} {stats['failed']:>7} {stats['p50_ms']:>10.1f} "
+              f"{stats['p95_ms']:>10.1f} {stats['p99_ms']:>10.1f} {stats['max_ms']:>10.1f}")
+
+if __name__ == '__main__':
+    # python telemetry.py [hours]  -> summary of the last N hours (default: everything kept)
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else None
+    print_summary(time.time() - hours * 3600 if hours else None)
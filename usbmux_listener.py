@@ -0,0 +1,160 @@
+# usbmux_listener.py
+import os
+import platform
+import plistlib
+import socket
+import struct
+import threading
+from typing import Callable, Dict, Optional, Set
+
+from utils import print_error
+from config import USBMUXD_SOCKET_PATH, USBMUXD_TCP_ADDRESS, USBMUX_RECONNECT_DELAY
+
+# usbmuxd packet header: length, version, message type, tag (little endian)
+HEADER = struct.Struct('<IIII')
+PLIST_VERSION = 1
+PLIST_MESSAGE = 8
+
+def default_usbmuxd_address():
+    """Resolve the usbmuxd address the same way libimobiledevice does"""
+    override = os.environ.get('USBMUXD_SOCKET_ADDRESS', '').strip()
+    if override:
+        if override.upper().startswith('UNIX:'):
+            return override[5:]
+        host, _, port = override.rpartition(':')
+        if host and port.isdigit():
+            return (host, int(port))
+        return override
+    if platform.system() == 'Windows':
+        return USBMUXD_TCP_ADDRESS
+    return USBMUXD_SOCKET_PATH
+
+def encode_message(payload: dict, tag: int = 1) -> bytes:
+    """Build a plist packet for usbmuxd"""
+    body = plistlib.dumps(payload)
+    return HEADER.pack(HEADER.size + len(body), PLIST_VERSION, PLIST_MESSAGE, tag) + body
+
+def read_message(sock: socket.socket) -> dict:
+    """Read one plist packet from usbmuxd"""
+    length, _, _, _ = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if length < HEADER.size:
+        raise ValueError(f"Invalid usbmuxd packet length {length}")
+    return plistlib.loads(_recv_exact(sock, length - HEADER.size))
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("usbmuxd closed the connection")
+        data += chunk
+    return data
+
+class UsbmuxListener:
+    """
+    Subscribe to usbmuxd attach/detach events on a background thread.
+    Callbacks receive the device UDID. Only USB devices are reported,
+    matching what `idevice_id -l` lists.
+    """
+    
+    def __init__(self, on_attach: Callable[[str], None],
+                 on_detach: Optional[Callable[[str], None]] = None,
+                 address=None):
+        self.on_attach = on_attach
+        self.on_detach = on_detach
+        self.address = address or default_usbmuxd_address()
+        self.device_ids: Dict[int, str] = {}
+        self.listening = threading.Event()
+        self._stop = threading.Event()
+        self._sock = None
+        self._thread = None
+    
+    def start(self, timeout: float = 1.0) -> bool:
+        """Start listening; returns True if usbmuxd accepted the subscription"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='usbmux-listener', daemon=True)
+            self._thread.start()
+        return self.listening.wait(timeout)
+    
+    def stop(self):
+        """Stop listening and close the usbmuxd connection"""
+        self._stop.set()
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+    
+    def is_listening(self) -> bool:
+        return self.listening.is_set()
+    
+    def devices(self) -> Set[str]:
+        """UDIDs currently attached according to usbmuxd"""
+        return set(self.device_ids.values())
+    
+    def _connect(self) -> socket.socket:
+        if isinstance(self.address, tuple):
+            sock = socket.create_connection(self.address, timeout=5)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(5)
+            sock.connect(self.address)
+        return sock
+    
+    def _subscribe(self, sock: socket.socket):
+        sock.sendall(encode_message({
+            'MessageType': 'Listen',
+            'ClientVersionString': 'iPhoneScanner',
+            'ProgName': 'iPhoneScanner',
+            'kLibUSBMuxVersion': 3,
+        }))
+        reply = read_message(sock)
+        if reply.get('MessageType') != 'Result' or reply.get('Number', 0) != 0:
+            raise ConnectionError(f"usbmuxd refused Listen: {reply}")
+        # Events arrive whenever a device changes, so block without timeout
+        sock.settimeout(None)
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._sock = self._connect()
+                self._subscribe(self._sock)
+                self.listening.set()
+                while not self._stop.is_set():
+                    self._handle(read_message(self._sock))
+            except (OSError, ValueError, plistlib.InvalidFileException):
+                pass
+            finally:
+                self.listening.clear()
+                self.device_ids.clear()
+                if self._sock is not None:
+                    self._sock.close()
+                    self._sock = None
+            self._stop.wait(USBMUX_RECONNECT_DELAY)
+    
+    def _handle(self, message: dict):
+        message_type = message.get('MessageType')
+        device_id = message.get('DeviceID')
+        
+        if message_type == 'Attached':
+            properties = message.get('Properties', {})
+            udid = properties.get('SerialNumber')
+            if not udid or properties.get('ConnectionType', 'USB') != 'USB':
+                return
+            self.device_ids[device_id] = udid
+            self._notify(self.on_attach, udid)
+        elif message_type == 'Detached':
+            udid = self.device_ids.pop(device_id, None)
+            if udid and self.on_detach:
+                self._notify(self.on_detach, udid)
+    
+    def _notify(self, callback, udid: str):
+        try:
+            callback(udid)
+        except Exception as e:
+            print_error(f"Device event error ({udid[:8]}): {e}")
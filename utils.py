@@ -1,12 +1,21 @@
 # utils.py
 import os
 import platform
+import sys
 from datetime import datetime
 from colors import Colors, Icons
 
+_ansi_enabled = False
+
 def clear_screen():
-    """Clear terminal screen based on OS"""
-    os.system('cls' if platform.system() == 'Windows' else 'clear')
+    """Clear the terminal with ANSI codes instead of spawning cls/clear"""
+    global _ansi_enabled
+    if not _ansi_enabled and platform.system() == 'Windows':
+        # An empty system() call once turns on ANSI escape handling in the Windows console
+        os.system('')
+    _ansi_enabled = True
+    sys.stdout.write('\033[2J\033[3J\033[H')
+    sys.stdout.flush()
 
 def print_header(title: str, width: int = 80):
     """Print a styled header"""
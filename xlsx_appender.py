@@ -0,0 +1,282 @@
+# xlsx_appender.py
+# Minimal .xlsx writer that can append rows without re-reading the sheet.
+#
+# The workbook is a plain zip where the worksheet is the LAST entry and is
+# stored uncompressed. Appending overwrites the closing tags and the zip
+# central directory, writes the new rows, then writes a fresh central
+# directory. The CRC and size of the sheet data are kept in the zip comment,
+# so each append costs the same no matter how many rows are already there.
+import json
+import os
+import re
+import struct
+import time
+import zlib
+from typing import Iterable, List, Optional
+
+SHEET_PATH = 'xl/worksheets/sheet1.xml'
+STATE_MARKER = b'IPSCAN-XLSX1 '
+
+SHEET_HEAD = (b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+              b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+              b'<sheetData>')
+SHEET_TAIL = b'</sheetData></worksheet>'
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+END_RECORD = struct.Struct('<IHHHHIIH')
+
+LOCAL_SIG = 0x04034b50
+CENTRAL_SIG = 0x02014b50
+END_SIG = 0x06054b50
+
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def _static_parts(sheet_name: str) -> List[tuple]:
+    main_ns = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    rel_ns = 'http://schemas.openxmlformats.org/package/2006/relationships'
+    doc_rel = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    xml_head = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    name = _escape(sheet_name)
+    
+    return [
+        ('[Content_Types].xml', xml_head +
+         '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+         '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+         '<Default Extension="xml" ContentType="application/xml"/>'
+         '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+         '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+         '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+         '</Types>'),
+        ('_rels/.rels', xml_head +
+         f'<Relationships xmlns="{rel_ns}">'
+         f'<Relationship Id="rId1" Type="{doc_rel}/officeDocument" Target="xl/workbook.xml"/>'
+         '</Relationships>'),
+        ('xl/workbook.xml', xml_head +
+         f'<workbook xmlns="{main_ns}" xmlns:r="{doc_rel}">'
+         f'<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+         '</workbook>'),
+        ('xl/_rels/workbook.xml.rels', xml_head +
+         f'<Relationships xmlns="{rel_ns}">'
+         f'<Relationship Id="rId1" Type="{doc_rel}/worksheet" Target="worksheets/sheet1.xml"/>'
+         f'<Relationship Id="rId2" Type="{doc_rel}/styles" Target="styles.xml"/>'
+         '</Relationships>'),
+        ('xl/styles.xml', xml_head +
+         f'<styleSheet xmlns="{main_ns}">'
+         '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+         '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+         '<fill><patternFill patternType="gray125"/></fill></fills>'
+         '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+         '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+         '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+         '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+         '</styleSheet>'),
+    ]
+
+def _escape(value) -> str:
+    text = INVALID_XML_CHARS.sub('', str(value))
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+def _column_letter(index: int) -> str:
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def _row_xml(row_number: int, values: Iterable) -> bytes:
+    """Row with inline string cells, so IMEIs and UPCs keep leading zeros"""
+    cells = []
+    for col, value in enumerate(values):
+        if value is None:
+            continue
+        cells.append(f'<c r="{_column_letter(col)}{row_number}" t="inlineStr">'
+                     f'<is><t xml:space="preserve">{_escape(value)}</t></is></c>')
+    return f'<row r="{row_number}">{"".join(cells)}</row>'.encode('utf-8')
+
+def _dos_timestamp():
+    t = time.localtime()
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 4) | t.tm_mday
+    return dos_time, dos_date
+
+class AppendableXlsx:
+    """Single-sheet workbook with constant-cost row appends"""
+    
+    def __init__(self, path: str, sheet_name: str, headers: List[str]):
+        self.path = path
+        self.sheet_name = sheet_name
+        self.headers = list(headers)
+    
+    def is_appendable(self) -> bool:
+        """True if the file exists and was written in the appendable layout"""
+        return os.path.exists(self.path) and self._read_state() is not None
+    
+    def append_rows(self, rows: List[list]):
+        """Append rows in place; starts a new workbook if the file is missing"""
+        if not os.path.exists(self.path):
+            self.rebuild([])
+        
+        state = self._read_state()
+        if state is None:
+            raise ValueError(f"{self.path} is not in appendable layout, rebuild it first")
+        
+        rows_xml = b''.join(_row_xml(state['rows'] + 1 + i, row) for i, row in enumerate(rows))
+        prefix_crc = zlib.crc32(rows_xml, state['prefix_crc'])
+        prefix_size = state['prefix_size'] + len(rows_xml)
+        crc = zlib.crc32(SHEET_TAIL, prefix_crc)
+        size = prefix_size + len(SHEET_TAIL)
+        
+        with open(self.path, 'r+b') as f:
+            f.seek(state['cd_offset'])
+            central = bytearray(f.read(state['cd_size']))
+            self._patch_central(central, crc, size)
+            
+            f.seek(state['data_offset'] + state['prefix_size'])
+            f.write(rows_xml)
+            f.write(SHEET_TAIL)
+            
+            cd_offset = f.tell()
+            f.write(central)
+            f.write(self._end_record(state['entries'], len(central), cd_offset, {
+                'rows': state['rows'] + len(rows),
+                'header_offset': state['header_offset'],
+                'data_offset': state['data_offset'],
+                'prefix_size': prefix_size,
+                'prefix_crc': prefix_crc,
+            }))
+            f.truncate()
+            
+            f.seek(state['header_offset'] + 14)
+            f.write(struct.pack('<III', crc, size, size))
+    
+    def rebuild(self, rows: Iterable[list]) -> int:
+        """Write a fresh workbook (header + rows) in appendable layout; returns row count"""
+        tmp_path = self.path + '.tmp'
+        dos_time, dos_date = _dos_timestamp()
+        central = []
+        
+        try:
+            with open(tmp_path, 'wb') as f:
+                def write_entry_header(name: bytes, crc: int, size: int) -> int:
+                    offset = f.tell()
+                    f.write(LOCAL_HEADER.pack(LOCAL_SIG, 20, 0, 0, dos_time, dos_date,
+                                              crc, size, size, len(name), 0))
+                    f.write(name)
+                    return offset
+                
+                for name, content in _static_parts(self.sheet_name):
+                    data = content.encode('utf-8')
+                    crc = zlib.crc32(data)
+                    offset = write_entry_header(name.encode(), crc, len(data))
+                    f.write(data)
+                    central.append((name.encode(), crc, len(data), offset))
+                
+                # Worksheet last: header is patched once the size is known
+                name = SHEET_PATH.encode()
+                header_offset = write_entry_header(name, 0, 0)
+                data_offset = f.tell()
+                
+                prefix_crc = 0
+                prefix_size = 0
+                row_count = 0
+                for chunk in self._sheet_chunks(rows):
+                    f.write(chunk)
+                    prefix_crc = zlib.crc32(chunk, prefix_crc)
+                    prefix_size += len(chunk)
+                    row_count += 1
+                row_count -= 1  # SHEET_HEAD chunk
+                
+                f.write(SHEET_TAIL)
+                crc = zlib.crc32(SHEET_TAIL, prefix_crc)
+                size = prefix_size + len(SHEET_TAIL)
+                central.append((name, crc, size, header_offset))
+                
+                cd_offset = f.tell()
+                for entry_name, entry_crc, entry_size, offset in central:
+                    f.write(CENTRAL_HEADER.pack(CENTRAL_SIG, 20, 20, 0, 0, dos_time, dos_date,
+                                                entry_crc, entry_size, entry_size, len(entry_name),
+                                                0, 0, 0, 0, 0, offset))
+                    f.write(entry_name)
+                cd_size = f.tell() - cd_offset
+                
+                f.write(self._end_record(len(central), cd_size, cd_offset, {
+                    'rows': row_count + 1,  # sheet rows, header included
+                    'header_offset': header_offset,
+                    'data_offset': data_offset,
+                    'prefix_size': prefix_size,
+                    'prefix_crc': prefix_crc,
+                }))
+                
+                f.seek(header_offset + 14)
+                f.write(struct.pack('<III', crc, size, size))
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        os.replace(tmp_path, self.path)
+        return row_count
+    
+    def _sheet_chunks(self, rows: Iterable[list]):
+        yield SHEET_HEAD + _row_xml(1, self.headers)
+        for i, row in enumerate(rows, 2):
+            yield _row_xml(i, row)
+    
+    def _end_record(self, entries: int, cd_size: int, cd_offset: int, state: dict) -> bytes:
+        comment = STATE_MARKER + json.dumps(state, separators=(',', ':')).encode()
+        return END_RECORD.pack(END_SIG, 0, 0, entries, entries, cd_size, cd_offset,
+                               len(comment)) + comment
+    
+    def _patch_central(self, central: bytearray, crc: int, size: int):
+        """Update CRC and sizes of the worksheet entry in the central directory"""
+        pos = 0
+        while pos + CENTRAL_HEADER.size <= len(central):
+            fields = CENTRAL_HEADER.unpack_from(central, pos)
+            if fields[0] != CENTRAL_SIG:
+                break
+            name_len, extra_len, comment_len = fields[10], fields[11], fields[12]
+            name_start = pos + CENTRAL_HEADER.size
+            if bytes(central[name_start:name_start + name_len]) == SHEET_PATH.encode():
+                struct.pack_into('<III', central, pos + 16, crc, size, size)
+                return
+            pos = name_start + name_len + extra_len + comment_len
+        raise ValueError("Worksheet entry missing from central directory")
+    
+    def _read_state(self) -> Optional[dict]:
+        """Read the append state from the zip comment, None for foreign files"""
+        try:
+            file_size = os.path.getsize(self.path)
+            with open(self.path, 'rb') as f:
+                tail_size = min(file_size, END_RECORD.size + 4096)
+                f.seek(file_size - tail_size)
+                tail = f.read(tail_size)
+        except OSError:
+            return None
+        
+        pos = tail.rfind(struct.pack('<I', END_SIG))
+        if pos < 0 or pos + END_RECORD.size > len(tail):
+            return None
+        
+        fields = END_RECORD.unpack_from(tail, pos)
+        comment = tail[pos + END_RECORD.size:pos + END_RECORD.size + fields[7]]
+        if not comment.startswith(STATE_MARKER):
+            return None
+        
+        try:
+            state = json.loads(comment[len(STATE_MARKER):])
+        except ValueError:
+            return None
+        
+        state['entries'] = fields[4]
+        state['cd_size'] = fields[5]
+        state['cd_offset'] = fields[6]
+        
+        # The central directory must sit right after the worksheet data
+        expected = state['data_offset'] + state['prefix_size'] + len(SHEET_TAIL)
+        if state['cd_offset'] != expected or file_size - tail_size + pos != expected + state['cd_size']:
+            return None
+        return state